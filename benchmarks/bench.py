@@ -0,0 +1,161 @@
+"""
+Benchmarks of building, serializing and rendering boards.
+
+    python -m benchmarks.bench                      # 10, 1k, 10k and 100k nodes
+    python -m benchmarks.bench --sizes 10 1000 --compare benchmarks/results/0.1.0-....json
+
+The results are saved to benchmarks/results/<version>-<time>.json. With
+--compare, the phases that became slower than the given results by more than
+the threshold are reported, and the exit status is 1.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from ooda_flow_diagram import __version__
+from ooda_flow_diagram.ooda import label_cache
+from ooda_flow_diagram.ooda.basic import ActTable
+
+from benchmarks import boards
+
+SIZES = (10, 1000, 10000, 100000)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _best(func: Callable[[], object], repeat: int) -> float:
+    """Return the best wall time of repeat runs, with the garbage collected before each."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_labels(n: int) -> Callable[[], None]:
+    """Label generation of n ActTable nodes with a cold label cache."""
+    ds_attr = ActTable._ds_attr
+    texts = list(boards.act_texts(n))
+
+    def run():
+        label_cache.clear()
+        for todo, output in texts:
+            ds_attr.create_label(label=todo, subject="", line_mark="point", label2=output, subject2="",
+                                 line_mark2="point", label3={"bywhen": "6/23", "who": "James",
+                                                             "completed_date": "6/22", "progress": "done"},
+                                 subject3="", line_mark3="dot")
+    return run
+
+
+def peak_memory(n: int) -> int:
+    """Return the peak memory in bytes allocated while building a board of n nodes."""
+    label_cache.clear()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        diagram = boards.build(n)
+        diagram.to_dot()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(sizes=SIZES, repeat: int = 3, layout_max: int = 1000, memory: bool = True) -> List[Dict]:
+    """Run the benchmarks and return a record per board size.
+
+    :param layout_max: Largest board laid out with Graphviz, if it is installed.
+    """
+    records = []
+    for n in sizes:
+        # The large boards are built once, the small ones repeatedly.
+        reps = repeat if n <= 10000 else 1
+        record = {"nodes": n}
+
+        def build():
+            label_cache.clear()
+            return boards.build(n)
+
+        record["build"] = _best(build, reps)
+        record["labels"] = _best(bench_labels(n), reps)
+        diagram = build()
+        record["dot"] = _best(diagram.to_dot, reps)
+        record["dot_bytes"] = len(diagram.to_dot().encode("utf-8"))
+        if n <= layout_max and shutil.which("dot"):
+            record["layout"] = _best(lambda: diagram.pipe("svg"), 1)
+        if memory:
+            del diagram
+            record["peak_memory"] = peak_memory(n)
+        records.append(record)
+        print(_format(record), flush=True)
+    return records
+
+
+def _format(record: Dict) -> str:
+    parts = ["%7d nodes" % record["nodes"]]
+    for phase in ("build", "labels", "dot", "layout"):
+        if phase in record:
+            parts.append("%s %.4fs" % (phase, record[phase]))
+    if "peak_memory" in record:
+        parts.append("peak %.1fMiB" % (record["peak_memory"] / 1024 / 1024))
+    return "  ".join(parts)
+
+
+def save(records: List[Dict], directory: str = RESULTS_DIR) -> str:
+    """Save the records with the environment and return the path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "%s-%s.json" % (__version__, time.strftime("%Y%m%d-%H%M%S")))
+    with open(path, "w") as f:
+        json.dump({"version": __version__, "python": platform.python_version(),
+                   "machine": platform.machine(), "results": records}, f, indent=2)
+    return path
+
+
+def compare(records: List[Dict], baseline: Dict, threshold: float = 0.1) -> List[str]:
+    """Return the phases that are slower, or use more memory, than baseline by more than threshold."""
+    previous = {r["nodes"]: r for r in baseline["results"]}
+    regressions = []
+    for record in records:
+        old = previous.get(record["nodes"])
+        if old is None:
+            continue
+        for phase in ("build", "labels", "dot", "layout", "peak_memory", "dot_bytes"):
+            if phase in record and old.get(phase):
+                ratio = record[phase] / old[phase]
+                if ratio > 1 + threshold:
+                    regressions.append("%d nodes %s: %.2fx of %s" % (record["nodes"], phase, ratio,
+                                                                     baseline["version"]))
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="board sizes in nodes")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per phase, the best is recorded")
+    parser.add_argument("--layout-max", type=int, default=1000, help="largest board laid out with Graphviz")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory measurement")
+    parser.add_argument("--compare", help="results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown ratio")
+    parser.add_argument("--output", default=RESULTS_DIR, help="directory of the results")
+    args = parser.parse_args(argv)
+
+    records = run(args.sizes, args.repeat, args.layout_max, not args.no_memory)
+    print("saved", save(records, args.output))
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(records, json.load(f), args.threshold)
+        for regression in regressions:
+            print("regression:", regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""
+Synthetic boards for the benchmarks.
+
+A board of n nodes has a MajorTarget and OODA loops of LOOP_SIZE nodes. Every
+loop is a cluster with a Target, an "Acts" cluster of ActTable and ActCells
+nodes fanned out from the Target and fanned in to a Result, and the Result of
+a loop leads to the Target of the next one.
+"""
+from ooda_flow_diagram import Cluster, Diagram
+from ooda_flow_diagram.ooda.basic import ActCells, ActTable, MajorTarget, Result, Target
+
+LOOP_SIZE = 50
+PROGRESS = ("", "start", "done")
+
+
+def act_texts(n: int):
+    """Yield the ToDo and Output texts of n acts. A tenth of them repeat, as in templated boards."""
+    for i in range(n):
+        k = i if i % 10 else 0
+        yield ("check the histgrams of the features of batch %d and select the useful ones" % k,
+               "selected features of batch %d" % k)
+
+
+def build(n: int, **diagram_options) -> Diagram:
+    """Build a board of about n nodes with the operator DSL."""
+    diagram_options.setdefault("render", False)
+    diagram_options.setdefault("show", False)
+    texts = act_texts(n)
+    with Diagram("Benchmark %d" % n, **diagram_options) as diagram:
+        previous = MajorTarget(label="Binary classification of the reservations with high cancellation probability")
+        remaining = n - 1
+        loop = 0
+        while remaining > 0:
+            size = min(LOOP_SIZE, remaining)
+            remaining -= size
+            loop += 1
+            with Cluster("OODA Loop %d" % loop):
+                target = Target(label="Target of loop %d" % loop)
+                previous >> target
+                acts = []
+                with Cluster("Acts"):
+                    for i in range(max(size - 2, 0)):
+                        todo, output = next(texts)
+                        if i % 3:
+                            acts.append(ActTable(todo=todo, output=output, bywhen="6/23", who="James",
+                                                 progress=PROGRESS[i % 3], completed_date="6/22"))
+                        else:
+                            acts.append(ActCells(todo=todo, output=output, bywhen="6/23", who="James"))
+                if size > 1:
+                    result = Result(label="Result of loop %d" % loop)
+                    if acts:
+                        target >> acts >> result
+                    else:
+                        target - result
+                    previous = result
+                else:
+                    previous = target
+    return diagram
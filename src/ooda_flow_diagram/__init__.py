@@ -1,12 +1,34 @@
+import contextlib
 import contextvars
+import html
 import os
-import uuid
-from pathlib import Path
-from typing import List, Union, Dict
+import time
+from typing import IO, TYPE_CHECKING, Any, Callable, Iterable, List, Sequence, Tuple, Type, Union, Dict, Optional
 
-from graphviz import Digraph
+from ooda_flow_diagram import ids, lang
+from ooda_flow_diagram.layout import ENGINES, LayoutPolicy
+from ooda_flow_diagram.model import ModelDigraph
+from ooda_flow_diagram.renderer import get_default_renderer, pipe_file_many, pipe_many, timeout_kwargs
 
-from ooda_flow_diagram.ooda import OodaNodeAttr
+# graphviz and the optional features are imported when they are used, so that
+# short-lived commands start quickly.
+if TYPE_CHECKING:
+    from graphviz import Digraph
+
+    from ooda_flow_diagram.cache import RenderCache
+    from ooda_flow_diagram.incremental import IncrementalLayout
+    from ooda_flow_diagram.ooda import OodaNodeAttr
+    from ooda_flow_diagram.progress import ProgressIndex
+    from ooda_flow_diagram.stats import DiagramStats
+
+__version__ = "0.1.0"
+
+# Span of the phases that are not timed.
+_NO_SPAN = contextlib.nullcontext()
+
+# Directory of the icon directories, and the icon paths by icon directory and name.
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_icon_paths = {}
 
 # Global contexts for a diagrams and a cluster.
 #
@@ -18,6 +40,11 @@ from ooda_flow_diagram.ooda import OodaNodeAttr
 パラメータを介して現在のダイアグラムまたはクラスターを指定する必要はありません。
 →おそらくこれを置いておくことで、継承する具体的なノードやクラスタをdiagramに属させるコードを書かなくてよくしている
 """
+#
+# Each thread and each asyncio task has its own copy of the contexts, and the
+# with-blocks restore the previous values with tokens, so the diagrams built
+# in parallel do not see each other. Diagram.add() and Diagram.cluster() build
+# without relying on the context of the caller.
 __diagram = contextvars.ContextVar("diagrams")
 __cluster = contextvars.ContextVar("cluster")
 
@@ -29,8 +56,14 @@ def getdiagram():
         return None
 
 
-def setdiagram(diagram):
-    __diagram.set(diagram)
+def setdiagram(diagram) -> contextvars.Token:
+    """Set the current diagram and return the token that restores the previous one."""
+    return __diagram.set(diagram)
+
+
+def resetdiagram(token: contextvars.Token) -> None:
+    """Restore the current diagram set before the token was returned by setdiagram()."""
+    __diagram.reset(token)
 
 
 def getcluster():
@@ -40,14 +73,21 @@ def getcluster():
         return None
 
 
-def setcluster(cluster):
-    __cluster.set(cluster)
+def setcluster(cluster) -> contextvars.Token:
+    """Set the current cluster and return the token that restores the previous one."""
+    return __cluster.set(cluster)
+
+
+def resetcluster(token: contextvars.Token) -> None:
+    """Restore the current cluster set before the token was returned by setcluster()."""
+    __cluster.reset(token)
 
 
 class Diagram:
     __directions = ("TB", "BT", "LR", "RL")
-    __curvestyles = ("ortho", "curved")
+    __curvestyles = ("ortho", "curved", "spline", "polyline", "line")
     __outformats = ("png", "jpg", "svg", "pdf")
+    __label_wraps = ("textwrap", "width")
 
     # fmt: off
     _default_graph_attrs = {
@@ -93,12 +133,27 @@ class Diagram:
         filename: str = "",
         direction: str = "LR",
         curvestyle: str = "ortho",
-        outformat: str = "png",
+        outformat: Union[str, Sequence[str]] = "png",
         show: bool = True,
         label_loc: str = "t",
         graph_attr: dict = {},
         node_attr: dict = {},
         edge_attr: dict = {},
+        cache: "RenderCache" = None,
+        render: bool = True,
+        print_source: bool = False,
+        renderer=None,
+        label_wrap: str = "textwrap",
+        stream: Union[str, IO[str]] = None,
+        node_ids: Union[str, ids.NodeIdStrategy] = None,
+        incremental: Union[bool, "IncrementalLayout"] = False,
+        stats: Union[bool, "DiagramStats"] = False,
+        engine: str = "dot",
+        layout_timeout: float = None,
+        layout_policy: LayoutPolicy = None,
+        pages: bool = False,
+        native_svg: bool = False,
+        progress_badges: bool = False,
     ):
         """Diagram represents a global diagrams context.
 
@@ -107,12 +162,54 @@ class Diagram:
         :param filename: The output filename, without the extension (.png).
             If not given, it will be generated from the name.
         :param direction: Data flow direction. Default is 'left to right'.
-        :param curvestyle: Curve bending style. One of "ortho" or "curved".
-        :param outformat: Output file format. Default is 'png'.
+        :param curvestyle: Curve bending style. One of "ortho", "curved",
+            "spline", "polyline" or "line", from the slowest to route.
+        :param outformat: Output file format, or a list of formats. Default is
+            'png'. The formats of a list are rendered from one layout.
         :param show: Open generated image after save if true, just only save otherwise.
         :param graph_attr: Provide graph_attr dot config attributes.
         :param node_attr: Provide node_attr dot config attributes.
         :param edge_attr: Provide edge_attr dot config attributes.
+        :param cache: RenderCache to reuse images rendered from the same source.
+        :param render: Render the diagram when the context exits if true. If false,
+            the diagram is only frozen, and it is rendered on request by render(),
+            pipe() or save().
+        :param print_source: Print the DOT source when rendering if true.
+        :param renderer: Renderer that runs the layout, e.g. PooledRenderer.
+            Default is the renderer set by set_default_renderer().
+        :param label_wrap: Line wrapping of the node labels. "textwrap" counts
+            characters, "width" counts the display width, where East Asian
+            wide characters take two columns.
+        :param stream: Path of a DOT file, or a writable text file object. If
+            given, the nodes, edges and clusters are written to it as they are
+            declared instead of being kept in memory.
+        :param node_ids: Node id strategy. "sequential" numbers the nodes per
+            diagram, "stable" derives the ids from the node class, label and
+            cluster path, and "random" uses uuid4. A callable that takes a node
+            and returns its id is also accepted. Default is "sequential", or
+            "stable" with an incremental layout.
+        :param incremental: Lay out only the clusters that changed since the
+            last render if true, or with the given IncrementalLayout. The
+            cluster layouts are kept in the cache, or in memory without cache.
+        :param stats: Record the timings and the counters of the diagram in
+            Diagram.stats if true, or in the given DiagramStats, e.g. with hooks.
+        :param engine: Layout engine. One of "dot", "neato", "fdp", "sfdp",
+            "osage", "circo" or "twopi", or "auto" to start with dot and use
+            cheaper splines and engines for large graphs.
+        :param layout_timeout: Seconds before a layout is killed. With a layout
+            policy, the next cheaper layout is tried, and the timeout of the
+            cheapest one raises subprocess.TimeoutExpired.
+        :param layout_policy: LayoutPolicy with the thresholds of the automatic
+            layout. Default is LayoutPolicy() with engine "auto", and no policy
+            otherwise.
+        :param pages: Render an overview page and a page per top-level cluster
+            in parallel instead of one image. See render_pages().
+        :param native_svg: Lay out chain and tree shaped diagrams in Python and
+            write svg without Graphviz if true. Other diagrams are laid out by
+            Graphviz.
+        :param progress_badges: Draw the percent done and the number of acts
+            of the ActTable nodes under the cluster labels if true. The
+            numbers are kept in Diagram.progress either way.
         """
         self.name = name
         if not name and not filename:
@@ -120,7 +217,12 @@ class Diagram:
         elif not filename:
             filename = "_".join(self.name.split()).lower()
         self.filename = filename
-        self.dot = Digraph(self.name, filename=self.filename)
+        if stream is not None:
+            from ooda_flow_diagram.stream import StreamingDigraph
+
+            self.dot = StreamingDigraph(self.name, stream)
+        else:
+            self.dot = ModelDigraph(self.name)
 
         # Set attributes.
         for k, v in self._default_graph_attrs.items():
@@ -139,9 +241,23 @@ class Diagram:
             raise ValueError(f'"{curvestyle}" is not a valid curvestyle')
         self.dot.graph_attr["splines"] = curvestyle
 
-        if not self._validate_outformat(outformat):
+        if engine != "auto" and engine not in ENGINES:
+            raise ValueError(f'"{engine}" is not a valid layout engine')
+        self.dot.engine = "dot" if engine == "auto" else engine
+        if engine == "auto" and layout_policy is None:
+            layout_policy = LayoutPolicy()
+        self.layout_policy = layout_policy
+        self.layout_timeout = layout_timeout
+
+        outformats = [outformat] if isinstance(outformat, str) else list(outformat)
+        if not outformats:
             raise ValueError(f'"{outformat}" is not a valid output format')
-        self.outformat = outformat
+        for format in outformats:
+            if not self._validate_outformat(format):
+                raise ValueError(f'"{format}" is not a valid output format')
+        # outformat is the first format, used by pipe() and save() without a format.
+        self.outformats = list(dict.fromkeys(outformats))
+        self.outformat = self.outformats[0]
 
         self.dot.graph_attr['labelloc'] = label_loc
 
@@ -151,23 +267,165 @@ class Diagram:
         self.dot.edge_attr.update(edge_attr)
 
         self.show = show
+        self.cache = cache
+        self.autorender = render
+        self.print_source = print_source
+        self.renderer = renderer
+        if label_wrap not in self.__label_wraps:
+            raise ValueError(f'"{label_wrap}" is not a valid label wrap')
+        self.label_wrap = label_wrap
+        if incremental is True:
+            from ooda_flow_diagram.incremental import IncrementalLayout
+
+            incremental = IncrementalLayout(cache)
+        if incremental and stream is not None:
+            raise ValueError("A streamed diagram can not be laid out incrementally")
+        if node_ids is None:
+            # The cluster layouts are cached by their source, which must not
+            # change when a node is added to another cluster.
+            node_ids = "stable" if incremental else "sequential"
+        elif incremental and node_ids in ("sequential", "random"):
+            raise ValueError(f'"{node_ids}" node ids can not be laid out incrementally')
+        self.node_ids = node_ids
+        self._node_id = ids.get_strategy(node_ids)
+        self.incremental = incremental or None
+        if stats is True:
+            from ooda_flow_diagram.stats import DiagramStats
+
+            stats = DiagramStats()
+        self.stats = stats or None
+        # Start of the build phase, until it is recorded when the building ends.
+        self._build_start = time.perf_counter() if self.stats is not None else None
+        if pages and stream is not None:
+            raise ValueError("A streamed diagram can not be rendered in pages")
+        self.pages = pages
+        self.native_svg = native_svg
+        if progress_badges and stream is not None:
+            raise ValueError("A streamed diagram can not draw progress badges")
+        self.progress_badges = progress_badges
+        self._progress = None
+        self._streamed = stream is not None
+        self._frozen = False
+        self._tokens = None
+        # Clusters created by cluster() and not closed yet.
+        self._open_clusters = []
+        # Path returned by the last render().
+        self._outfile = None
 
     def __str__(self) -> str:
         return str(self.dot)
 
     def __enter__(self):
         # Diagramクラスをコンテキスト変数("diagram")にセット
-        setdiagram(self)
+        # A cluster of an outer diagram is not the cluster of this one.
+        self._tokens = (setdiagram(self), setcluster(None))
+        if self._build_start is not None:
+            self._build_start = time.perf_counter()
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.render()
-        # Remove the graphviz file leaving only the image.
-        os.remove(self.filename)
-        setdiagram(None)
+        self._close_clusters()
+        self._frozen = True
+        if self._streamed:
+            self.dot.close()
+        self._finish_build()
+        try:
+            if self.autorender:
+                self.render()
+        finally:
+            diagram_token, cluster_token = self._tokens
+            # Tokens can not be pickled, e.g. to render the diagram in another process.
+            self._tokens = None
+            resetcluster(cluster_token)
+            resetdiagram(diagram_token)
 
     def _repr_png_(self):
-        return self.dot.pipe(format="png")
+        return self.pipe("png")
+
+    @property
+    def progress(self) -> "ProgressIndex":
+        """Return the progress index of the ActTable nodes of the diagram."""
+        if self._progress is None:
+            from ooda_flow_diagram.progress import ProgressIndex
+
+            self._progress = ProgressIndex()
+        return self._progress
+
+    @contextlib.contextmanager
+    def _context(self, cluster: "Cluster" = None):
+        """Make this diagram and cluster current in the with-block."""
+        diagram_token = setdiagram(self)
+        cluster_token = setcluster(cluster)
+        try:
+            yield
+        finally:
+            resetcluster(cluster_token)
+            resetdiagram(diagram_token)
+
+    def add(self, node_class: Type["Node"], *args, cluster: "Cluster" = None, **kwargs) -> "Node":
+        """Create a node of node_class in this diagram, or in cluster of this diagram.
+
+        Unlike creating the node in the with-block of the diagram, it does not
+        depend on the current diagram, so a diagram can be built from any
+        thread or task.
+
+        :param args: Arguments of node_class.
+        :param cluster: Cluster of the node, created by cluster().
+        :param kwargs: Keyword arguments of node_class.
+        """
+        self._check_frozen()
+        if cluster is not None and cluster._diagram is not self:
+            raise ValueError(f'"{cluster.label}" is not a cluster of this diagram')
+        with self._context(cluster):
+            return node_class(*args, **kwargs)
+
+    def cluster(self, label: str = "cluster", direction: str = "LR", graph_attr: dict = {},
+                parent: "Cluster" = None) -> "Cluster":
+        """Create a cluster in this diagram, or in parent of this diagram.
+
+        Its nodes are created with add(). The cluster is placed in the graph
+        when it is created, and closed by Cluster.close(), which draws its
+        progress badge. The clusters that are not closed are closed when the
+        diagram is exited, rendered or converted to DOT.
+
+        A streamed cluster is written as its nodes are added, so only the
+        innermost open cluster can be added to. Adding to another one raises
+        ValueError.
+        """
+        self._check_frozen()
+        if parent is not None and parent._diagram is not self:
+            raise ValueError(f'"{parent.label}" is not a cluster of this diagram')
+        if parent is not None and parent._closed:
+            raise ValueError(f'"{parent.label}" is already closed')
+        with self._context(parent):
+            cluster = Cluster(label, direction, graph_attr)
+        if not self._streamed:
+            # The model keeps the place of the cluster, so it is not lost if
+            # close() is forgotten. A streamed cluster is placed when it is closed.
+            cluster._place()
+        self._open_clusters.append(cluster)
+        return cluster
+
+    def _close_clusters(self) -> None:
+        """Close the clusters created by cluster() that are still open."""
+        clusters, self._open_clusters = self._open_clusters, []
+        for cluster in clusters:
+            cluster.close()
+
+    def _finish_build(self) -> None:
+        """Close the clusters left open, and record the build phase the first time.
+
+        It is called when the context exits, and when a diagram built with
+        add() without a with-block is converted to DOT, rendered or dumped.
+        """
+        self._close_clusters()
+        if self._build_start is not None:
+            start, self._build_start = self._build_start, None
+            self.stats.add("build", start, time.perf_counter(), {"diagram": self.name})
+
+    def _check_frozen(self) -> None:
+        if self._frozen:
+            raise RuntimeError(f'Diagram "{self.name}" is frozen after its context exited')
 
     def _validate_direction(self, direction: str) -> bool:
         direction = direction.upper()
@@ -190,27 +448,492 @@ class Diagram:
                 return True
         return False
 
-    def node(self, nodeid: str, label: str, **attrs) -> None:
-        """Create a new node."""
-        self.dot.node(nodeid, label=label, **attrs)
+    def node(self, nodeid: str, label: str, _attributes: Dict = None, **attrs) -> None:
+        """Create a new node.
+
+        :param _attributes: Attributes shared with other nodes, overridden by attrs.
+        """
+        self._check_frozen()
+        self.dot.node(nodeid, label=label, _attributes=_attributes, **attrs)
 
     def connect(self, node: "Node", node2: "Node", edge: "Edge") -> None:
-        """Connect the two Nodes."""
+        """Connect the two Nodes. An edge declared again with the same attributes is kept once."""
+        self._check_frozen()
+        count = self.dot.edge_count
         self.dot.edge(node.nodeid, node2.nodeid, **edge.attrs)
+        if self.stats is not None:
+            self.stats.edges += self.dot.edge_count - count
+
+    def connect_many(self, pairs: Iterable[Tuple["Node", "Node"]], edge: "Edge") -> None:
+        """Connect the (tail, head) pairs of Nodes with edges of the same attributes."""
+        self._check_frozen()
+        pairs = [(node.nodeid, node2.nodeid) for node, node2 in pairs]
+        count = self.dot.edge_count
+        self.dot.edges(pairs, **edge.attrs)
+        if self.stats is not None:
+            self.stats.edges += self.dot.edge_count - count
+
+    def same_rank(self, node: "Node", node2: "Node") -> None:
+        """Place the two Nodes on the same rank.
+
+        The nodes joined by repeated calls are merged into one rank group,
+        which is written in the innermost cluster containing its nodes when
+        the source is generated.
+        """
+        self._check_frozen()
+        clusters = set()
+        cluster = node._cluster
+        while cluster is not None:
+            clusters.add(cluster)
+            cluster = cluster._parent
+        cluster = node2._cluster
+        while cluster is not None and cluster not in clusters:
+            cluster = cluster._parent
+        self.dot.same_rank(node.nodeid, node2.nodeid, cluster.dot if cluster is not None else None)
 
         # ここに入れると、上位のクラスタの設定が上書きされてします。
         # with self.dot.subgraph() as s:
         #     s.graph_attr['rank'] = 'same'
         #     s.edge(node.nodeid, node2.nodeid, **edge.attrs)
 
-    def subgraph(self, dot: Digraph) -> None:
-        """Create a subgraph for clustering"""
+    def subgraph(self, dot: "Digraph") -> None:
+        """Create a subgraph for clustering.
+
+        :param dot: Graph of a cluster, or a graphviz.Digraph whose statements
+            are added as they are.
+        """
+        self._check_frozen()
         self.dot.subgraph(dot)
 
-    def render(self) -> None:
-        self.dot.render(format=self.outformat, view=self.show, quiet=True)
-        # ソース表示追加
-        print(self.dot.source)
+    def _new_subgraph(self, name: str, parent: "Cluster" = None):
+        """Return the graph of a new cluster."""
+        return self.dot.new_subgraph(name, parent.dot if parent else None)
+
+    def _streamed_file(self) -> str:
+        """Return the path of the streamed DOT file, or None if the source is in memory."""
+        if self._streamed and self.dot.filepath is not None:
+            self._finish_build()
+            self.dot.close()
+            return self.dot.filepath
+        return None
+
+    def _cache_key(self, format: str) -> str:
+        path = self._streamed_file()
+        if path is not None:
+            return self.cache.key_file(path, self.dot.engine, format)
+        engine = self.dot.engine
+        if self.incremental is not None:
+            # The incremental image is drawn by another engine than a full layout.
+            engine += "+" + self.incremental.engine
+        elif self._native(format):
+            engine = "native"
+        elif self.layout_policy is not None:
+            # A layout degraded by a timeout is also kept under this key, so the
+            # next render does not wait for the timeout again.
+            engine = "%s:%s" % self.layout_plan()[0]
+        return self.cache.key(self.dot.source, engine, format)
+
+    def _span(self, name: str, **attributes):
+        if self.stats is None:
+            return _NO_SPAN
+        return self.stats.span(name, **attributes)
+
+    def _source(self, splines: str = None) -> str:
+        """Return the DOT source, timed and counted with stats.
+
+        :param splines: Splines of this source, if they differ from the diagram.
+        """
+        self._finish_build()
+        graph_attr = self.dot.graph_attr
+        current = graph_attr.get("splines")
+        if splines is None or splines == current:
+            with self._span("dot"):
+                source = self.dot.source
+        else:
+            graph_attr["splines"] = splines
+            try:
+                with self._span("dot"):
+                    source = self.dot.source
+            finally:
+                graph_attr["splines"] = current
+        if self.stats is not None:
+            self.stats.dot_bytes = len(source.encode(self.dot.encoding))
+        return source
+
+    def _graph_size(self) -> Tuple[int, int]:
+        if self._streamed:
+            return self.dot.node_count, self.dot.edge_count
+        return len(self.dot.model.nodes), len(self.dot.model.edges)
+
+    def layout_plan(self) -> List[Tuple[str, str]]:
+        """Return the (engine, splines) layouts tried by rendering, in order.
+
+        Without a layout policy, it is only the engine and the splines of the
+        diagram. With a layout timeout, the next layout is tried when one times
+        out, and otherwise only the first one is used.
+        """
+        engine, splines = self.dot.engine, self.dot.graph_attr.get("splines")
+        if self.layout_policy is None:
+            return [(engine, splines)]
+        steps = self.layout_policy.plan(engine, splines, *self._graph_size())
+        if self._streamed:
+            # The splines were written to the head of the DOT file.
+            steps = list(dict.fromkeys((engine, splines) for engine, _ in steps))
+        return steps
+
+    def _layout_steps(self) -> List[Tuple[str, str]]:
+        steps = self.layout_plan()
+        return steps if self.layout_timeout is not None else steps[:1]
+
+    def _count_timeout(self) -> None:
+        if self.stats is not None:
+            self.stats.layout_timeouts += 1
+
+    def _native(self, format: str) -> bool:
+        return self.native_svg and format == "svg" and not self._streamed and self.incremental is None
+
+    def _native_layout(self, format: str) -> Optional[bytes]:
+        """Return the svg laid out without Graphviz, or None if the graph is not a chain or tree."""
+        from ooda_flow_diagram.svg import render_svg
+
+        with self._span("layout", engine="native", format=format):
+            return render_svg(self.dot.model)
+
+    def _layout(self, format: str) -> bytes:
+        if self._native(format):
+            data = self._native_layout(format)
+            if data is not None:
+                return data
+        return self._graphviz_layout(format)
+
+    def _graphviz_layout(self, format: str) -> bytes:
+        renderer = self.renderer or get_default_renderer()
+        if self.incremental is not None:
+            with self._span("layout", engine=self.incremental.engine, format=format):
+                return self.incremental.pipe(self.dot.model, format, renderer, self.dot.encoding)
+        return self._try_layouts(lambda engine, splines: self._layout_once(renderer, format, engine, splines))
+
+    def _try_layouts(self, layout: Callable[[str, str], Any]) -> Any:
+        """Return layout(engine, splines) of the first layout step that does not time out."""
+        steps = self._layout_steps()
+        if len(steps) > 1:
+            import subprocess
+
+            for engine, splines in steps[:-1]:
+                try:
+                    return layout(engine, splines)
+                except subprocess.TimeoutExpired:
+                    self._count_timeout()
+        return layout(*steps[-1])
+
+    def _layout_many(self, formats: List[str]) -> Dict[str, bytes]:
+        result = {}
+        for format in formats:
+            if self._native(format):
+                data = self._native_layout(format)
+                if data is not None:
+                    result[format] = data
+        rest = [format for format in formats if format not in result]
+        if len(rest) == 1 or (rest and self.incremental is not None):
+            # The incremental layout keeps positioned clusters instead of one layout.
+            for format in rest:
+                result[format] = self._graphviz_layout(format)
+        elif rest:
+            renderer = self.renderer or get_default_renderer()
+            result.update(self._try_layouts(
+                lambda engine, splines: self._layout_once_many(renderer, rest, engine, splines)))
+        return result
+
+    def _layout_once_many(self, renderer, formats: List[str], engine: str, splines: str) -> Dict[str, bytes]:
+        path = self._streamed_file()
+        if path is not None:
+            if self.stats is not None:
+                self.stats.dot_bytes = os.path.getsize(path)
+            with self._span("layout", engine=engine, format=",".join(formats)):
+                return pipe_file_many(renderer, path, engine, formats, self.layout_timeout)
+        source = self._source(splines)
+        with self._span("layout", engine=engine, format=",".join(formats)):
+            return pipe_many(renderer, source, engine, formats, self.dot.encoding, self.layout_timeout)
+
+    def _layout_once(self, renderer, format: str, engine: str, splines: str) -> bytes:
+        timeout = timeout_kwargs(self.layout_timeout)
+        path = self._streamed_file()
+        if path is not None:
+            if self.stats is not None:
+                self.stats.dot_bytes = os.path.getsize(path)
+            with self._span("layout", engine=engine, format=format):
+                return renderer.pipe_file(path, engine, format, **timeout)
+        source = self._source(splines)
+        with self._span("layout", engine=engine, format=format):
+            return renderer.pipe(source, engine, format, self.dot.encoding, **timeout)
+
+    async def _alayout(self, format: str) -> bytes:
+        if self._native(format):
+            data = self._native_layout(format)
+            if data is not None:
+                return data
+        if self.incremental is not None:
+            import asyncio
+
+            return await asyncio.get_running_loop().run_in_executor(None, self._layout, format)
+        steps = self._layout_steps()
+        if len(steps) > 1:
+            import subprocess
+
+            for engine, splines in steps[:-1]:
+                try:
+                    return await self._alayout_once(format, engine, splines)
+                except subprocess.TimeoutExpired:
+                    self._count_timeout()
+        return await self._alayout_once(format, *steps[-1])
+
+    async def _alayout_once(self, format: str, engine: str, splines: str) -> bytes:
+        # asyncio is imported only by the applications that render asynchronously.
+        from ooda_flow_diagram import aio
+
+        path = self._streamed_file()
+        if path is not None:
+            if self.stats is not None:
+                self.stats.dot_bytes = os.path.getsize(path)
+            with self._span("layout", engine=engine, format=format):
+                return await aio.pipe_file(path, engine, format, self.layout_timeout)
+        source = self._source(splines)
+        with self._span("layout", engine=engine, format=format):
+            return await aio.pipe(source, engine, format, self.dot.encoding, self.layout_timeout)
+
+    def _options(self) -> Dict[str, Any]:
+        """Return the Diagram arguments that are not kept in the graph model."""
+        options = {
+            "name": self.name,
+            "filename": self.filename,
+            "outformat": self.outformats if len(self.outformats) > 1 else self.outformat,
+            "engine": "auto" if self.layout_policy is not None else self.dot.engine,
+            "layout_timeout": self.layout_timeout,
+            "pages": self.pages,
+            "native_svg": self.native_svg,
+            "label_wrap": self.label_wrap,
+            "progress_badges": self.progress_badges,
+        }
+        if isinstance(self.node_ids, str):
+            options["node_ids"] = self.node_ids
+        return options
+
+    def dump(self, file: Union[str, IO[bytes]]) -> None:
+        """Write the built graph and the output settings in a compact binary form.
+
+        Diagram.load() reads it back in a fraction of the time of building the
+        diagram again. The nodes, clusters and edges and the progress records
+        are kept, while the Node and Cluster objects, the render cache, the
+        renderer and the stats are not.
+
+        :param file: Path, or binary file object.
+        """
+        if self._streamed:
+            raise ValueError("A streamed diagram can not be dumped")
+        self._finish_build()
+        from ooda_flow_diagram import serialize
+
+        options = self._options()
+        if self._progress is not None and len(self._progress):
+            options["progress"] = self._progress.records()
+        serialize.dump(self.dot.model, file, options)
+
+    @classmethod
+    def load(cls, file: Union[str, IO[bytes]], **kwargs) -> "Diagram":
+        """Return the Diagram written by dump(). It is frozen, and not rendered until requested.
+
+        Its progress index is rebuilt from the dumped records, and takes the
+        clusters by their paths, e.g. "First OODA Loop/Acts".
+
+        :param file: Path, or binary file object.
+        :param kwargs: Diagram arguments overriding the dumped ones, e.g. cache
+            or renderer.
+        """
+        from ooda_flow_diagram import serialize
+
+        model, options = serialize.load(file)
+        records = options.pop("progress", None)
+        options.update(show=False, render=False)
+        options.update(kwargs)
+        diagram = cls(**options)
+        diagram.dot = ModelDigraph.from_model(model, diagram.dot.engine, diagram.dot.encoding)
+        # A loaded diagram is not built.
+        diagram._build_start = None
+        if records:
+            from ooda_flow_diagram.progress import ProgressIndex
+
+            diagram._progress = ProgressIndex.from_records(records)
+        diagram._frozen = True
+        return diagram
+
+    def to_dot(self) -> str:
+        """Return the DOT source of the diagram."""
+        self._finish_build()
+        return self.dot.source
+
+    def pipe(self, format: str = None) -> bytes:
+        """Render the diagram and return the image bytes.
+
+        :param format: Output format. Default is the outformat of the diagram.
+        """
+        format = format or self.outformat
+        if self.cache is None:
+            return self._layout(format)
+        key = self._cache_key(format)
+        data = self.cache.get(key)
+        self._count_cache(data is not None)
+        if data is None:
+            data = self._layout(format)
+            self.cache.put(key, data)
+        return data
+
+    def pipe_many(self, formats: Sequence[str] = None) -> Dict[str, bytes]:
+        """Render the diagram in several formats from one layout and return the bytes of each format.
+
+        The formats found in the cache are not laid out again.
+
+        :param formats: Output formats. Default is the outformat list of the diagram.
+        """
+        formats = list(dict.fromkeys(formats or self.outformats))
+        result, keys = {}, {}
+        if self.cache is not None:
+            for format in formats:
+                keys[format] = self._cache_key(format)
+                data = self.cache.get(keys[format])
+                self._count_cache(data is not None)
+                if data is not None:
+                    result[format] = data
+        missing = [format for format in formats if format not in result]
+        if missing:
+            for format, data in self._layout_many(missing).items():
+                result[format] = data
+                if self.cache is not None:
+                    self.cache.put(keys[format], data)
+        return {format: result[format] for format in formats}
+
+    def _count_cache(self, hit: bool) -> None:
+        if self.stats is None:
+            return
+        if hit:
+            self.stats.render_cache_hits += 1
+        else:
+            self.stats.render_cache_misses += 1
+
+    def save(self, path: str) -> str:
+        """Render the diagram to path without writing the DOT source file.
+
+        The output format is taken from the extension of path if it is a valid
+        output format, and from the outformat of the diagram otherwise.
+        """
+        format = os.path.splitext(path)[1][1:].lower()
+        if not format or not self._validate_outformat(format):
+            format = self.outformat
+        if self.cache is not None:
+            if self.cache.copy_to(self._cache_key(format), path):
+                return path
+        data = self.pipe(format)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    async def apipe(self, format: str = None) -> bytes:
+        """Render the diagram without blocking the event loop and return the image bytes.
+
+        :param format: Output format. Default is the outformat of the diagram.
+        """
+        format = format or self.outformat
+        if self.cache is None:
+            return await self._alayout(format)
+        key = self._cache_key(format)
+        data = self.cache.get(key)
+        self._count_cache(data is not None)
+        if data is None:
+            data = await self._alayout(format)
+            self.cache.put(key, data)
+        return data
+
+    def _save_outformats(self, images: Dict[str, bytes]) -> List[str]:
+        outfiles = []
+        for format, data in images.items():
+            outfile = f"{self.filename}.{format}"
+            with open(outfile, "wb") as f:
+                f.write(data)
+            outfiles.append(outfile)
+        return outfiles
+
+    async def arender(self) -> str:
+        """Render the diagram to the output files without blocking the event loop.
+
+        :return: Path of the file of the first outformat.
+        """
+        if len(self.outformats) > 1:
+            import asyncio
+
+            images = await asyncio.get_running_loop().run_in_executor(None, self.pipe_many)
+            outfile = self._save_outformats(images)[0]
+        else:
+            outfile = f"{self.filename}.{self.outformat}"
+            data = await self.apipe(self.outformat)
+            with open(outfile, "wb") as f:
+                f.write(data)
+        if self.show:
+            import graphviz
+
+            graphviz.view(outfile)
+        return outfile
+
+    def render_pages(self, directory: str = None, format: Union[str, Sequence[str]] = None,
+                     workers: int = None) -> List[str]:
+        """Render an overview page and a page per top-level cluster in parallel.
+
+        Each cluster is laid out on its own page. The edges to other clusters
+        end at stub nodes linked to their pages, and the overview shows every
+        cluster as a node linked to its page. The links work in svg.
+
+        :param directory: Directory of the pages. Default is the directory of
+            the filename.
+        :param format: Output format, or a list of formats rendered from one
+            layout per page. Default is the outformats of the diagram.
+        :param workers: Number of layouts running at the same time. Default is
+            the CPU count.
+        :return: Paths of the overview page, filename.<format>, and the cluster
+            pages, filename_1.<format>, filename_2.<format>, ..., in the first format.
+        """
+        from ooda_flow_diagram.pages import render_pages
+
+        self._finish_build()
+        return render_pages(self, directory, format, workers)
+
+    def render(self) -> str:
+        """Render the diagram to the output files and return the path of the first outformat.
+
+        The outformats of a list are rendered from one layout. With pages, the
+        path is the one of the overview page.
+        """
+        self._finish_build()
+        if self.pages:
+            outfile = self.render_pages(format=self.outformats)[0]
+        elif len(self.outformats) > 1:
+            outfile = self._save_outformats(self.pipe_many())[0]
+        else:
+            outfile = self.save(f"{self.filename}.{self.outformat}")
+        if self.show:
+            import graphviz
+
+            graphviz.view(outfile)
+        if self.print_source:
+            print(self.dot.source)
+        self._outfile = outfile
+        return outfile
+
+
+def _badged_label(label: str, badge: str) -> str:
+    """Return the cluster label with the progress badge on a line of its own."""
+    if lang.HTML_STRING.match(label):
+        # An HTML-like label may be a table, which can not be followed by text.
+        return ('<<table border="0" cellborder="0" cellspacing="0"><tr><td>%s</td></tr><tr><td>%s</td></tr></table>>'
+                % (label[1:-1], html.escape(badge)))
+    return "%s\\n%s" % (label, badge)
 
 
 class Cluster:
@@ -245,7 +968,17 @@ class Cluster:
         self.label = label
         self.name = "cluster_" + self.label
 
-        self.dot = Digraph(self.name)
+        # Node must be belong to a diagrams.
+        self._diagram = getdiagram()
+        if self._diagram is None:
+            raise EnvironmentError("Global diagrams context not set up")
+        self._parent = getcluster()
+
+        self.dot = self._diagram._new_subgraph(self.name, self._parent)
+        if self._parent is not None:
+            self._parent._children.append(self)
+        if self._diagram.stats is not None:
+            self._diagram.stats.clusters += 1
 
         # Set attributes.
         for k, v in self._default_graph_attrs.items():
@@ -257,12 +990,6 @@ class Cluster:
         self.dot.graph_attr["rankdir"] = direction
         # self.dot.graph_attr["rank"] = "same" きかない
 
-        # Node must be belong to a diagrams.
-        self._diagram = getdiagram()
-        if self._diagram is None:
-            raise EnvironmentError("Global diagrams context not set up")
-        self._parent = getcluster()
-
         # Set cluster depth for distinguishing the background color
         self.depth = self._parent.depth + 1 if self._parent else 0
         coloridx = self.depth % len(self.__bgcolors)
@@ -270,18 +997,60 @@ class Cluster:
 
         # Merge passed in attributes
         self.dot.graph_attr.update(graph_attr)
+        self._token = None
+        self._children = []
+        self._placed = False
+        self._closed = False
 
     def __enter__(self):
-        setcluster(self)
+        self._token = setcluster(self)
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        if self._parent:
-            self._parent.subgraph(self.dot)
-        else:
-            self._diagram.subgraph(self.dot)
-        setcluster(self._parent)
+        try:
+            self.close()
+        finally:
+            token, self._token = self._token, None
+            resetcluster(token)
+
+    def close(self) -> None:
+        """Close the cluster and its open subclusters, and place it in its parent.
+
+        It is called when the with-block exits.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        # A subcluster created by cluster() may still be open, e.g. when the
+        # parent is closed first.
+        for child in self._children:
+            child.close()
+        self._children = []
+        diagram = self._diagram
+        if diagram.progress_badges and diagram._progress is not None:
+            # The subclusters are closed first, so their acts are in the rollup.
+            rollup = diagram._progress.rollup(self)
+            if rollup.total:
+                label = self.dot.graph_attr.get("label", self.label)
+                self.dot.graph_attr["label"] = _badged_label(label, rollup.badge())
+        if not self._placed:
+            self._place()
+
+    def _place(self) -> None:
+        self._placed = True
+        with self._diagram._span("subgraph", cluster=self.label):
+            if self._parent:
+                self._parent.subgraph(self.dot)
+            else:
+                self._diagram.subgraph(self.dot)
+
+    def add(self, node_class: Type["Node"], *args, **kwargs) -> "Node":
+        """Create a node of node_class in this cluster. See Diagram.add()."""
+        return self._diagram.add(node_class, *args, cluster=self, **kwargs)
 
+    def cluster(self, label: str = "cluster", direction: str = "LR", graph_attr: dict = {}) -> "Cluster":
+        """Create a cluster in this cluster. See Diagram.cluster()."""
+        return self._diagram.cluster(label, direction, graph_attr, parent=self)
 
     def _validate_direction(self, direction: str):
         direction = direction.upper()
@@ -290,11 +1059,12 @@ class Cluster:
                 return True
         return False
 
-    def node(self, nodeid: str, label: str, **attrs) -> None:
+    def node(self, nodeid: str, label: str, _attributes: Dict = None, **attrs) -> None:
         """Create a new node in the cluster."""
-        self.dot.node(nodeid, label=label, **attrs)
+        self.dot.node(nodeid, label=label, _attributes=_attributes, **attrs)
 
-    def subgraph(self, dot: Digraph) -> None:
+    def subgraph(self, dot: "Digraph") -> None:
+        """Create a subgraph in the cluster. See Diagram.subgraph()."""
         self.dot.subgraph(dot)
 
 
@@ -306,7 +1076,7 @@ class Node:
 
     _icon_dir = None
     _icon = None
-    _ds_attr: OodaNodeAttr = None
+    _ds_attr: "OodaNodeAttr" = None
 
     _height = 1.9
 
@@ -321,9 +1091,19 @@ class Node:
 
         :param label: Node label.
         """
-        # Generates an ID for identifying a node.
-        self._id = self._rand_id()
         self.label = label
+        # The label text as it is given, before the label is generated from it.
+        self._label_text = label
+
+        # Node must be belong to a diagrams.
+        self._diagram = getdiagram()
+        if self._diagram is None:
+            raise EnvironmentError("Global diagrams context not set up")
+        self._cluster = getcluster()
+
+        # Attributes shared by all nodes of the same type, and the attributes
+        # of this node only. The shared attributes are never modified.
+        self._base_attrs = None
 
         # fmt: off
         # If a node has an icon, increase the height slightly to avoid
@@ -338,17 +1118,23 @@ class Node:
             }
         # Ds系の設定をここに追加している。
         elif self._ds_attr is not None:
-            # line_lengthの更新
-            if line_length is not None:
-                self._ds_attr.line_length = line_length
-            self._ds_attr.url = url
-            self.label = self._ds_attr.create_label(
+            stats = self._diagram.stats
+            if stats is not None:
+                start = time.perf_counter()
+            # line_lengthとurlはこのノードだけに適用する
+            ds_attr = self._ds_attr.copy_with(line_length=line_length, url=url,
+                                              wrap_mode=self._diagram.label_wrap)
+            self.label = ds_attr.create_label(
                 label=label, subject=subject, line_mark=line_mark,
                 label2=label2, subject2=subject2, line_mark2=line_mark2,
-                label3=label3, subject3=subject3, line_mark3=line_mark3)
+                label3=label3, subject3=subject3, line_mark3=line_mark3, stats=stats)
             # self._set_label(label, subject, line_mark)
+            if stats is not None:
+                # Labels are timed in total, not as a span per node.
+                stats.tally("labels", time.perf_counter() - start)
 
-            self._attrs = self._ds_attr.attrs
+            self._base_attrs = ds_attr.attrs
+            self._attrs = {"URL": url} if url is not None else {}
 
         else:
             self._attrs = {}
@@ -356,33 +1142,32 @@ class Node:
         # fmt: on
         self._attrs.update(attrs)
 
-        # Node must be belong to a diagrams.
-        self._diagram = getdiagram()
-        if self._diagram is None:
-            raise EnvironmentError("Global diagrams context not set up")
-        self._cluster = getcluster()
+        # Generates an ID for identifying a node.
+        self._id = self._diagram._node_id(self)
 
         # If a node is in the cluster context, add it to cluster.
         if self._cluster:
-            self._cluster.node(self._id, self.label, **self._attrs)
+            self._cluster.node(self._id, self.label, _attributes=self._base_attrs, **self._attrs)
         else:
-            self._diagram.node(self._id, self.label, **self._attrs)
+            self._diagram.node(self._id, self.label, _attributes=self._base_attrs, **self._attrs)
+        if self._diagram.stats is not None:
+            self._diagram.stats.nodes += 1
 
     def __repr__(self):
         _name = self.__class__.__name__
         return f"<{self._provider}.{self._type}.{_name}>"
 
     def __add__(self, other: "Node"):
+        """Implements Self + Node. Both are placed on the same rank and connected."""
         if isinstance(other, Node):
-            with self._diagram.dot.subgraph() as s:
-                s.graph_attr['rank'] = 'same'
-                other.connect(self, Edge(self))
+            self._diagram.same_rank(self, other)
+            other.connect(self, Edge(self))
+            return other
 
     def __sub__(self, other: Union["Node", List["Node"], "Edge"]):
         """Implement Self - Node, Self - [Nodes] and Self - Edge."""
         if isinstance(other, list):
-            for node in other:
-                self.connect(node, Edge(self))
+            self._diagram.connect_many([(self, node) for node in other], Edge(self))
             return other
         elif isinstance(other, Node):
             return self.connect(other, Edge(self))
@@ -392,18 +1177,13 @@ class Node:
 
     def __rsub__(self, other: Union[List["Node"], List["Edge"]]):
         """ Called for [Nodes] and [Edges] - Self because list don't have __sub__ operators. """
-        for o in other:
-            if isinstance(o, Edge):
-                o.connect(self)
-            else:
-                o.connect(self, Edge(self))
+        self._connect_from(other, forward=False, reverse=False)
         return self
 
     def __rshift__(self, other: Union["Node", List["Node"], "Edge"]):
         """Implements Self >> Node, Self >> [Nodes] and Self Edge."""
         if isinstance(other, list):
-            for node in other:
-                self.connect(node, Edge(self, forward=True))
+            self._diagram.connect_many([(self, node) for node in other], Edge(self, forward=True))
             return other
         elif isinstance(other, Node):
             return self.connect(other, Edge(self, forward=True))
@@ -415,8 +1195,7 @@ class Node:
     def __lshift__(self, other: Union["Node", List["Node"], "Edge"]):
         """Implements Self << Node, Self << [Nodes] and Self << Edge."""
         if isinstance(other, list):
-            for node in other:
-                self.connect(node, Edge(self, reverse=True))
+            self._diagram.connect_many([(self, node) for node in other], Edge(self, reverse=True))
             return other
         elif isinstance(other, Node):
             return self.connect(other, Edge(self, reverse=True))
@@ -426,23 +1205,29 @@ class Node:
 
     def __rrshift__(self, other: Union[List["Node"], List["Edge"]]):
         """Called for [Nodes] and [Edges] >> Self because list don't have __rshift__ operators."""
-        for o in other:
-            if isinstance(o, Edge):
-                o.forward = True
-                o.connect(self)
-            else:
-                o.connect(self, Edge(self, forward=True))
+        self._connect_from(other, forward=True, reverse=False)
         return self
 
     def __rlshift__(self, other: Union[List["Node"], List["Edge"]]):
         """Called for [Nodes] << Self because list of Nodes don't have __lshift__ operators."""
+        self._connect_from(other, forward=False, reverse=True)
+        return self
+
+    def _connect_from(self, other: Union[List["Node"], List["Edge"]], forward: bool, reverse: bool) -> None:
+        """Connect the Nodes and Edges of other to this node, the runs of Nodes in bulk."""
+        pairs = []
         for o in other:
             if isinstance(o, Edge):
-                o.reverse = True
+                if pairs:
+                    self._diagram.connect_many(pairs, Edge(self, forward=forward, reverse=reverse))
+                    pairs = []
+                o.forward = o.forward or forward
+                o.reverse = o.reverse or reverse
                 o.connect(self)
             else:
-                o.connect(self, Edge(self, reverse=True))
-        return self
+                pairs.append((o, self))
+        if pairs:
+            self._diagram.connect_many(pairs, Edge(self, forward=forward, reverse=reverse))
 
     @property
     def nodeid(self):
@@ -464,13 +1249,12 @@ class Node:
         self._diagram.connect(self, node, edge)
         return node
 
-    @staticmethod
-    def _rand_id():
-        return uuid.uuid4().hex
-
     def _load_icon(self):
-        basedir = Path(os.path.abspath(os.path.dirname(__file__)))
-        return os.path.join(basedir.parent, self._icon_dir, self._icon)
+        key = (self._icon_dir, self._icon)
+        path = _icon_paths.get(key)
+        if path is None:
+            path = _icon_paths[key] = os.path.join(_BASE_DIR, self._icon_dir, self._icon)
+        return path
 
 
 
@@ -576,8 +1360,7 @@ class Edge:
 
     def connect(self, other: Union["Node", "Edge", List["Node"]]):
         if isinstance(other, list):
-            for node in other:
-                self.node.connect(node, self)
+            self.node._diagram.connect_many([(self.node, node) for node in other], self)
             return other
         elif isinstance(other, Edge):
             self._attrs = other._attrs.copy()
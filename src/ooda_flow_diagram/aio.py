@@ -0,0 +1,97 @@
+import asyncio
+import os
+import subprocess
+import weakref
+
+from graphviz import ExecutableNotFound
+
+# Maximum number of layout processes running at the same time per event loop.
+_max_concurrency = os.cpu_count() or 1
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def set_max_concurrency(limit: int) -> None:
+    """Set the maximum number of concurrent layout processes.
+
+    It applies to the event loops that start rendering after this call.
+    """
+    global _max_concurrency
+    if limit < 1:
+        raise ValueError(f'"{limit}" is not a valid concurrency limit')
+    _max_concurrency = limit
+    _semaphores.clear()
+
+
+def _semaphore() -> asyncio.Semaphore:
+    # A semaphore is bound to the event loop it is used in, so keep one per loop.
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(_max_concurrency)
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+async def _communicate(proc, cmd, input: bytes = None, timeout: float = None):
+    try:
+        return await asyncio.wait_for(proc.communicate(input), timeout)
+    except asyncio.TimeoutError:
+        await _kill(proc)
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    except BaseException:
+        # The awaiting task is cancelled: the process must not outlive the semaphore slot.
+        await _kill(proc)
+        raise
+
+
+async def _kill(proc) -> None:
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+    # Wait even if this task is cancelled again, so the process is reaped.
+    await asyncio.shield(proc.wait())
+
+
+async def pipe(source: str, engine: str = "dot", format: str = "png", encoding: str = "utf-8",
+               timeout: float = None) -> bytes:
+    """Lay out the DOT source without blocking the event loop.
+
+    The source is written to the stdin of the layout process and the output is
+    read from its stdout, so no temporary files are written.
+
+    :param source: DOT source.
+    :param engine: Layout engine command.
+    :param format: Output format.
+    :param encoding: Encoding of the DOT source.
+    :param timeout: Seconds before the layout process is killed and
+        subprocess.TimeoutExpired is raised. Default is no timeout.
+    :return: The rendered bytes.
+    """
+    cmd = [engine, f"-T{format}"]
+    async with _semaphore():
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            raise ExecutableNotFound(cmd)
+        out, err = await _communicate(proc, cmd, source.encode(encoding), timeout)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output=out, stderr=err)
+    return out
+
+
+async def pipe_file(path: str, engine: str = "dot", format: str = "png", timeout: float = None) -> bytes:
+    """Lay out the DOT file at path without blocking the event loop."""
+    cmd = [engine, f"-T{format}", path]
+    async with _semaphore():
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            raise ExecutableNotFound(cmd)
+        out, err = await _communicate(proc, cmd, timeout=timeout)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output=out, stderr=err)
+    return out
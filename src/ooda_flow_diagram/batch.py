@@ -0,0 +1,70 @@
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, NamedTuple, Optional, Union
+
+from ooda_flow_diagram import Diagram
+
+
+class RenderResult(NamedTuple):
+    """Outcome of rendering one diagram with render_many."""
+
+    name: str
+    outfile: Optional[str]
+    elapsed: float
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+DiagramSource = Union[Diagram, Callable[[], Diagram]]
+
+
+def _render_one(item: DiagramSource) -> RenderResult:
+    start = time.perf_counter()
+    name = getattr(item, "name", None) or getattr(item, "__name__", repr(item))
+    try:
+        if isinstance(item, Diagram):
+            diagram, outfile = item, None
+        else:
+            # The factory builds the diagram inside the worker. It may have
+            # rendered it, e.g. a diagram with render=True when its context exits.
+            diagram = item()
+            if not isinstance(diagram, Diagram):
+                raise TypeError(f"{item!r} did not return a Diagram")
+            outfile = diagram._outfile
+        name = diagram.name or diagram.filename
+        if outfile is None:
+            # Worker processes must not open a viewer for every board.
+            diagram.show = False
+            outfile = diagram.render()
+    except Exception:
+        return RenderResult(name, None, time.perf_counter() - start, traceback.format_exc())
+    return RenderResult(name, outfile, time.perf_counter() - start)
+
+
+def render_many(diagrams: Iterable[DiagramSource], workers: int = None) -> List[RenderResult]:
+    """Render many diagrams in a process pool.
+
+    :param diagrams: Built Diagram objects, or picklable factories that build
+        and return a Diagram. Build the Diagram objects with render=False, so
+        that they are laid out only in the worker processes. The diagrams of
+        the factories are rendered when they have not rendered themselves,
+        e.g. with render=False, and factories rendering in their context
+        should create the Diagram with show=False.
+    :param workers: Number of worker processes. Default is the CPU count.
+        With 1, the diagrams are rendered in the current process.
+    :return: RenderResult per diagram, in the input order. Errors are
+        recorded in the results instead of being raised.
+    """
+    items = list(diagrams)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(items))
+    if workers <= 1:
+        return [_render_one(item) for item in items]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_render_one, items))
@@ -0,0 +1,178 @@
+"""
+Declarative board files.
+
+A board file describes a Diagram with its clusters, nodes and edges::
+
+    diagram:
+      name: Hotel Cancellation Prediction
+      direction: TB
+      outformat: svg
+    clusters:
+      Goal: {direction: TB}
+    nodes:
+      - {id: major, type: MajorTarget, label: Binary classification, cluster: Goal}
+      - {id: t1, type: Target, label: Select features, cluster: First OODA Loop}
+    edges:
+      - {from: major, to: t1}
+
+The node and edge entries are the rows of bulk.load(). Boards are read from
+YAML (.yaml, .yml, PyYAML is required), JSON (.json) or JSON Lines (.jsonl,
+one {"diagram": ...}, {"clusters": ...}, {"node": ...} or {"edge": ...} object
+per line) files. Large YAML files are parsed one entry at a time, so the parse
+tree of the whole file is never built.
+"""
+import json
+import os
+from typing import Any, Dict, Iterator, List, Tuple
+
+from ooda_flow_diagram import Diagram
+from ooda_flow_diagram import bulk
+
+# YAML files larger than this are parsed entry by entry with the pure Python
+# parser, and smaller ones at once with the faster libyaml parser if available.
+YAML_STREAM_SIZE = 4 * 1024 * 1024
+
+DIAGRAM_OPTIONS = ("name", "filename", "direction", "curvestyle", "outformat", "label_loc", "graph_attr",
+                   "node_attr", "edge_attr", "label_wrap", "node_ids", "engine", "layout_timeout",
+                   "pages", "native_svg", "progress_badges")
+_SECTIONS = {"diagram": "diagram", "clusters": "clusters", "nodes": "nodes", "edges": "edges",
+             "node": "nodes", "edge": "edges"}
+
+
+def _yaml():
+    try:
+        import yaml
+    except ImportError:
+        raise ImportError("PyYAML is required to read YAML boards: pip install pyyaml") from None
+    return yaml
+
+
+def _read_yaml_stream(f) -> Iterator[Tuple[str, Any]]:
+    yaml = _yaml()
+    events = yaml.events
+    loader = yaml.SafeLoader(f)
+    try:
+        loader.get_event()
+        if loader.check_event(events.StreamEndEvent):
+            return
+        loader.get_event()
+        if not loader.check_event(events.MappingStartEvent):
+            raise ValueError("A board must be a mapping")
+        loader.get_event()
+        while not loader.check_event(events.MappingEndEvent):
+            key = loader.construct_document(loader.compose_node(None, None))
+            if key in ("nodes", "edges") and loader.check_event(events.SequenceStartEvent):
+                loader.get_event()
+                while not loader.check_event(events.SequenceEndEvent):
+                    yield key, loader.construct_document(loader.compose_node(None, None))
+                loader.get_event()
+            else:
+                yield key, loader.construct_document(loader.compose_node(None, None))
+    finally:
+        loader.dispose()
+
+
+def _sections(board: Any) -> Iterator[Tuple[str, Any]]:
+    if not isinstance(board, dict):
+        raise ValueError("A board must be a mapping")
+    for key, value in board.items():
+        if key in ("nodes", "edges"):
+            for row in value or ():
+                yield key, row
+        else:
+            yield key, value
+
+
+def read_board(path: str) -> Iterator[Tuple[str, Any]]:
+    """Yield the sections of the board file in file order.
+
+    The nodes and the edges are yielded one by one as ("nodes", row) and
+    ("edges", row), the other sections as (name, value).
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8") as f:
+        if ext in (".yaml", ".yml"):
+            if os.fstat(f.fileno()).st_size > YAML_STREAM_SIZE:
+                yield from _read_yaml_stream(f)
+            else:
+                yaml = _yaml()
+                yield from _sections(yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)))
+        elif ext == ".json":
+            yield from _sections(json.load(f))
+        elif ext == ".jsonl":
+            for line in f:
+                if line.strip():
+                    yield from _sections(json.loads(line))
+        else:
+            raise ValueError(f'"{path}" is not a valid board file')
+
+
+def load_board(path: str, **options) -> Diagram:
+    """Build the Diagram of the board file.
+
+    The output file is placed next to the board file, and it is not rendered
+    unless render=True is given.
+
+    :param options: Diagram arguments that override the diagram section.
+    """
+    header: Dict[str, Any] = {}
+    clusters: Dict[str, Any] = {}
+    nodes, edges = [], []
+    for key, value in read_board(path):
+        section = _SECTIONS.get(key)
+        if section is None:
+            raise ValueError(f'"{key}" is not a valid board section')
+        if section == "nodes":
+            nodes.append(value)
+        elif section == "edges":
+            edges.append(value)
+        elif section == "clusters":
+            clusters.update(value or {})
+        else:
+            header.update(value or {})
+    for key in header:
+        if key not in DIAGRAM_OPTIONS:
+            raise ValueError(f'"{key}" is not a valid diagram option')
+
+    base = os.path.splitext(path)[0]
+    filename = header.get("filename")
+    header["filename"] = os.path.join(os.path.dirname(path), filename) if filename else base
+    header.setdefault("show", False)
+    header.setdefault("render", False)
+    header.update(options)
+    with Diagram(**header) as diagram:
+        bulk.load(nodes, edges, clusters)
+    return diagram
+
+
+def output_paths(path: str, **options) -> List[str]:
+    """Return the paths of the images of every outformat of the board file, without building it."""
+    header = {}
+    for key, value in read_board(path):
+        if key == "diagram":
+            header.update(value or {})
+        elif key in ("nodes", "edges"):
+            # The diagram section comes first in the usual layout.
+            break
+    header.update(options)
+    filename = header.get("filename")
+    base = os.path.join(os.path.dirname(path), filename) if filename else os.path.splitext(path)[0]
+    outformat = header.get("outformat", "png")
+    outformats = [outformat] if isinstance(outformat, str) else outformat
+    return ["%s.%s" % (base, format) for format in outformats]
+
+
+def output_path(path: str, **options) -> str:
+    """Return the path of the image rendered from the board file, without building it.
+
+    For a list of outformats, it is the path of the first one, which is
+    returned by Diagram.render().
+    """
+    return output_paths(path, **options)[0]
+
+
+def render_board(path: str, **options) -> Diagram:
+    """Build and render the board file. It is picklable for batch.render_many."""
+    diagram = load_board(path, **options)
+    diagram.render()
+    return diagram
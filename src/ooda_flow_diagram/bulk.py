@@ -0,0 +1,195 @@
+"""
+Bulk construction of OODA boards from tabular data.
+
+A board exported from a project tracker has thousands of tasks. Writing it with
+the operator DSL creates an Edge object per connection and checks the nodes on
+every call. load() takes rows of nodes and edges instead, creates each cluster
+once, and writes the edges directly to the graph.
+"""
+import csv
+import inspect
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+from ooda_flow_diagram import Cluster, Diagram, Edge, Node, getcluster, getdiagram
+from ooda_flow_diagram.ooda import basic
+
+NODE_TYPES = {
+    cls.__name__: cls
+    for cls in (basic.MajorTarget, basic.Target, basic.MajorPrerequisite, basic.Prerequisite,
+                basic.ActCells, basic.ActTable, basic.Result)
+}
+
+# Rows are a sequence of mappings, or a mapping of columns.
+Rows = Union[Iterable[Mapping[str, Any]], Mapping[str, Sequence[Any]]]
+# Key of the nodes of the rows without an id, by row number. The ids of the
+# boards are names or numbers, so the keys do not collide with them.
+ROW_KEY = "__row_%d"
+
+_EDGE_DIRECTIONS = ("forward", "back", "both", "none")
+_EDGE_KEYS = ("from", "to", "dir")
+_parameters: Dict[type, Dict[str, Any]] = {}
+
+
+def _rows(rows: Rows) -> Iterable[Mapping[str, Any]]:
+    if isinstance(rows, Mapping):
+        names = list(rows)
+        return (dict(zip(names, values)) for values in zip(*(rows[name] for name in names)))
+    return rows
+
+
+def _cluster_path(value) -> tuple:
+    if not value:
+        return ()
+    if isinstance(value, str):
+        return tuple(value.split("/"))
+    return tuple(value)
+
+
+def _node_kwargs(cls: type, row: Mapping[str, Any]) -> Dict[str, Any]:
+    """Return the constructor arguments of cls in row.
+
+    The other columns, e.g. the ones of the other node types in a CSV file,
+    are ignored. Strings of integer parameters are converted.
+    """
+    parameters = _parameters.get(cls)
+    if parameters is None:
+        signature = inspect.signature(cls.__init__)
+        parameters = _parameters[cls] = {
+            name: p.annotation for name, p in signature.parameters.items() if name != "self"}
+    kwargs = {}
+    for name, value in row.items():
+        if value is None or name not in parameters:
+            continue
+        if parameters[name] is int and isinstance(value, str):
+            if not value:
+                continue
+            value = int(value)
+        kwargs[name] = value
+    return kwargs
+
+
+class _ClusterTree:
+    __slots__ = ("rows", "children")
+
+    def __init__(self):
+        # (row number, row) of the nodes of the cluster.
+        self.rows: List[Tuple[int, Mapping[str, Any]]] = []
+        self.children: Dict[str, "_ClusterTree"] = {}
+
+
+def _create(tree: _ClusterTree, path: tuple, clusters: Mapping[str, Mapping[str, Any]],
+            created: Dict[str, Node]) -> None:
+    for number, row in tree.rows:
+        node_type = row.get("type")
+        cls = NODE_TYPES.get(node_type)
+        if cls is None:
+            raise ValueError(f'"{node_type}" is not a valid node type')
+        key = str(row["id"]) if row.get("id") is not None else ROW_KEY % number
+        if key in created:
+            raise ValueError(f'"{key}" is a duplicate node id')
+        created[key] = cls(**_node_kwargs(cls, row))
+    for name, child in tree.children.items():
+        child_path = path + (name,)
+        with Cluster(name, **clusters.get("/".join(child_path), {})):
+            _create(child, child_path, clusters, created)
+
+
+def _attr_value(value: Any) -> str:
+    # Lists of JSON and YAML boards, e.g. "style": ["dashed", "bold"], are DOT lists.
+    if isinstance(value, (list, tuple)):
+        return ",".join(map(_attr_value, value))
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _edge_attrs(row: Mapping[str, Any]) -> Dict[str, str]:
+    direction = row.get("dir") or "forward"
+    if direction not in _EDGE_DIRECTIONS:
+        raise ValueError(f'"{direction}" is not a valid edge direction')
+    attrs = dict(Edge._default_edge_attrs)
+    for k, v in row.items():
+        if k in _EDGE_KEYS or v is None or v == "":
+            continue
+        v = _attr_value(v)
+        attrs[k] = "cluster_" + v if k in ("ltail", "lhead") else v
+    attrs["dir"] = direction
+    return attrs
+
+
+def load(nodes: Rows, edges: Rows = (), clusters: Mapping[str, Mapping[str, Any]] = None,
+         diagram: Diagram = None) -> Dict[str, Node]:
+    """Create the nodes, clusters and edges of a board in one pass.
+
+    A node row has the node "type", i.e. the class name in ooda.basic, an "id"
+    referred to by the edges, an optional "cluster" path such as
+    "First OODA Loop/Acts", and the constructor arguments of the type. An edge
+    row has "from" and "to" ids, an optional "dir" (default "forward") and
+    edge attributes such as "label", "color" or "style".
+
+    The nodes are created in the current cluster, grouped by their cluster, and
+    every cluster is entered once.
+
+    :param nodes: Node rows, as mappings or as a mapping of columns.
+    :param edges: Edge rows, as mappings or as a mapping of columns.
+    :param clusters: Cluster arguments, e.g. direction or graph_attr, by path.
+    :param diagram: Diagram to add to. Default is the current diagram.
+    :return: The created nodes by id. The nodes of the rows without an id are
+        returned by ROW_KEY and their row number, e.g. "__row_3".
+    """
+    previous = getdiagram()
+    diagram = diagram or previous
+    if diagram is None:
+        raise EnvironmentError("Global diagrams context not set up")
+    diagram._check_frozen()
+
+    tree = _ClusterTree()
+    for number, row in enumerate(_rows(nodes)):
+        subtree = tree
+        for name in _cluster_path(row.get("cluster")):
+            subtree = subtree.children.setdefault(name, _ClusterTree())
+        subtree.rows.append((number, row))
+
+    created: Dict[str, Node] = {}
+    # The nodes are created in the current cluster of the current diagram only.
+    with diagram._context(getcluster() if diagram is previous else None):
+        _create(tree, (), clusters or {}, created)
+
+    dot = diagram.dot
+    # Most edges have the same style, so their attributes are built once.
+    styles: Dict[tuple, Dict[str, str]] = {}
+    edge_count = dot.edge_count
+    for row in _rows(edges):
+        try:
+            tail, head = created[str(row["from"])], created[str(row["to"])]
+        except KeyError as e:
+            raise ValueError(f'"{e.args[0]}" is not a valid node id') from None
+        style = tuple(item for item in row.items() if item[0] != "from" and item[0] != "to")
+        try:
+            attrs = styles.get(style)
+        except TypeError:
+            # A row with a list value is not cached.
+            attrs = _edge_attrs(row)
+        else:
+            if attrs is None:
+                attrs = styles[style] = _edge_attrs(row)
+        dot.edge(tail.nodeid, head.nodeid, **attrs)
+    if diagram.stats is not None:
+        # The repeated edges are added once.
+        diagram.stats.edges += dot.edge_count - edge_count
+    return created
+
+
+def load_csv(nodes_path: str, edges_path: Optional[str] = None, encoding: str = "utf-8",
+             **kwargs) -> Dict[str, Node]:
+    """Create a board from CSV files with the columns described in load().
+
+    Empty cells are treated as missing values.
+    """
+    with open(nodes_path, newline="", encoding=encoding) as f:
+        nodes = [{k: v for k, v in row.items() if v != ""} for row in csv.DictReader(f)]
+    edges = []
+    if edges_path is not None:
+        with open(edges_path, newline="", encoding=encoding) as f:
+            edges = list(csv.DictReader(f))
+    return load(nodes, edges, **kwargs)
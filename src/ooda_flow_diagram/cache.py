@@ -0,0 +1,156 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional, Union
+
+# Default location of the render cache. It can be moved with the
+# OODA_FLOW_CACHE_DIR environment variable.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ooda_flow_diagram")
+
+
+class RenderCache:
+    """RenderCache stores rendered diagrams on disk keyed by their DOT source.
+
+    The key is the sha256 digest of the DOT source, the layout engine and the
+    output format, so two boards with the same source share one blob. Blobs are
+    evicted in least recently used order when the total size exceeds max_size.
+    """
+
+    def __init__(self, directory: Union[str, Path] = None, max_size: int = 512 * 1024 * 1024,
+                 link: bool = False):
+        """RenderCache represents an on-disk render cache.
+
+        :param directory: Cache directory. Default is $OODA_FLOW_CACHE_DIR or
+            ~/.cache/ooda_flow_diagram.
+        :param max_size: Maximum total size of the cached blobs in bytes.
+        :param link: Hard link cached blobs into place instead of copying them.
+        """
+        if directory is None:
+            directory = os.environ.get("OODA_FLOW_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.link = link
+
+    @staticmethod
+    def key(source: str, engine: str, outformat: str) -> str:
+        """Return the cache key of a DOT source rendered with engine to outformat."""
+        digest = hashlib.sha256()
+        for part in (engine, outformat, source):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def key_file(path: Union[str, Path], engine: str, outformat: str) -> str:
+        """Return the cache key of the DOT file at path, read in chunks.
+
+        It is equal to the key of the same source given as a string.
+        """
+        digest = hashlib.sha256()
+        for part in (engine, outformat):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _blob(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Return the path of the cached blob, or None on a miss."""
+        blob = self._blob(key)
+        try:
+            # mtime is the recency stamp used by the LRU eviction.
+            os.utime(blob)
+        except FileNotFoundError:
+            return None
+        return blob
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached bytes, or None on a miss."""
+        blob = self.lookup(key)
+        if blob is None:
+            return None
+        try:
+            return blob.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def copy_to(self, key: str, dest: Union[str, Path]) -> bool:
+        """Place the cached blob at dest. Return False on a miss."""
+        blob = self.lookup(key)
+        if blob is None:
+            return False
+        try:
+            if self.link:
+                try:
+                    if os.path.lexists(dest):
+                        os.remove(dest)
+                    os.link(blob, dest)
+                    return True
+                except OSError:
+                    # Cross-device or unsupported file system, fall back to copy.
+                    pass
+            shutil.copyfile(blob, dest)
+        except FileNotFoundError:
+            # The blob was evicted by another process in the meantime.
+            return False
+        return True
+
+    def put(self, key: str, data: bytes) -> Path:
+        """Store data under key and return the blob path."""
+        blob = self._blob(key)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file and rename it, so that readers never see
+        # a partially written blob.
+        fd, tmp = tempfile.mkstemp(dir=blob.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, blob)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+        return blob
+
+    def put_file(self, key: str, path: Union[str, Path]) -> Path:
+        """Store the contents of the file at path under key."""
+        with open(path, "rb") as f:
+            return self.put(key, f.read())
+
+    def evict(self) -> None:
+        """Remove the least recently used blobs until the cache fits max_size."""
+        entries = []
+        total = 0
+        for blob in self.directory.glob("*/*"):
+            if blob.name.startswith(".tmp-"):
+                continue
+            try:
+                st = blob.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, blob))
+            total += st.st_size
+        if total <= self.max_size:
+            return
+        entries.sort()
+        for _, size, blob in entries:
+            try:
+                blob.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_size:
+                break
+
+    def clear(self) -> None:
+        """Remove all cached blobs."""
+        if self.directory.exists():
+            shutil.rmtree(self.directory)
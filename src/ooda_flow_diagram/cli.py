@@ -0,0 +1,120 @@
+"""
+Command line interface.
+
+    ooda-flow render boards/*.yaml -j 4
+    ooda-flow diff yesterday.yaml today.yaml -o changes.svg
+"""
+import argparse
+import functools
+import glob
+import os
+import sys
+from typing import List, Optional
+
+from ooda_flow_diagram import __version__
+from ooda_flow_diagram.layout import ENGINES
+
+
+def _is_up_to_date(path: str, outfiles: List[str]) -> bool:
+    try:
+        mtime = os.path.getmtime(path)
+        return all(os.path.getmtime(outfile) >= mtime for outfile in outfiles)
+    except OSError:
+        return False
+
+
+def _expand(patterns: List[str]) -> List[str]:
+    # The shell of Windows does not expand the patterns.
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        paths.extend(matches if matches else [pattern])
+    return paths
+
+
+def render(args: argparse.Namespace) -> int:
+    from ooda_flow_diagram.batch import render_many
+    from ooda_flow_diagram.board import output_paths, render_board
+
+    options = {}
+    if args.format:
+        options["outformat"] = args.format[0] if len(args.format) == 1 else args.format
+    if args.engine:
+        options["engine"] = args.engine
+    if args.timeout:
+        options["layout_timeout"] = args.timeout
+    if args.pages:
+        options["pages"] = True
+    paths, factories = [], []
+    for path in _expand(args.boards):
+        if not args.force and _is_up_to_date(path, output_paths(path, **options)):
+            if args.verbose:
+                print(f"{path}: up to date")
+            continue
+        paths.append(path)
+        factories.append(functools.partial(render_board, path, **options))
+
+    status = 0
+    for path, result in zip(paths, render_many(factories, workers=args.jobs)):
+        if result.ok:
+            print(f"{result.outfile} ({result.elapsed:.2f}s)")
+        else:
+            status = 1
+            print(f"{path}: error\n{result.error}", file=sys.stderr)
+    return status
+
+
+def diff(args: argparse.Namespace) -> int:
+    from ooda_flow_diagram.board import load_board
+    from ooda_flow_diagram.diff import diff as diff_boards
+
+    # Stable ids keep the ids of the unchanged nodes across versions.
+    board_diff = diff_boards(load_board(args.old, node_ids="stable"), load_board(args.new, node_ids="stable"))
+    if args.json:
+        print(board_diff.to_json(indent=2))
+    else:
+        result = board_diff.as_dict()
+        for kind in ("nodes", "edges"):
+            counts = ", ".join(f"{len(result[kind][change])} {change}" for change in ("added", "removed", "modified"))
+            print(f"{kind}: {counts}")
+    if args.output:
+        print(board_diff.render(args.output), file=sys.stderr)
+    return 1 if board_diff.changed and args.exit_code else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="ooda-flow", description="Render OODA flow diagrams.")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    render_parser = commands.add_parser("render", help="render board files (.yaml, .yml, .json, .jsonl)")
+    render_parser.add_argument("boards", nargs="+", help="board files or glob patterns")
+    render_parser.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes")
+    render_parser.add_argument("-T", "--format", choices=("png", "jpg", "svg", "pdf"), action="append",
+                               help="output format, overriding the board; repeat it to render several "
+                                    "formats from one layout")
+    render_parser.add_argument("-K", "--engine", choices=("auto",) + ENGINES,
+                               help="layout engine, overriding the board")
+    render_parser.add_argument("--timeout", type=float,
+                               help="seconds before a layout is killed; with -K auto, a cheaper layout is tried")
+    render_parser.add_argument("--pages", action="store_true",
+                               help="render an overview and a linked page per top-level cluster")
+    render_parser.add_argument("-f", "--force", action="store_true",
+                               help="also render the boards whose output is up to date")
+    render_parser.add_argument("-v", "--verbose", action="store_true", help="report the skipped boards")
+    render_parser.set_defaults(func=render)
+
+    diff_parser = commands.add_parser("diff", help="compare two versions of a board file")
+    diff_parser.add_argument("old", help="board file of the old version")
+    diff_parser.add_argument("new", help="board file of the new version")
+    diff_parser.add_argument("--json", action="store_true", help="print the changes as JSON")
+    diff_parser.add_argument("-o", "--output", help="render the new version with the changes highlighted")
+    diff_parser.add_argument("--exit-code", action="store_true", help="exit with 1 if the versions differ")
+    diff_parser.set_defaults(func=diff)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
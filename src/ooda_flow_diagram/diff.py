@@ -0,0 +1,353 @@
+"""
+Structural diff between two versions of a board.
+
+The nodes of the two versions are matched in linear time by hashing: first by
+their content, i.e. the cluster path, the label and the attributes, then by an
+anchor, i.e. the cluster path, the node style and the first line of the label
+text, and last by their ids. A node matched by its content is unchanged even if
+its id moved, e.g. with sequential ids. A node matched by its anchor or id has
+been modified, e.g. when the progress of an ActTable moves from "50" to "done".
+Boards built with node_ids="stable" keep the ids of the nodes that did not
+change, which makes the last pass reliable.
+
+The progress of an ActTable is an icon in its label, so it is read from the
+icon path, and its bywhen, who and completed_date from the label rows, to be
+reported as fields of the node.
+
+The edges are compared by the names of their ends in the new version.
+"""
+import json
+import os
+import re
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+
+from ooda_flow_diagram import lang
+from ooda_flow_diagram.model import GraphModel
+
+if TYPE_CHECKING:
+    from ooda_flow_diagram import Diagram
+
+# Highlight attributes of the overlay.
+ADDED_ATTRS = {"color": "#00B894", "penwidth": "3.0"}
+MODIFIED_ATTRS = {"color": "#E17055", "penwidth": "3.0"}
+REMOVED_ATTRS = {"color": "#D63031", "fontcolor": "#D63031", "style": "dashed", "penwidth": "2.0"}
+REMOVED_CLUSTER_ATTRS = {"label": "Removed", "style": "dashed", "pencolor": "#D63031", "fontcolor": "#D63031"}
+
+# Name prefix of the nodes of the old version drawn on the overlay.
+REMOVED_PREFIX = "__removed_"
+
+_TAG = re.compile(r"<[^>]*>")
+# Line breaks of the DOT labels and the field separators of the records.
+_BREAK = re.compile(r"\\[nlr]|[{}|\n]")
+_SUBJECT = re.compile(r"\[[^\]]*\]$")
+# Head row of an ActTable label, with the progress icon if any.
+_ACT_HEAD = re.compile(r'<<table[^>]*><tr><td>\[[^\]]*\]</td><td>(?:<img src="([^"]*)"/>)?</td></tr>')
+_ACT_ROWS = {
+    "bywhen": re.compile(r"\[ByWhen\]: (.*?)<br"),
+    "who": re.compile(r"\[Who\]: (.*?)<br"),
+    "completed_date": re.compile(r"\[DoneDate\]: (.*?)<br"),
+}
+# Fields of the ActTable records, in the order of ProgressIndex.add().
+ACT_FIELDS = ("progress", "bywhen", "who", "completed_date")
+
+
+def label_text(label: Optional[str]) -> str:
+    """Return the text of a DOT, record or HTML label, one line per field or line."""
+    if not label:
+        return ""
+    if lang.HTML_STRING.match(label):
+        label = _TAG.sub("\n", label[1:-1])
+    lines = (line.strip() for line in _BREAK.split(label))
+    return "\n".join(line for line in lines if line)
+
+
+def act_fields(label: Optional[str]) -> Optional[Dict[str, str]]:
+    """Return the progress, bywhen, who and completed_date of an ActTable label, or None for other labels."""
+    match = _ACT_HEAD.match(label or "")
+    if match is None:
+        return None
+    icon = match.group(1)
+    fields = {"progress": os.path.splitext(os.path.basename(icon))[0] if icon else ""}
+    for field, pattern in _ACT_ROWS.items():
+        row = pattern.search(label, match.end())
+        fields[field] = row.group(1) if row else ""
+    return fields
+
+
+def _anchor_text(text: str) -> str:
+    # The first line that is not a subject such as [ToDo].
+    for line in text.split("\n"):
+        if not _SUBJECT.match(line):
+            return line
+    return ""
+
+
+def _model(diagram: Union["Diagram", GraphModel]) -> GraphModel:
+    if isinstance(diagram, GraphModel):
+        return diagram
+    if diagram._streamed:
+        raise ValueError("A streamed diagram can not be compared")
+    return diagram.dot.model
+
+
+class _Index:
+    """_Index holds the hashing keys of the nodes of one version."""
+
+    def __init__(self, model: GraphModel):
+        self.model = model
+        paths: Dict[int, str] = {-1: ""}
+
+        def path(cluster_id: int) -> str:
+            result = paths.get(cluster_id)
+            if result is None:
+                cluster = model.clusters[cluster_id]
+                # The name, as the label may carry a progress badge.
+                name = cluster.name or ""
+                if name.startswith("cluster_"):
+                    name = name[len("cluster_"):]
+                parent = path(cluster.parent)
+                result = paths[cluster_id] = parent + "/" + name if parent else name
+            return result
+
+        self.paths = [path(node.cluster) for node in model.nodes]
+        # The texts are only needed for the nodes that are not matched by content.
+        self._texts: Dict[int, str] = {}
+        # Sorted attribute items of the nodes, built once per pair of shared and own attribute sets.
+        styles: Dict[Tuple[int, int], Tuple] = {}
+        self.styles = []
+        for node in model.nodes:
+            key = (node.attrs, node.extra)
+            style = styles.get(key)
+            if style is None:
+                style = styles[key] = tuple(sorted(model.attrs.merged(*key).items()))
+            self.styles.append(style)
+
+    def text(self, node_id: int) -> str:
+        text = self._texts.get(node_id)
+        if text is None:
+            text = self._texts[node_id] = label_text(self.model.nodes[node_id].label)
+        return text
+
+    def content(self, node_id: int) -> Tuple:
+        node = self.model.nodes[node_id]
+        return self.paths[node_id], node.label, self.styles[node_id]
+
+    def anchor(self, node_id: int) -> Tuple:
+        node = self.model.nodes[node_id]
+        style = tuple(sorted(self.model.attrs.get(node.attrs).items()))
+        return self.paths[node_id], style, _anchor_text(self.text(node_id))
+
+    def name(self, node_id: int) -> Tuple:
+        return (self.model.nodes[node_id].name,)
+
+
+class BoardDiff:
+    """BoardDiff holds the nodes and edges added, removed and modified between two versions."""
+
+    def __init__(self, old: GraphModel, new: GraphModel):
+        """BoardDiff compares the old version of a board with the new one.
+
+        :param old: GraphModel of the old version.
+        :param new: GraphModel of the new version.
+        """
+        self.old = old
+        self.new = new
+        self._old_index, self._new_index = _Index(old), _Index(new)
+        # Node ids of the new version by node id of the old version.
+        self.matches: Dict[int, int] = {}
+        # (old id, new id, changed fields) of the modified nodes.
+        self.modified: List[Tuple[int, int, Tuple[str, ...]]] = []
+        self._match_nodes()
+        matched = set(self.matches.values())
+        self.added = [node_id for node_id in range(len(new.nodes)) if node_id not in matched]
+        self.removed = [node_id for node_id in range(len(old.nodes)) if node_id not in self.matches]
+        # (tail, head) names in the new version, and the attributes of the old and new edges.
+        self.added_edges: List[Tuple[str, str, Dict[str, str]]] = []
+        self.removed_edges: List[Tuple[str, str, Dict[str, str]]] = []
+        self.modified_edges: List[Tuple[str, str, Dict[str, str], Dict[str, str]]] = []
+        self._match_edges()
+
+    def _match_nodes(self) -> None:
+        old_index, new_index = self._old_index, self._new_index
+        old_ids, new_ids = list(range(len(self.old.nodes))), list(range(len(self.new.nodes)))
+        for key in ("content", "anchor", "name"):
+            old_key, new_key = getattr(old_index, key), getattr(new_index, key)
+            # Nodes with the same key are matched in declaration order.
+            buckets: Dict[Tuple, List[int]] = {}
+            for node_id in reversed(new_ids):
+                buckets.setdefault(new_key(node_id), []).append(node_id)
+            rest = []
+            for node_id in old_ids:
+                bucket = buckets.get(old_key(node_id))
+                if not bucket:
+                    rest.append(node_id)
+                    continue
+                new_id = bucket.pop()
+                self.matches[node_id] = new_id
+                if key != "content":
+                    self.modified.append((node_id, new_id, self._changes(node_id, new_id)))
+            matched = set(self.matches.values())
+            old_ids, new_ids = rest, [node_id for node_id in new_ids if node_id not in matched]
+        self.modified.sort(key=lambda item: item[1])
+
+    def _changes(self, old_id: int, new_id: int) -> Tuple[str, ...]:
+        old_index, new_index = self._old_index, self._new_index
+        changes = []
+        old_label, new_label = self.old.nodes[old_id].label, self.new.nodes[new_id].label
+        if old_label != new_label:
+            changes.append("label")
+            old_act, new_act = act_fields(old_label), act_fields(new_label)
+            if old_act is not None and new_act is not None:
+                changes.extend(field for field in ACT_FIELDS if old_act[field] != new_act[field])
+        if old_index.styles[old_id] != new_index.styles[new_id]:
+            changes.append("attrs")
+        if old_index.paths[old_id] != new_index.paths[new_id]:
+            changes.append("cluster")
+        if self.old.nodes[old_id].name != self.new.nodes[new_id].name:
+            changes.append("id")
+        return tuple(changes)
+
+    def _old_name(self, endpoint) -> str:
+        """Return the name in the new version of an edge end of the old version."""
+        if not isinstance(endpoint, int):
+            return endpoint
+        new_id = self.matches.get(endpoint)
+        if new_id is None:
+            return REMOVED_PREFIX + self.old.nodes[endpoint].name
+        return self.new.nodes[new_id].name
+
+    def _match_edges(self) -> None:
+        def edges(model: GraphModel, name) -> Dict[Tuple[str, str], List[Dict[str, str]]]:
+            result: Dict[Tuple[str, str], List[Dict[str, str]]] = {}
+            for edge in model.edges:
+                attrs = model.attrs.get(edge.attrs)
+                result.setdefault((name(edge.tail), name(edge.head)), []).append(attrs)
+            return result
+
+        new_name = lambda endpoint: self.new.nodes[endpoint].name if isinstance(endpoint, int) else endpoint
+        old_edges, new_edges = edges(self.old, self._old_name), edges(self.new, new_name)
+        for ends, new_attrs in new_edges.items():
+            old_attrs = old_edges.get(ends, [])
+            added = [attrs for attrs in new_attrs if attrs not in old_attrs]
+            removed = [attrs for attrs in old_attrs if attrs not in new_attrs]
+            if len(added) == 1 and len(removed) == 1:
+                self.modified_edges.append((ends[0], ends[1], removed[0], added[0]))
+                continue
+            self.added_edges.extend((ends[0], ends[1], attrs) for attrs in added)
+            self.removed_edges.extend((ends[0], ends[1], attrs) for attrs in removed)
+        for ends, old_attrs in old_edges.items():
+            if ends not in new_edges:
+                self.removed_edges.extend((ends[0], ends[1], attrs) for attrs in old_attrs)
+
+    @property
+    def changed(self) -> bool:
+        """Return True if any node or edge was added, removed or modified."""
+        return bool(self.added or self.removed or self.modified or self.added_edges or self.removed_edges
+                    or self.modified_edges)
+
+    def _node_dict(self, index: _Index, node_id: int) -> Dict[str, Any]:
+        label = index.model.nodes[node_id].label
+        item = {"id": index.model.nodes[node_id].name, "cluster": index.paths[node_id], "text": index.text(node_id)}
+        act = act_fields(label)
+        if act is not None:
+            item["act"] = act
+        return item
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the diff as a dict of JSON types, for bots and reports.
+
+        The dicts of the ActTable nodes have an "act" dict of their progress,
+        bywhen, who and completed_date, and the modified ones an "old_act" dict.
+        """
+        modified = []
+        for old_id, new_id, changes in self.modified:
+            item = self._node_dict(self._new_index, new_id)
+            item.update(old_id=self.old.nodes[old_id].name, old_text=self._old_index.text(old_id), changes=list(changes))
+            old_act = act_fields(self.old.nodes[old_id].label)
+            if old_act is not None:
+                item["old_act"] = old_act
+            modified.append(item)
+        return {
+            "nodes": {
+                "added": [self._node_dict(self._new_index, node_id) for node_id in self.added],
+                "removed": [self._node_dict(self._old_index, node_id) for node_id in self.removed],
+                "modified": modified,
+                "unchanged": len(self.matches) - len(self.modified),
+            },
+            "edges": {
+                "added": [{"tail": tail, "head": head, "attrs": attrs} for tail, head, attrs in self.added_edges],
+                "removed": [{"tail": tail, "head": head, "attrs": attrs} for tail, head, attrs in self.removed_edges],
+                "modified": [{"tail": tail, "head": head, "old_attrs": old, "attrs": new}
+                             for tail, head, old, new in self.modified_edges],
+            },
+        }
+
+    def to_json(self, indent: int = None) -> str:
+        return json.dumps(self.as_dict(), ensure_ascii=False, indent=indent)
+
+    def highlight(self) -> str:
+        """Return the DOT source of the new version with the changes highlighted.
+
+        Added nodes and edges are drawn in green and modified ones in orange.
+        Removed nodes are drawn dashed in red in a "Removed" cluster, and the
+        removed edges are drawn dashed in red.
+        """
+        new = self.new
+        overrides = {node_id: ADDED_ATTRS for node_id in self.added}
+        overrides.update((new_id, MODIFIED_ATTRS) for _, new_id, _ in self.modified)
+        styles = {(tail, head, tuple(attrs.items())): ADDED_ATTRS for tail, head, attrs in self.added_edges}
+        styles.update(((tail, head, tuple(attrs.items())), MODIFIED_ATTRS)
+                      for tail, head, _, attrs in self.modified_edges)
+        edge_overrides = {}
+        if styles:
+            for edge_id, edge in enumerate(new.edges):
+                key = (new.nodes[edge.tail].name if isinstance(edge.tail, int) else edge.tail,
+                       new.nodes[edge.head].name if isinstance(edge.head, int) else edge.head,
+                       tuple(new.attrs.get(edge.attrs).items()))
+                if key in styles:
+                    edge_overrides[edge_id] = styles[key]
+
+        lines = list(new.iter_lines(overrides, edge_overrides))
+        tail = lines.pop()
+        if self.removed:
+            lines.append("\tsubgraph %s {" % lang.quote("cluster" + REMOVED_PREFIX))
+            lines.append("\t\tgraph%s" % lang.attr_list(None, REMOVED_CLUSTER_ATTRS))
+            for node_id in self.removed:
+                node = self.old.nodes[node_id]
+                attrs = {**self.old.node_attrs(node_id), **REMOVED_ATTRS}
+                lines.append("\t\t%s%s" % (lang.quote(REMOVED_PREFIX + node.name), lang.attr_list(node.label, attrs)))
+            lines.append("\t" + lang.TAIL)
+        for tail_name, head_name, attrs in self.removed_edges:
+            lines.append("\t%s -> %s%s" % (lang.quote_edge(tail_name), lang.quote_edge(head_name),
+                                           lang.attr_list(None, {**attrs, **REMOVED_ATTRS})))
+        lines.append(tail)
+        return "\n".join(lines)
+
+    def render(self, path: str, format: str = None, renderer=None, engine: str = "dot") -> str:
+        """Render the highlight overlay to path and return the path.
+
+        :param format: Output format. Default is the extension of path.
+        :param renderer: Renderer of the layout. Default is the default renderer.
+        """
+        from ooda_flow_diagram.renderer import get_default_renderer
+
+        format = format or os.path.splitext(path)[1][1:].lower() or "svg"
+        renderer = renderer or get_default_renderer()
+        data = renderer.pipe(self.highlight(), engine, format, "utf-8")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def __repr__(self) -> str:
+        return (f"<BoardDiff added={len(self.added)} removed={len(self.removed)} modified={len(self.modified)} "
+                f"added_edges={len(self.added_edges)} removed_edges={len(self.removed_edges)} "
+                f"modified_edges={len(self.modified_edges)}>")
+
+
+def diff(old: Union["Diagram", GraphModel], new: Union["Diagram", GraphModel]) -> BoardDiff:
+    """Compare two versions of a board.
+
+    :param old: Diagram, or its GraphModel, of the old version.
+    :param new: Diagram, or its GraphModel, of the new version.
+    """
+    return BoardDiff(_model(old), _model(new))
@@ -0,0 +1,89 @@
+"""
+Node id strategies.
+
+A strategy is a callable that takes a Node and returns its id in the DOT
+source. Diagram creates a new instance of the named strategy for every diagram,
+so the sequential and the stable ids do not depend on the other diagrams.
+"""
+import hashlib
+import itertools
+from typing import Callable, Dict, Union
+
+NodeIdStrategy = Callable[["Node"], str]
+
+
+class SequentialIds:
+    """SequentialIds numbers the nodes in the order they are declared: n1, n2, ..."""
+
+    def __init__(self, prefix: str = "n"):
+        self.prefix = prefix
+        self._counter = itertools.count(1)
+
+    def __call__(self, node) -> str:
+        return "%s%d" % (self.prefix, next(self._counter))
+
+
+class StableIds:
+    """StableIds derives the ids from the node class, the label text and the cluster path.
+
+    A node keeps its id when other nodes are added or removed, so the DOT
+    sources of two versions of a board can be compared line by line. Nodes
+    with the same content in the same cluster are numbered in declaration order.
+
+    The label text is the one given to the node, e.g. the ToDo of an ActTable,
+    not the generated label, so an ActTable keeps its id when its progress or
+    its output changes, and the ids do not depend on the icon paths.
+    """
+
+    def __init__(self, prefix: str = "n", digest_size: int = 6):
+        self.prefix = prefix
+        self.digest_size = digest_size
+        self._used: Dict[str, int] = {}
+
+    @staticmethod
+    def cluster_path(node) -> str:
+        labels = []
+        cluster = node._cluster
+        while cluster is not None:
+            labels.append(cluster.label)
+            cluster = cluster._parent
+        return "/".join(reversed(labels))
+
+    @staticmethod
+    def label_text(node) -> str:
+        text = getattr(node, "_label_text", node.label)
+        return "\n".join(map(str, text)) if isinstance(text, list) else str(text)
+
+    def __call__(self, node) -> str:
+        digest = hashlib.blake2b(digest_size=self.digest_size)
+        for part in (type(node).__qualname__, self.cluster_path(node), self.label_text(node)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        nodeid = self.prefix + digest.hexdigest()
+        count = self._used.get(nodeid, 0) + 1
+        self._used[nodeid] = count
+        return nodeid if count == 1 else "%s_%d" % (nodeid, count)
+
+
+def random_id(node) -> str:
+    """Return a random uuid4 id, which changes on every run."""
+    import uuid
+
+    return uuid.uuid4().hex
+
+
+_strategies = {
+    "sequential": SequentialIds,
+    "stable": StableIds,
+    "random": lambda: random_id,
+}
+
+
+def get_strategy(node_ids: Union[str, NodeIdStrategy]) -> NodeIdStrategy:
+    """Return a new instance of the named strategy, or node_ids itself if it is callable."""
+    if callable(node_ids):
+        return node_ids
+    factory = _strategies.get(node_ids)
+    if factory is None:
+        raise ValueError(f'"{node_ids}" is not a valid node id strategy')
+    return factory()
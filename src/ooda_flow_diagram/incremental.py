@@ -0,0 +1,231 @@
+"""
+Incremental layout of diagrams.
+
+dot lays out the whole graph on every render, so updating the progress of one
+ActTable re-runs the layout of every cluster of the board. IncrementalLayout
+lays out every top-level cluster on its own and caches the result by the DOT
+source of the cluster, so only the clusters that changed are laid out again.
+The clusters are then placed by a layout of the top-level graph, where each
+cluster is a box of its size, and the final image is drawn by the nop2 layout,
+i.e. neato -n2, with every node pinned to its position and every cluster box
+given by its bb. The nodes of an anonymous top-level subgraph are laid out
+with the top-level graph.
+
+The cache keys are the DOT sources of the clusters, so the node ids must not
+depend on the other clusters: Diagram uses node_ids="stable" with an
+incremental layout. nop2 does not clip the edges at the cluster boxes, so the
+ltail and lhead of the edges are dropped with a warning.
+"""
+import json
+import warnings
+from typing import Dict, List, Mapping, Tuple
+
+from ooda_flow_diagram import lang
+
+from ooda_flow_diagram.cache import RenderCache
+from ooda_flow_diagram.model import _CLUSTER, _EDGE, _KINDS, _NODE, GraphModel
+
+# Layout of the final image. nop2 keeps the positions of the nodes, in points,
+# draws the clusters at their bb and routes the edges.
+FINAL_LAYOUT = "nop2"
+_COMPOUND_ATTRS = ("ltail", "lhead")
+
+# Graphviz uses points in its output and inches for the node sizes.
+POINTS_PER_INCH = 72.0
+
+
+class ClusterLayout:
+    """ClusterLayout is the layout of a cluster with its origin at the lower left corner."""
+
+    __slots__ = ("width", "height", "nodes", "clusters")
+
+    def __init__(self, width: float, height: float, nodes: Dict[str, Tuple[float, float]],
+                 clusters: Dict[str, Tuple[float, float, float, float]] = None):
+        self.width = width
+        self.height = height
+        self.nodes = nodes
+        # Bounding boxes of the cluster and its subclusters by name.
+        self.clusters = clusters or {}
+
+    @classmethod
+    def from_json(cls, data: bytes, name: str) -> "ClusterLayout":
+        """Read the layout of the cluster name from the -Tjson output of dot."""
+        graph = json.loads(data)
+        llx, lly, urx, ury = _bb(graph["bb"])
+        for obj in graph.get("objects", ()):
+            if obj.get("name") == name and "bb" in obj:
+                llx, lly, urx, ury = _bb(obj["bb"])
+                break
+        nodes, clusters = {}, {}
+        for obj in graph.get("objects", ()):
+            if "pos" in obj:
+                x, y = _point(obj["pos"])
+                nodes[obj["name"]] = (x - llx, y - lly)
+            elif "bb" in obj:
+                x1, y1, x2, y2 = _bb(obj["bb"])
+                clusters[obj["name"]] = (x1 - llx, y1 - lly, x2 - llx, y2 - lly)
+        return cls(urx - llx, ury - lly, nodes, clusters)
+
+
+def _bb(value: str) -> Tuple[float, ...]:
+    return tuple(float(v) for v in value.split(","))
+
+
+def _point(value: str) -> Tuple[float, float]:
+    x, y = value.split(",")[:2]
+    return float(x), float(y.rstrip("!"))
+
+
+class IncrementalLayout:
+    """IncrementalLayout renders a GraphModel re-using the layouts of its unchanged clusters."""
+
+    def __init__(self, cache: RenderCache = None, engine: str = "neato"):
+        """IncrementalLayout represents the cluster layouts of the diagrams.
+
+        :param cache: RenderCache to keep the cluster layouts across runs.
+            If not given, they are kept in memory.
+        :param engine: Layout command that draws the final image. The image
+            is laid out by nop2 whichever command runs it.
+        """
+        self.cache = cache
+        self.engine = engine
+        # Layouts used by the last render, by cache key.
+        self._memory: Dict[str, bytes] = {}
+        self._previous: Dict[str, bytes] = {}
+        # Number of clusters laid out and taken from the cache by the last render.
+        self.laid_out = 0
+        self.reused = 0
+
+    def _json(self, source: str, renderer) -> Tuple[bytes, bool]:
+        """Return the -Tjson output of dot for the source, and whether it was cached."""
+        key = RenderCache.key(source, "dot", "json")
+        data = self._previous.get(key)
+        if data is None and self.cache is not None:
+            data = self.cache.get(key)
+        cached = data is not None
+        if not cached:
+            data = renderer.pipe(source, "dot", "json")
+            if self.cache is not None:
+                self.cache.put(key, data)
+        self._memory[key] = data
+        return data, cached
+
+    @staticmethod
+    def _head(model: GraphModel) -> List[str]:
+        return [lang.HEAD % (lang.quote(model.name) + " " if model.name else "")] + list(
+            model._attr_lines(model.root, "\t"))
+
+    @staticmethod
+    def _check(model: GraphModel) -> None:
+        if model.raw:
+            raise ValueError("A diagram with graphviz subgraphs can not be laid out incrementally")
+
+    def cluster_sources(self, model: GraphModel) -> Dict[int, str]:
+        """Return the DOT source of every named top-level cluster with its inner edges."""
+        self._check(model)
+        inner: Dict[int, List[str]] = {}
+        for edge in model.edges:
+            tail = model.top_cluster(model.nodes[edge.tail].cluster) if isinstance(edge.tail, int) else -1
+            head = model.top_cluster(model.nodes[edge.head].cluster) if isinstance(edge.head, int) else -1
+            if tail >= 0 and tail == head:
+                inner.setdefault(tail, []).append(model.edge_line(edge))
+        head_lines = self._head(model)
+        sources = {}
+        for code in model.root.body:
+            index, kind = divmod(code, _KINDS)
+            if kind == _CLUSTER and model.clusters[index].name is not None:
+                lines = head_lines + list(model._graph_lines(model.clusters[index], "\t", cluster_id=index))
+                lines += inner.get(index, [])
+                lines.append(lang.TAIL)
+                sources[index] = "\n".join(lines)
+        return sources
+
+    def _skeleton(self, model: GraphModel, layouts: Mapping[int, ClusterLayout]) -> str:
+        """Return the top-level graph with every cluster replaced by a box of its size."""
+        lines = self._head(model)
+        for code in model.root.body:
+            index, kind = divmod(code, _KINDS)
+            if kind == _NODE or (kind == _CLUSTER and index not in layouts):
+                # The anonymous subgraphs are laid out with the top-level graph.
+                lines.extend(model._body_lines([code], "\t"))
+            elif kind == _CLUSTER:
+                layout = layouts[index]
+                lines.append("\t%s [label=\"\" shape=box fixedsize=true width=%.4f height=%.4f]" % (
+                    lang.quote(model.clusters[index].name),
+                    layout.width / POINTS_PER_INCH, layout.height / POINTS_PER_INCH))
+
+        def endpoint(node_id) -> str:
+            if not isinstance(node_id, int):
+                return node_id
+            top = model.top_cluster(model.nodes[node_id].cluster)
+            return model.clusters[top].name if top in layouts else model.nodes[node_id].name
+
+        for code in model.root.body:
+            index, kind = divmod(code, _KINDS)
+            if kind == _EDGE:
+                edge = model.edges[index]
+                tail, head = endpoint(edge.tail), endpoint(edge.head)
+                if tail != head:
+                    lines.append(model.edge_line(edge, tail=tail, head=head))
+        lines.append(lang.TAIL)
+        return "\n".join(lines)
+
+    def pinned_source(self, model: GraphModel, renderer) -> str:
+        """Return the DOT source with every node pinned to its laid out position."""
+        self.laid_out = self.reused = 0
+        self._previous, self._memory = self._memory, {}
+        layouts = {}
+        for index, source in self.cluster_sources(model).items():
+            data, cached = self._json(source, renderer)
+            if cached:
+                self.reused += 1
+            else:
+                self.laid_out += 1
+            layouts[index] = ClusterLayout.from_json(data, model.clusters[index].name)
+        # The top-level graph is small, with one box per cluster, so it is
+        # laid out again on every change.
+        skeleton = json.loads(self._json(self._skeleton(model, layouts), renderer)[0])
+        centers = {}
+        for obj in skeleton.get("objects", ()):
+            if "pos" in obj:
+                centers[obj["name"]] = _point(obj["pos"])
+
+        # Lower left corners of the top-level clusters.
+        origins = {}
+        for index, layout in layouts.items():
+            cx, cy = centers[model.clusters[index].name]
+            origins[index] = (cx - layout.width / 2, cy - layout.height / 2)
+        overrides = {}
+        for node_id, node in enumerate(model.nodes):
+            top = model.top_cluster(node.cluster)
+            if top in layouts:
+                (ox, oy), (rx, ry) = origins[top], layouts[top].nodes[node.name]
+                x, y = ox + rx, oy + ry
+            else:
+                x, y = centers[node.name]
+            overrides[node_id] = {"pos": "%.4f,%.4f!" % (x, y)}
+        graph_overrides = {-1: {"layout": FINAL_LAYOUT}}
+        for cluster_id, cluster in enumerate(model.clusters):
+            top = model.top_cluster(cluster_id)
+            bb = layouts[top].clusters.get(cluster.name) if top in layouts else None
+            if bb is not None:
+                ox, oy = origins[top]
+                graph_overrides[cluster_id] = {"bb": "%.4f,%.4f,%.4f,%.4f" % (
+                    ox + bb[0], oy + bb[1], ox + bb[2], oy + bb[3])}
+        return "\n".join(model.iter_lines(overrides, self._edge_overrides(model), graph_overrides))
+
+    @staticmethod
+    def _edge_overrides(model: GraphModel) -> Dict[int, Dict[str, None]]:
+        # ltail and lhead are dot only. nop2 would warn about them for every edge.
+        overrides = {}
+        for edge_id, edge in enumerate(model.edges):
+            attrs = model.attrs.get(edge.attrs)
+            if any(key in attrs for key in _COMPOUND_ATTRS):
+                overrides[edge_id] = {key: None for key in _COMPOUND_ATTRS}
+        if overrides:
+            warnings.warn("The incremental layout does not clip the edges at the clusters of ltail and lhead")
+        return overrides
+
+    def pipe(self, model: GraphModel, format: str, renderer, encoding: str = "utf-8") -> bytes:
+        """Render the model to format with renderer."""
+        return renderer.pipe(self.pinned_source(model, renderer), self.engine, format, encoding)
@@ -0,0 +1,70 @@
+"""
+DOT language helpers.
+
+The quoting and the statement formats of graphviz.lang and graphviz.Digraph
+(graphviz 0.16), so that building a diagram and generating its DOT source do
+not import graphviz. The output is the same as the one of graphviz.
+"""
+import functools
+import re
+
+# Statement formats of graphviz.Digraph.
+HEAD = "digraph %s{"
+TAIL = "}"
+SUBGRAPH = "subgraph %s{"
+SUBGRAPH_PLAIN = "%s{"
+NODE = "\t%s%s"
+EDGE = "\t%s -> %s%s"
+ATTR = "\t%s%s"
+
+# https://www.graphviz.org/doc/info/lang.html
+HTML_STRING = re.compile(r"<.*>$", re.DOTALL)
+
+ID = re.compile(r"([a-zA-Z_][a-zA-Z0-9_]*|-?(\.[0-9]+|[0-9]+(\.[0-9]*)?))$")
+
+KEYWORDS = {"node", "edge", "graph", "digraph", "subgraph", "strict"}
+
+QUOTE_OPTIONAL_BACKSLASHES = re.compile(r"(?P<bs>(?:\\\\)*)\\?(?P<quote>\")")
+
+ESCAPE_UNESCAPED_QUOTES = functools.partial(QUOTE_OPTIONAL_BACKSLASHES.sub, r"\g<bs>\\\g<quote>")
+
+
+def quote(identifier: str, is_html_string=HTML_STRING.match, is_valid_id=ID.match, dot_keywords=KEYWORDS,
+          escape_unescaped_quotes=ESCAPE_UNESCAPED_QUOTES) -> str:
+    """Return DOT identifier from string, quote if needed."""
+    if is_html_string(identifier):
+        pass
+    elif not is_valid_id(identifier) or identifier.lower() in dot_keywords:
+        return '"%s"' % escape_unescaped_quotes(identifier)
+    return identifier
+
+
+def quote_edge(identifier: str) -> str:
+    """Return DOT edge statement node_id from string, quote if needed."""
+    node, _, rest = identifier.partition(":")
+    parts = [quote(node)]
+    if rest:
+        port, _, compass = rest.partition(":")
+        parts.append(quote(port))
+        if compass:
+            parts.append(compass)
+    return ":".join(parts)
+
+
+def a_list(label: str = None, kwargs=None) -> str:
+    """Return assembled DOT a_list string. Plain dicts are sorted."""
+    result = ["label=%s" % quote(label)] if label is not None else []
+    if kwargs:
+        items = kwargs.items()
+        if type(kwargs) is dict:
+            items = sorted(items)
+        result.extend("%s=%s" % (quote(k), quote(v)) for k, v in items if v is not None)
+    return " ".join(result)
+
+
+def attr_list(label: str = None, kwargs=None) -> str:
+    """Return assembled DOT attribute list string."""
+    content = a_list(label, kwargs)
+    if not content:
+        return ""
+    return " [%s]" % content
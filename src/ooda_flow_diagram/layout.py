@@ -0,0 +1,65 @@
+"""
+Layout engine selection.
+
+Orthogonal edge routing of dot is the slowest part of the layout, and its cost
+grows faster than the number of edges. LayoutPolicy picks cheaper splines and
+engines for large graphs, and gives the cheaper layouts to try when a layout
+does not finish within the timeout of the diagram.
+"""
+from typing import List, Tuple
+
+ENGINES = ("dot", "neato", "fdp", "sfdp", "osage", "circo", "twopi")
+
+# Next cheaper splines of each spline style.
+_CHEAPER_SPLINES = {
+    "ortho": "polyline",
+    "curved": "line",
+    "spline": "line",
+    "polyline": "line",
+}
+
+
+class LayoutPolicy:
+    """LayoutPolicy chooses the layout engine and the splines by the size of the graph."""
+
+    def __init__(self, ortho_max_edges: int = 300, dot_max_nodes: int = 3000, dot_max_edges: int = 6000,
+                 large_engine: str = "sfdp"):
+        """LayoutPolicy represents the thresholds of the automatic layout.
+
+        :param ortho_max_edges: Largest number of edges routed with splines=ortho.
+            Larger graphs use polyline edges.
+        :param dot_max_nodes: Largest number of nodes laid out with dot and the
+            other hierarchical engines. Larger graphs use large_engine.
+        :param dot_max_edges: Largest number of edges laid out with dot.
+        :param large_engine: Engine of the graphs over the dot thresholds.
+        """
+        if large_engine not in ENGINES:
+            raise ValueError(f'"{large_engine}" is not a valid layout engine')
+        self.ortho_max_edges = ortho_max_edges
+        self.dot_max_nodes = dot_max_nodes
+        self.dot_max_edges = dot_max_edges
+        self.large_engine = large_engine
+
+    def plan(self, engine: str, splines: str, nodes: int, edges: int) -> List[Tuple[str, str]]:
+        """Return the (engine, splines) layouts to try, from the preferred one to the cheapest.
+
+        The layouts over the thresholds are left out, and the next one is tried
+        when a layout times out.
+        """
+        steps = [(engine, splines)]
+        while splines in _CHEAPER_SPLINES:
+            splines = _CHEAPER_SPLINES[splines]
+            steps.append((engine, splines))
+        if engine != self.large_engine:
+            steps.append((self.large_engine, "line"))
+
+        too_large = nodes > self.dot_max_nodes or edges > self.dot_max_edges
+        while len(steps) > 1:
+            engine, splines = steps[0]
+            if splines == "ortho" and edges > self.ortho_max_edges:
+                del steps[0]
+            elif engine != self.large_engine and too_large:
+                del steps[0]
+            else:
+                break
+        return steps
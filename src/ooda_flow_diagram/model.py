@@ -0,0 +1,591 @@
+"""
+Compact in-memory graph model of a diagram.
+
+graphviz.Digraph keeps a formatted DOT line per statement, and copies the lines
+of every cluster into its parent. GraphModel keeps one small __slots__ record
+per node and edge instead, refers to nodes by integer ids, and shares the
+attribute sets of the nodes and edges of the same style. An edge declared
+again with the same ends and attributes is kept once. The DOT source is
+generated only when it is requested.
+"""
+import contextlib
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from ooda_flow_diagram import lang
+
+# Statements in the body of a graph are encoded as integers: the record index
+# times _KINDS plus the kind of the record.
+_NODE, _EDGE, _CLUSTER, _RAW = 0, 1, 2, 3
+_KINDS = 4
+
+
+class AttrTable:
+    """AttrTable interns attribute sets, so equal sets are stored once."""
+
+    __slots__ = ("_ids", "_sets", "_formatted")
+
+    def __init__(self):
+        self._ids: Dict[Tuple, int] = {}
+        self._sets: List[Dict[str, str]] = []
+        self._formatted: Dict[Tuple[int, int], str] = {}
+
+    def __len__(self) -> int:
+        return len(self._sets)
+
+    def intern(self, attrs: Optional[Mapping[str, str]]) -> int:
+        """Return the id of the attribute set, or -1 for an empty one."""
+        if not attrs:
+            return -1
+        key = tuple(attrs.items())
+        attr_id = self._ids.get(key)
+        if attr_id is None:
+            attr_id = self._ids[key] = len(self._sets)
+            self._sets.append(dict(key))
+        return attr_id
+
+    def get(self, attr_id: int) -> Dict[str, str]:
+        """Return the shared attribute set. It must not be modified."""
+        return self._sets[attr_id] if attr_id >= 0 else {}
+
+    def merged(self, attr_id: int, extra_id: int = -1) -> Dict[str, str]:
+        """Return the attribute set with the overrides of extra_id applied."""
+        if extra_id < 0:
+            return self.get(attr_id)
+        return {**self.get(attr_id), **self._sets[extra_id]}
+
+    def format(self, attr_id: int, extra_id: int = -1) -> str:
+        """Return the DOT a_list of the attributes, formatted once per pair of sets."""
+        key = (attr_id, extra_id)
+        formatted = self._formatted.get(key)
+        if formatted is None:
+            formatted = lang.a_list(None, self.merged(attr_id, extra_id))
+            # Overrides are mostly unique per node, e.g. URL, so only the
+            # shared sets are kept formatted.
+            if extra_id < 0:
+                self._formatted[key] = formatted
+        return formatted
+
+
+class HashSlots:
+    """HashSlots is an open addressing hash table of non-zero integers in one array.
+
+    It indexes the records of a list without a Python object per entry, e.g.
+    the edges against duplicates. Every slot holds the hash of the key and the
+    value, and a value is found by its hash and a match function.
+    """
+
+    __slots__ = ("_slots", "_mask", "_count")
+
+    def __init__(self, capacity: int = 8):
+        self._slots = array("q", bytes(16 * capacity))
+        self._mask = capacity - 1
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def find(self, key: int, match: Callable[[int], bool]) -> int:
+        """Return the value with the key hash that matches, or 0."""
+        slots, mask = self._slots, self._mask
+        i = key & mask
+        while slots[2 * i + 1]:
+            if slots[2 * i] == key and match(slots[2 * i + 1]):
+                return slots[2 * i + 1]
+            i = (i + 1) & mask
+        return 0
+
+    def add(self, key: int, value: int) -> None:
+        """Add a non-zero value that is not in the table yet."""
+        if 2 * (self._count + 1) > self._mask + 1:
+            self._grow()
+        slots, mask = self._slots, self._mask
+        i = key & mask
+        while slots[2 * i + 1]:
+            i = (i + 1) & mask
+        slots[2 * i] = key
+        slots[2 * i + 1] = value
+        self._count += 1
+
+    def _grow(self) -> None:
+        old = self._slots
+        slots = self._slots = array("q", bytes(2 * len(old) * 8))
+        mask = self._mask = 2 * self._mask + 1
+        for j in range(1, len(old), 2):
+            if old[j]:
+                i = old[j - 1] & mask
+                while slots[2 * i + 1]:
+                    i = (i + 1) & mask
+                slots[2 * i] = old[j - 1]
+                slots[2 * i + 1] = old[j]
+
+
+class NodeRecord:
+    __slots__ = ("name", "label", "attrs", "extra", "cluster")
+
+    def __init__(self, name: str, label: Optional[str], attrs: int, extra: int, cluster: int):
+        self.name = name
+        self.label = label
+        # Shared attribute set of the node style and copy-on-write overrides.
+        self.attrs = attrs
+        self.extra = extra
+        self.cluster = cluster
+
+
+class EdgeRecord:
+    __slots__ = ("tail", "head", "attrs")
+
+    def __init__(self, tail, head, attrs: int):
+        # Node ids, or names for the endpoints that are not declared nodes.
+        self.tail = tail
+        self.head = head
+        self.attrs = attrs
+
+
+class ClusterRecord:
+    __slots__ = ("name", "parent", "graph_attr", "node_attr", "edge_attr", "body")
+
+    def __init__(self, name: Optional[str], parent: int):
+        self.name = name
+        self.parent = parent
+        self.graph_attr: Dict[str, str] = {}
+        self.node_attr: Dict[str, str] = {}
+        self.edge_attr: Dict[str, str] = {}
+        self.body = array("q")
+
+
+class RankGroups:
+    """RankGroups merges the nodes joined with + into one rank=same group per set."""
+
+    __slots__ = ("groups", "_group", "changes")
+
+    def __init__(self):
+        self.groups: List[List[str]] = []
+        # Index of the group of every node name.
+        self._group: Dict[str, int] = {}
+        # Number of calls of add(), to know when the placement of the groups changes.
+        self.changes = 0
+
+    def __len__(self) -> int:
+        return sum(1 for group in self.groups if group)
+
+    def add(self, name: str, other: str) -> None:
+        """Put the two nodes into the same group, merging their groups."""
+        self.changes += 1
+        group, other_group = self._group.get(name), self._group.get(other)
+        if group is None and other_group is None:
+            self._group[name] = self._group[other] = len(self.groups)
+            self.groups.append([name] if name == other else [name, other])
+        elif group is None:
+            self._group[name] = other_group
+            self.groups[other_group].append(name)
+        elif other_group is None:
+            self._group[other] = group
+            self.groups[group].append(other)
+        elif group != other_group:
+            # The smaller group joins the larger one, and is left empty.
+            if len(self.groups[group]) < len(self.groups[other_group]):
+                group, other_group = other_group, group
+            for member in self.groups[other_group]:
+                self._group[member] = group
+            self.groups[group].extend(self.groups[other_group])
+            self.groups[other_group] = []
+
+    def iter_lines(self, indent: str = "\t", groups: Iterable[List[str]] = None) -> Iterator[str]:
+        """Yield an anonymous rank=same subgraph per group, of all groups or of the given ones."""
+        for group in self.groups if groups is None else groups:
+            if group:
+                yield indent + lang.SUBGRAPH_PLAIN % ""
+                yield indent + "\tgraph" + lang.attr_list(None, {"rank": "same"})
+                for name in group:
+                    yield indent + "\t" + lang.quote(name)
+                yield indent + lang.TAIL
+
+
+class GraphModel:
+    """GraphModel holds the nodes, edges and clusters of a diagram.
+
+    The root graph is the cluster with id -1.
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.attrs = AttrTable()
+        self.nodes: List[NodeRecord] = []
+        self.edges: List[EdgeRecord] = []
+        self.clusters: List[ClusterRecord] = []
+        self.root = ClusterRecord(None, -1)
+        self.index: Dict[str, int] = {}
+        # Edge ids plus one, by the hash of their ends, attribute set and
+        # cluster, and the cluster of every edge. None after a load, until an
+        # edge is added.
+        self._edge_ids: Optional[HashSlots] = HashSlots()
+        self._edge_clusters = array("i")
+        self.rank_groups = RankGroups()
+        # Rank groups by the cluster they are written in, and the state they were placed for.
+        self._rank_placement: Dict[int, List[List[str]]] = {}
+        self._rank_placed = None
+        # DOT statements kept as text, e.g. the subgraphs of a graphviz.Digraph.
+        self.raw: List[str] = []
+
+    def __reduce__(self):
+        # The binary form is smaller and faster to pickle than the records.
+        from ooda_flow_diagram import serialize
+
+        return serialize._model_from_bytes, (serialize.dumps(self),)
+
+    def cluster(self, cluster_id: int) -> ClusterRecord:
+        return self.root if cluster_id < 0 else self.clusters[cluster_id]
+
+    def add_node(self, name: str, label: str = None, attrs: Mapping[str, str] = None,
+                 extra: Mapping[str, str] = None, cluster: int = -1) -> int:
+        """Add a node to the cluster and return its id.
+
+        :param attrs: Attributes shared by the nodes of the same style.
+        :param extra: Attributes of this node only, overriding attrs.
+        """
+        node_id = len(self.nodes)
+        self.nodes.append(NodeRecord(name, label, self.attrs.intern(attrs), self.attrs.intern(extra), cluster))
+        self.index[name] = node_id
+        self.cluster(cluster).body.append(node_id * _KINDS + _NODE)
+        return node_id
+
+    def add_edge(self, tail: str, head: str, attrs: Mapping[str, str] = None, cluster: int = -1) -> int:
+        """Add an edge between the named nodes and return its id.
+
+        An edge with the same ends and attributes in the same cluster is added
+        once, and the id of the first one is returned.
+        """
+        return self._add_edge(tail, head, self.attrs.intern(attrs), self.cluster(cluster).body, cluster)
+
+    def add_edges(self, pairs: Iterable[Tuple[str, str]], attrs: Mapping[str, str] = None,
+                  cluster: int = -1) -> None:
+        """Add the edges between the (tail, head) named nodes with the same attributes."""
+        attr_id, body = self.attrs.intern(attrs), self.cluster(cluster).body
+        for tail, head in pairs:
+            self._add_edge(tail, head, attr_id, body, cluster)
+
+    def _edge_index(self) -> HashSlots:
+        self._edge_clusters = array("i", [-1]) * len(self.edges)
+        for cluster_id, graph in enumerate([self.root] + self.clusters, -1):
+            for code in graph.body:
+                index, kind = divmod(code, _KINDS)
+                if kind == _EDGE:
+                    self._edge_clusters[index] = cluster_id
+        edge_ids = HashSlots(1 << max(3, (2 * len(self.edges)).bit_length()))
+        for index, edge in enumerate(self.edges):
+            edge_ids.add(hash((edge.tail, edge.head, edge.attrs, self._edge_clusters[index])), index + 1)
+        return edge_ids
+
+    def _add_edge(self, tail: str, head: str, attr_id: int, body: array, cluster: int) -> int:
+        if self._edge_ids is None:
+            self._edge_ids = self._edge_index()
+        tail, head = self.index.get(tail, tail), self.index.get(head, head)
+        edges, clusters, table = self.edges, self._edge_clusters, self._edge_ids
+        key = hash((tail, head, attr_id, cluster))
+        # HashSlots.find() inlined, as it runs for every edge.
+        slots, mask = table._slots, table._mask
+        i = key & mask
+        value = slots[2 * i + 1]
+        while value:
+            if slots[2 * i] == key:
+                edge = edges[value - 1]
+                if edge.tail == tail and edge.head == head and edge.attrs == attr_id and clusters[value - 1] == cluster:
+                    return value - 1
+            i = (i + 1) & mask
+            value = slots[2 * i + 1]
+        edge_id = len(edges)
+        edges.append(EdgeRecord(tail, head, attr_id))
+        clusters.append(cluster)
+        if 2 * (table._count + 1) > mask + 1:
+            table.add(key, edge_id + 1)
+        else:
+            # The probe ended at a free slot.
+            slots[2 * i] = key
+            slots[2 * i + 1] = edge_id + 1
+            table._count += 1
+        body.append(edge_id * _KINDS + _EDGE)
+        return edge_id
+
+    def add_cluster(self, name: Optional[str], parent: int = -1) -> int:
+        """Create a cluster, or an anonymous subgraph if name is None, and return its id.
+
+        The cluster is placed in its parent by attach_cluster().
+        """
+        self.clusters.append(ClusterRecord(name, parent))
+        return len(self.clusters) - 1
+
+    def attach_cluster(self, cluster_id: int) -> None:
+        """Place the cluster in the body of its parent."""
+        self.cluster(self.clusters[cluster_id].parent).body.append(cluster_id * _KINDS + _CLUSTER)
+
+    def add_raw(self, lines: Iterable[str], cluster: int = -1) -> int:
+        """Add the DOT statement lines as they are to the cluster and return their id."""
+        self.raw.append("\n".join(lines))
+        raw_id = len(self.raw) - 1
+        self.cluster(cluster).body.append(raw_id * _KINDS + _RAW)
+        return raw_id
+
+    def add_graph(self, graph, cluster: int = -1) -> int:
+        """Add the statements of a graphviz.Digraph as a subgraph of the cluster."""
+        if not hasattr(graph, "body") or not getattr(graph, "directed", False):
+            raise TypeError(f'"{graph!r}" is not a graphviz.Digraph')
+        return self.add_raw(graph.__iter__(subgraph=True), cluster)
+
+    def node_attrs(self, node_id: int) -> Dict[str, str]:
+        """Return the effective attributes of the node."""
+        node = self.nodes[node_id]
+        return self.attrs.merged(node.attrs, node.extra)
+
+    def _endpoint(self, endpoint) -> str:
+        name = self.nodes[endpoint].name if isinstance(endpoint, int) else endpoint
+        return lang.quote_edge(name)
+
+    def _ancestors(self, name: str) -> List[int]:
+        # The clusters of the node from the innermost one to the root graph.
+        node_id = self.index.get(name)
+        result = []
+        cluster_id = self.nodes[node_id].cluster if node_id is not None else -1
+        while cluster_id >= 0:
+            result.append(cluster_id)
+            cluster_id = self.clusters[cluster_id].parent
+        result.append(-1)
+        return result
+
+    def rank_placement(self) -> Dict[int, List[List[str]]]:
+        """Return the rank groups by the innermost cluster containing all their nodes.
+
+        A rank=same group in the root graph would override the ranks of the
+        clusters, or make dot fail, so it is written in the cluster instead.
+        """
+        state = (len(self.nodes), self.rank_groups.changes)
+        if self._rank_placed != state:
+            placement: Dict[int, List[List[str]]] = {}
+            for group in self.rank_groups.groups:
+                if not group:
+                    continue
+                common = self._ancestors(group[0])
+                for name in group[1:]:
+                    if len(common) == 1:
+                        break
+                    ancestors = set(self._ancestors(name))
+                    common = [cluster_id for cluster_id in common if cluster_id in ancestors]
+                placement.setdefault(common[0], []).append(group)
+            self._rank_placement, self._rank_placed = placement, state
+        return self._rank_placement
+
+    def top_cluster(self, cluster_id: int) -> int:
+        """Return the id of the outermost cluster containing the cluster, or -1 for the root."""
+        while cluster_id >= 0 and self.clusters[cluster_id].parent >= 0:
+            cluster_id = self.clusters[cluster_id].parent
+        return cluster_id
+
+    def edge_line(self, edge: EdgeRecord, indent: str = "\t", tail: str = None, head: str = None,
+                  override: Mapping[str, str] = None) -> str:
+        """Return the DOT statement of the edge, optionally with other endpoints and attributes."""
+        if override:
+            content = lang.a_list(None, {**self.attrs.get(edge.attrs), **override})
+        else:
+            content = self.attrs.format(edge.attrs)
+        tail = lang.quote_edge(tail) if tail is not None else self._endpoint(edge.tail)
+        head = lang.quote_edge(head) if head is not None else self._endpoint(edge.head)
+        return indent + "%s -> %s%s" % (tail, head, " [" + content + "]" if content else "")
+
+    def _body_lines(self, body: array, indent: str, overrides: Mapping[int, Mapping] = None,
+                    edge_overrides: Mapping[int, Mapping] = None,
+                    graph_overrides: Mapping[int, Mapping] = None) -> Iterator[str]:
+        nodes, clusters, attrs = self.nodes, self.clusters, self.attrs
+        for code in body:
+            index, kind = divmod(code, _KINDS)
+            if kind == _NODE:
+                node = nodes[index]
+                if overrides and index in overrides:
+                    content = lang.a_list(None, {**attrs.merged(node.attrs, node.extra), **overrides[index]})
+                else:
+                    content = attrs.format(node.attrs, node.extra)
+                if node.label is not None:
+                    label = "label=" + lang.quote(node.label)
+                    content = label + " " + content if content else label
+                yield indent + lang.quote(node.name) + (" [" + content + "]" if content else "")
+            elif kind == _EDGE:
+                override = edge_overrides.get(index) if edge_overrides else None
+                yield self.edge_line(self.edges[index], indent, override=override)
+            elif kind == _RAW:
+                for line in self.raw[index].split("\n"):
+                    yield indent + line
+            else:
+                yield from self._graph_lines(clusters[index], indent, overrides, edge_overrides,
+                                             graph_overrides, index)
+
+    def _graph_lines(self, graph: ClusterRecord, indent: str, overrides: Mapping[int, Mapping] = None,
+                     edge_overrides: Mapping[int, Mapping] = None, graph_overrides: Mapping[int, Mapping] = None,
+                     cluster_id: int = None) -> Iterator[str]:
+        if graph.name is None:
+            yield indent + lang.SUBGRAPH_PLAIN % ""
+        else:
+            yield indent + lang.SUBGRAPH % (lang.quote(graph.name) + " ")
+        extra = graph_overrides.get(cluster_id) if graph_overrides else None
+        yield from self._attr_lines(graph, indent + "\t", extra)
+        yield from self._body_lines(graph.body, indent + "\t", overrides, edge_overrides, graph_overrides)
+        if cluster_id is not None and self.rank_groups.groups:
+            yield from self.rank_groups.iter_lines(indent + "\t", self.rank_placement().get(cluster_id, ()))
+        yield indent + lang.TAIL
+
+    @staticmethod
+    def _attr_lines(graph: ClusterRecord, indent: str, extra: Mapping[str, str] = None) -> Iterator[str]:
+        for kw in ("graph", "node", "edge"):
+            attrs = getattr(graph, "%s_attr" % kw)
+            if kw == "graph" and extra:
+                attrs = {**attrs, **extra}
+            if attrs:
+                yield indent + "%s%s" % (kw, lang.attr_list(None, attrs))
+
+    def iter_lines(self, overrides: Mapping[int, Mapping] = None, edge_overrides: Mapping[int, Mapping] = None,
+                   graph_overrides: Mapping[int, Mapping] = None) -> Iterator[str]:
+        """Yield the DOT source line by line, in the format of graphviz.Digraph.
+
+        :param overrides: Attributes to add to the nodes, by node id.
+        :param edge_overrides: Attributes to add to the edges, by edge id. An
+            attribute set to None is removed.
+        :param graph_overrides: Graph attributes to add to the clusters, by
+            cluster id, the root graph being -1.
+        """
+        yield lang.HEAD % (lang.quote(self.name) + " " if self.name else "")
+        yield from self._attr_lines(self.root, "\t", graph_overrides.get(-1) if graph_overrides else None)
+        yield from self._body_lines(self.root.body, "\t", overrides, edge_overrides, graph_overrides)
+        if self.rank_groups.groups:
+            yield from self.rank_groups.iter_lines("\t", self.rank_placement().get(-1, ()))
+        yield lang.TAIL
+
+    @property
+    def source(self) -> str:
+        return "\n".join(self.iter_lines())
+
+
+class ModelSubgraph:
+    """ModelSubgraph is the graph of a cluster in a ModelDigraph."""
+
+    def __init__(self, model: GraphModel, cluster_id: int):
+        self.model = model
+        self.cluster_id = cluster_id
+        record = model.clusters[cluster_id]
+        self.name = record.name
+        self.graph_attr = record.graph_attr
+        self.node_attr = record.node_attr
+        self.edge_attr = record.edge_attr
+
+    def node(self, name: str, label: str = None, _attributes: Mapping[str, str] = None, **attrs) -> None:
+        self.model.add_node(name, label, _attributes, attrs, self.cluster_id)
+
+    def edge(self, tail_name: str, head_name: str, label: str = None, **attrs) -> None:
+        if label is not None:
+            attrs["label"] = label
+        self.model.add_edge(tail_name, head_name, attrs, self.cluster_id)
+
+    def subgraph(self, graph: "ModelSubgraph") -> None:
+        """Place the cluster graph, or add the statements of a graphviz.Digraph, in this cluster."""
+        if isinstance(graph, ModelSubgraph):
+            self.model.attach_cluster(graph.cluster_id)
+        else:
+            self.model.add_graph(graph, self.cluster_id)
+
+
+class ModelDigraph:
+    """ModelDigraph provides the part of the graphviz.Digraph interface used by
+    Diagram on top of a GraphModel.
+    """
+
+    directed = True
+
+    def __init__(self, name: str = "", engine: str = "dot", encoding: str = "utf-8"):
+        self.model = GraphModel(name)
+        self.name = name
+        self.engine = engine
+        self.encoding = encoding
+        self.graph_attr = self.model.root.graph_attr
+        self.node_attr = self.model.root.node_attr
+        self.edge_attr = self.model.root.edge_attr
+
+    @classmethod
+    def from_model(cls, model: GraphModel, engine: str = "dot", encoding: str = "utf-8") -> "ModelDigraph":
+        """Return the ModelDigraph of a model, e.g. one loaded by serialize.load()."""
+        digraph = cls(model.name, engine, encoding)
+        digraph.model = model
+        digraph.graph_attr = model.root.graph_attr
+        digraph.node_attr = model.root.node_attr
+        digraph.edge_attr = model.root.edge_attr
+        return digraph
+
+    def new_subgraph(self, name: Optional[str], parent: ModelSubgraph = None) -> ModelSubgraph:
+        """Return the graph of a new cluster inside parent, or inside the root graph."""
+        parent_id = parent.cluster_id if parent is not None else -1
+        return ModelSubgraph(self.model, self.model.add_cluster(name, parent_id))
+
+    def node(self, name: str, label: str = None, _attributes: Mapping[str, str] = None, **attrs) -> None:
+        self.model.add_node(name, label, _attributes, attrs)
+
+    def edge(self, tail_name: str, head_name: str, label: str = None, **attrs) -> None:
+        if label is not None:
+            attrs["label"] = label
+        self.model.add_edge(tail_name, head_name, attrs)
+
+    def edges(self, pairs: Iterable[Tuple[str, str]], label: str = None, **attrs) -> None:
+        """Add the edges between the (tail, head) named nodes with the same attributes."""
+        if label is not None:
+            attrs["label"] = label
+        self.model.add_edges(pairs, attrs)
+
+    def same_rank(self, name: str, other: str, graph: ModelSubgraph = None) -> None:
+        """Place the two nodes on the same rank, in the rank group of either of them.
+
+        The group is written in the innermost cluster containing its nodes, so
+        graph, the graph of that cluster, is not needed.
+        """
+        self.model.rank_groups.add(name, other)
+
+    @property
+    def edge_count(self) -> int:
+        """Return the number of edges, without the duplicates."""
+        return len(self.model.edges)
+
+    def subgraph(self, graph: ModelSubgraph = None, name: str = None):
+        """Place the cluster graph, add the statements of a graphviz.Digraph, or
+        open an anonymous subgraph in a with-block.
+        """
+        if graph is None:
+            return self._subgraph_context(name)
+        if isinstance(graph, ModelSubgraph):
+            self.model.attach_cluster(graph.cluster_id)
+        else:
+            self.model.add_graph(graph)
+        return None
+
+    @contextlib.contextmanager
+    def _subgraph_context(self, name: Optional[str]):
+        graph = self.new_subgraph(name)
+        yield graph
+        self.model.attach_cluster(graph.cluster_id)
+
+    def attr(self, kw: str = None, _attributes: Mapping[str, str] = None, **attrs) -> None:
+        """Set the graph, node or edge attributes of the root graph, as graphviz.Digraph.attr() does.
+
+        Without kw, the graph attributes are set.
+        """
+        attrs = {**(_attributes or {}), **attrs}
+        if kw in (None, "graph", "node", "edge"):
+            getattr(self, "%s_attr" % (kw or "graph")).update(attrs)
+        else:
+            raise ValueError(f'"{kw}" is not a valid attribute statement')
+
+    def to_graphviz(self):
+        """Return the source as a graphviz.Source, e.g. for the code written for graphviz.Digraph."""
+        import graphviz
+
+        return graphviz.Source(self.source, engine=self.engine, encoding=self.encoding)
+
+    @property
+    def source(self) -> str:
+        return self.model.source
+
+    def __str__(self) -> str:
+        return self.source
@@ -1,9 +1,91 @@
+import copy
 import textwrap
 import os
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from ooda_flow_diagram.ooda import wrap
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class LabelCache(object):
+    """Bounded LRU cache of the labels generated by OodaNodeAttr.
+
+    It is shared by the diagrams built in parallel threads, so it is locked.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._labels = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                label = self._labels[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._labels.move_to_end(key)
+            self.hits += 1
+            return label
+
+    def put(self, key, label: str) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._labels[key] = label
+            self._labels.move_to_end(key)
+            if len(self._labels) > self.maxsize:
+                self._labels.popitem(last=False)
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._labels))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._labels.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Labels shared by all node types. Templated boards repeat the same ToDo and
+# Output texts many times, so the wrapped labels are generated only once.
+label_cache = LabelCache()
+
+# 進捗アイコンの<img>タグ。パスはimport時に一度だけ組み立てる。
+_IMG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'img')
+_PROGRESS_ICONS = {
+    progress: '<img src="' + os.path.join(_IMG_DIR, image) + '"/>'
+    for progress, image in (('start', 'start.png'), ('25', '25.png'), ('50', '50.png'),
+                            ('75', '75.png'), ('done', 'done.png'))
+}
+
+
+def _freeze(value):
+    """Convert label arguments to a hashable cache key."""
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
 
-from pathlib import Path
 
 class OodaNodeAttr(object):
+    # "textwrap" counts characters as before, "width" counts display columns
+    # of East Asian characters as two.
+    __wrap_modes = ("textwrap", "width")
+
     def __init__(self, subject: str, shape: str, style: str, fixedsize: str,
                  labelloc: str, width: str, height: str, fillcolor: str,
                  line_length: int, font_color: str, color: str,
@@ -11,6 +93,8 @@ class OodaNodeAttr(object):
                  penwidth: str = "1.0", peripheries: str = "1", method: str = 'singlecell',
                  subject2: str = "", subject3: str = "",):
         self._line_length = line_length
+        self._url = None
+        self._wrap_mode = "textwrap"
         self._method = method
         self._subjects = {
             'subject': subject,
@@ -40,15 +124,16 @@ class OodaNodeAttr(object):
 
     @property
     def attrs(self):
+        # Shared by all nodes of the same type, so it must not be modified.
         return self._attrs
 
     @property
     def url(self):
-        return self._attrs['URL']
+        return self._url
 
     @url.setter
     def url(self, url: str):
-        self._attrs['URL'] = url
+        self._url = url
 
     @property
     def line_length(self):
@@ -60,18 +145,67 @@ class OodaNodeAttr(object):
             raise TypeError('line_length:{} is not int.'.format(line_length))
         self._line_length = line_length
 
+    @property
+    def wrap_mode(self):
+        return self._wrap_mode
+
+    @wrap_mode.setter
+    def wrap_mode(self, wrap_mode: str):
+        if wrap_mode not in self.__wrap_modes:
+            raise ValueError('"{}" is not a valid wrap mode'.format(wrap_mode))
+        self._wrap_mode = wrap_mode
+
+    def copy_with(self, line_length: int = None, url: str = None, wrap_mode: str = None) -> "OodaNodeAttr":
+        """
+        Return a copy for a node with its own line_length, url and wrap_mode.
+        The attrs and the subjects are shared with this instance, and this
+        instance itself is returned if nothing differs.
+        """
+        if ((line_length is None or line_length == self._line_length) and url is None and self._url is None
+                and (wrap_mode is None or wrap_mode == self._wrap_mode)):
+            return self
+        ds_attr = copy.copy(self)
+        if line_length is not None:
+            ds_attr.line_length = line_length
+        ds_attr.url = url
+        if wrap_mode is not None:
+            ds_attr.wrap_mode = wrap_mode
+        return ds_attr
+
+    def _wrap(self, text: str) -> list:
+        if self._wrap_mode == "width":
+            return wrap.wrap(text, self.line_length)
+        return textwrap.wrap(text, self.line_length)
+
     def create_label(self, label, subject, line_mark, label2, subject2, line_mark2,
-                     label3, subject3, line_mark3) -> str:
+                     label3, subject3, line_mark3, stats=None) -> str:
         """
         Switch create label string methods.
+        The generated labels are memoized in label_cache.
+        The cache hits and misses are counted in stats, the DiagramStats of the
+        diagram of the node, if given. The counters of label_cache are shared
+        by the diagrams built in parallel.
         """
+        key = (self._method, tuple(self._subjects.values()), self._line_length, self._wrap_mode, self._url is not None,
+               _freeze(label), subject, line_mark, _freeze(label2), subject2, line_mark2,
+               _freeze(label3), subject3, line_mark3)
+        label_cell = label_cache.get(key)
+        if stats is not None:
+            if label_cell is None:
+                stats.label_cache_misses += 1
+            else:
+                stats.label_cache_hits += 1
+        if label_cell is not None:
+            return label_cell
         label_methods ={
             'singlecell': self._single_cell_label,
             'actcell1': self._act_cell_label,
             'acttable': self._act_table,
         }
-        return label_methods[self._method](label, subject, line_mark, label2, subject2, line_mark2,
-                                                    label3, subject3, line_mark3)
+        label_cell = label_methods[self._method](label, subject, line_mark, label2, subject2, line_mark2,
+                                                 label3, subject3, line_mark3)
+        label_cache.put(key, label_cell)
+        return label_cell
 
     def _single_cell_label(self, label, subject, line_mark, *args) -> str:
         label_cell = self._set_subject(subject, 'subject')
@@ -94,7 +228,6 @@ class OodaNodeAttr(object):
         label_cell += self._create_bywhen_who_tr(bywhen=label3['bywhen'], who=label3['who'])
         label_cell += self._create_completed_tr(completed_date=label3['completed_date'])
         label_cell += '</table>>'
-        print(label_cell)
         return label_cell
 
     @staticmethod
@@ -123,23 +256,7 @@ class OodaNodeAttr(object):
 
     @staticmethod
     def _load_icon(progress_rate: str):
-        if progress_rate == 'start':
-            image = 'start.png'
-        elif progress_rate == '25':
-            image = '25.png'
-        elif progress_rate == '50':
-            image = '50.png'
-        elif progress_rate == '75':
-            image = '75.png'
-        elif progress_rate == 'done':
-            image = 'done.png'
-        else:
-            return ''
-
-        label = '<img src="'
-        basedir = Path(os.path.abspath(os.path.dirname(__file__)))
-        label += os.path.join(basedir.parent, 'ooda', 'img', image) + '"/>'
-        return label
+        return _PROGRESS_ICONS.get(progress_rate, '')
 
     def _create_table_label(self, label, line_mark) -> str:
         if type(label) == list:
@@ -149,14 +266,14 @@ class OodaNodeAttr(object):
                     line_label += "・"
                 elif line_mark == "seq":
                     line_label += str(index+1)+". "
-                wrap_label = textwrap.wrap(item, self.line_length)
+                wrap_label = self._wrap(item)
                 line_label += '<br align="left" />　'.join(wrap_label)
                 line_label += '<br align="left" />'
             return line_label
 
         elif type(label) == str:
             # 文字列をds_attr.line_length毎に改行して、self.labelにセット
-            wrap_label = textwrap.wrap(label, self.line_length)
+            wrap_label = self._wrap(label)
             label = '<br align="left"/>'.join(wrap_label)
             label += '<br align="left"/>'
             # subjectを部品固有のものを使うか、ユーザ指定のものを使うかを指定
@@ -189,14 +306,14 @@ class OodaNodeAttr(object):
                     line_label += "・"
                 elif line_mark == "seq":
                     line_label += str(index+1)+". "
-                wrap_label = textwrap.wrap(item, self.line_length)
+                wrap_label = self._wrap(item)
                 line_label += '\\l　'.join(wrap_label)
                 line_label += '\\l'
             label_cell += "{}".format(line_label)
 
         elif type(label) == str:
             # 文字列をds_attr.line_length毎に改行して、self.labelにセット
-            wrap_label = textwrap.wrap(label, self.line_length)
+            wrap_label = self._wrap(label)
             label = '\\n'.join(wrap_label)
             # subjectを部品固有のものを使うか、ユーザ指定のものを使うかを指定
             label_cell += "{}".format(label)
@@ -87,6 +87,9 @@ class ActTable(Node):
                          subject=first_subject, subject2=second_subject, subject3=third_subject,
                          line_length=line_length, line_mark=todo_mark, line_mark2=output_mark,
                          url=output_url)
+        # 進捗はラベルに埋め込まれるので、集計用にインデックスにも記録する
+        self._diagram.progress.add(self, todo, progress=progress, bywhen=bywhen, who=who,
+                                   completed_date=completed_date)
 
 
 class Result(Node):
@@ -0,0 +1,131 @@
+"""
+Display width aware line wrapping for CJK labels.
+
+textwrap counts characters, so a Japanese label wrapped at 40 characters is
+about twice as wide as an English one. This wrapper counts East Asian Wide and
+Fullwidth characters as two columns and allows line breaks between them.
+"""
+import re
+import unicodedata
+from typing import List
+
+# Display widths of the Basic Multilingual Plane and the pattern of the wide
+# characters, both built once on first use.
+_bmp_widths = None
+_token_pattern = None
+_astral_widths = {}
+
+# Characters that must not start a line (Japanese kinsoku shori).
+_NO_LINE_START = frozenset("、。，．,.・：；？！ー」』）】〕〉》〟’”ぁぃぅぇぉっゃゅょゎァィゥェォッャュョヮヵヶ")
+
+
+def _char_width(char: str) -> int:
+    if unicodedata.combining(char):
+        return 0
+    if unicodedata.east_asian_width(char) in ("W", "F"):
+        return 2
+    return 1
+
+
+def _build_tables() -> bytearray:
+    global _bmp_widths, _token_pattern
+    widths = bytearray(_char_width(chr(code)) for code in range(0x10000))
+    # Ranges of the wide characters; the supplementary ideographic planes and
+    # the emoji blocks are wide as a whole.
+    ranges = []
+    start = None
+    for code, width in enumerate(widths):
+        if width == 2 and start is None:
+            start = code
+        elif width != 2 and start is not None:
+            ranges.append((start, code - 1))
+            start = None
+    ranges += [(0x1F300, 0x1F64F), (0x1F900, 0x1F9FF), (0x20000, 0x3FFFD)]
+    wide = "".join("%s-%s" % (re.escape(chr(a)), re.escape(chr(b))) for a, b in ranges)
+    _token_pattern = re.compile(r"(\s+)|([%s])|([^\s%s]+)" % (wide, wide))
+    _bmp_widths = widths
+    return widths
+
+
+def char_width(char: str) -> int:
+    """Return the display width of a character in columns."""
+    code = ord(char)
+    if code < 0x10000:
+        widths = _bmp_widths or _build_tables()
+        return widths[code]
+    width = _astral_widths.get(code)
+    if width is None:
+        width = _astral_widths[code] = _char_width(char)
+    return width
+
+
+def text_width(text: str) -> int:
+    """Return the display width of text in columns."""
+    if text.isascii():
+        return len(text)
+    return sum(char_width(c) for c in text)
+
+
+def _tokens(text: str):
+    """Split text into whitespace runs, single wide characters and narrow words."""
+    if _token_pattern is None:
+        _build_tables()
+    for space, wide, word in _token_pattern.findall(text):
+        if space:
+            yield " ", -1
+        elif wide:
+            yield wide, 2
+        else:
+            yield word, text_width(word)
+
+
+def wrap(text: str, width: int) -> List[str]:
+    """Wrap text so that every line fits in width display columns.
+
+    Like textwrap.wrap, whitespace at the start and the end of the lines is
+    dropped and too long words are broken. Lines may also break between wide
+    characters, except before the punctuation that must not start a line.
+    The text is processed in a single pass.
+    """
+    if width <= 0:
+        raise ValueError("invalid width %r (must be > 0)" % width)
+    lines = []
+    line = []
+    line_width = 0
+    space = False
+    for token, token_width in _tokens(text):
+        if token_width < 0:
+            space = bool(line)
+            continue
+        sep = 1 if space else 0
+        if line_width + sep + token_width <= width or (token in _NO_LINE_START and line):
+            if space:
+                line.append(" ")
+            line.append(token)
+            line_width += sep + token_width
+        else:
+            if line:
+                lines.append("".join(line))
+                line = []
+                line_width = 0
+            if token_width > width:
+                # Break the too long word at the column limit.
+                chunk = []
+                chunk_width = 0
+                for char in token:
+                    w = char_width(char)
+                    if chunk_width + w > width and chunk:
+                        lines.append("".join(chunk))
+                        chunk = []
+                        chunk_width = 0
+                    chunk.append(char)
+                    chunk_width += w
+                line = chunk
+                line_width = chunk_width
+            else:
+                line.append(token)
+                line_width = token_width
+        space = False
+    if line:
+        lines.append("".join(line))
+    return lines
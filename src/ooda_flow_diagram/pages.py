@@ -0,0 +1,187 @@
+"""
+Sharded rendering of large diagrams into linked pages.
+
+A single layout of a board with tens of thousands of nodes takes minutes. The
+pages split it by its top-level clusters: every cluster is laid out on its own
+page, and the edges to the other clusters end at a stub node linked to the
+page of the other cluster. An overview page shows every cluster as a single
+node linked to its page. The pages are laid out in parallel, and the links
+work in the SVG output.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Union
+
+from ooda_flow_diagram import lang
+from ooda_flow_diagram.model import _CLUSTER, _EDGE, _KINDS, _NODE, _RAW, GraphModel
+from ooda_flow_diagram.renderer import get_default_renderer, pipe_many
+
+# Name of the stub node linked to the overview page.
+OVERVIEW_STUB = "__overview"
+
+# Attributes of the stub nodes and the cluster nodes of the overview.
+STUB_ATTRS = {"shape": "box", "style": "dashed,rounded", "fontcolor": "#2D3436"}
+CLUSTER_NODE_ATTRS = {"shape": "box", "style": "rounded,filled", "fillcolor": "#E5F5FD"}
+
+# Attributes that refer to clusters, which are not on the page of the other end.
+_COMPOUND_ATTRS = ("ltail", "lhead")
+
+
+class Page(NamedTuple):
+    """Page is the DOT source of one page and its file name without extension."""
+
+    name: str
+    title: str
+    source: str
+
+
+def _head(model: GraphModel) -> List[str]:
+    return [lang.HEAD % (lang.quote(model.name) + " " if model.name else "")] + list(
+        model._attr_lines(model.root, "\t"))
+
+
+def _cluster_title(model: GraphModel, index: int) -> str:
+    cluster = model.clusters[index]
+    return cluster.graph_attr.get("label") or cluster.name
+
+
+def _stub_line(name: str, title: str, url: str) -> str:
+    return "\t%s%s" % (lang.quote(name), lang.attr_list(title, {**STUB_ATTRS, "URL": url, "tooltip": title}))
+
+
+def _plain_edge_line(model: GraphModel, edge, tail: str, head: str) -> str:
+    attrs = {k: v for k, v in model.attrs.get(edge.attrs).items() if k not in _COMPOUND_ATTRS}
+    return "\t%s -> %s%s" % (lang.quote_edge(tail), lang.quote_edge(head), lang.attr_list(None, attrs))
+
+
+def split_pages(model: GraphModel, filename: str, format: str = "svg") -> List[Page]:
+    """Return the overview page followed by a page per top-level cluster.
+
+    :param model: GraphModel of the diagram.
+    :param filename: File name of the overview page without extension. The
+        cluster pages are named filename_1, filename_2, ... in the order of
+        the clusters.
+    :param format: Output format, used in the links between the pages.
+    """
+    base = os.path.basename(filename)
+    overview_url = "%s.%s" % (base, format)
+    top_clusters = [index for index, kind in (divmod(code, _KINDS) for code in model.root.body)
+                    if kind == _CLUSTER and model.clusters[index].name is not None]
+    names = {index: "%s_%d" % (base, number) for number, index in enumerate(top_clusters, 1)}
+
+    def top(endpoint) -> int:
+        if not isinstance(endpoint, int):
+            return -1
+        return model.top_cluster(model.nodes[endpoint].cluster)
+
+    def name(endpoint) -> str:
+        return model.nodes[endpoint].name if isinstance(endpoint, int) else endpoint
+
+    # Lines of every cluster page after the cluster itself, and of the overview.
+    page_lines: Dict[int, Dict[str, None]] = {index: {} for index in top_clusters}
+    overview_edges: Dict[str, None] = {}
+    for code in model.root.body:
+        index, kind = divmod(code, _KINDS)
+        if kind != _EDGE:
+            continue
+        edge = model.edges[index]
+        tail, head = top(edge.tail), top(edge.head)
+        if tail >= 0 and tail == head:
+            page_lines[tail][model.edge_line(edge)] = None
+            continue
+        if tail not in names and head not in names:
+            overview_edges[model.edge_line(edge)] = None
+            continue
+        # Both ends as they are shown on the overview.
+        tail_name = model.clusters[tail].name if tail in names else name(edge.tail)
+        head_name = model.clusters[head].name if head in names else name(edge.head)
+        if tail_name != head_name:
+            overview_edges["\t%s -> %s" % (lang.quote_edge(tail_name), lang.quote_edge(head_name))] = None
+        for page, other, stub_head in ((tail, head, True), (head, tail, False)):
+            if page not in names:
+                continue
+            if other in names:
+                stub, title = model.clusters[other].name, _cluster_title(model, other)
+                url = "%s.%s" % (names[other], format)
+            else:
+                stub, title, url = OVERVIEW_STUB, model.name or "Overview", overview_url
+            lines = page_lines[page]
+            lines[_stub_line(stub, title, url)] = None
+            if stub_head:
+                lines[_plain_edge_line(model, edge, name(edge.tail), stub)] = None
+            else:
+                lines[_plain_edge_line(model, edge, stub, name(edge.head))] = None
+
+    head_lines = _head(model)
+    overview = list(head_lines)
+    for code in model.root.body:
+        index, kind = divmod(code, _KINDS)
+        if kind in (_NODE, _RAW) or (kind == _CLUSTER and index not in names):
+            overview.extend(model._body_lines([code], "\t"))
+        elif kind == _CLUSTER:
+            title = _cluster_title(model, index)
+            overview.append("\t%s%s" % (lang.quote(model.clusters[index].name), lang.attr_list(
+                title, {**CLUSTER_NODE_ATTRS, "URL": "%s.%s" % (names[index], format), "tooltip": title})))
+    overview.extend(overview_edges)
+    overview.append(lang.TAIL)
+
+    pages = [Page(base, model.name, "\n".join(overview))]
+    for index in top_clusters:
+        lines = head_lines + list(model._graph_lines(model.clusters[index], "\t", cluster_id=index))
+        lines.extend(page_lines[index])
+        lines.append(lang.TAIL)
+        pages.append(Page(names[index], _cluster_title(model, index), "\n".join(lines)))
+    return pages
+
+
+def render_pages(diagram, directory: Optional[str] = None, format: Union[str, Sequence[str]] = None,
+                 workers: Optional[int] = None) -> List[str]:
+    """Render the overview and the cluster pages of the diagram in parallel.
+
+    :param diagram: Diagram that is not streamed.
+    :param directory: Directory of the pages. Default is the directory of the
+        diagram filename.
+    :param format: Output format, or a list of formats rendered from one
+        layout per page. Default is the outformats of the diagram. The links
+        between the pages work in svg, and they point to the svg pages when
+        svg is one of the formats.
+    :param workers: Number of layouts running at the same time. Default is
+        the CPU count.
+    :return: Paths of the overview page and the cluster pages, in the first format.
+    """
+    if diagram._streamed:
+        raise ValueError("A streamed diagram can not be rendered in pages")
+    formats = [format] if isinstance(format, str) else list(format or diagram.outformats)
+    if directory is None:
+        directory = os.path.dirname(diagram.filename)
+    # The formats share one source per page, so the links are of one format.
+    pages = split_pages(diagram.dot.model, diagram.filename, "svg" if "svg" in formats else formats[0])
+    renderer = diagram.renderer or get_default_renderer()
+    engine, encoding = diagram.dot.engine, diagram.dot.encoding
+    cache = diagram.cache
+
+    def render(page: Page) -> str:
+        # The layouts run in Graphviz processes, so threads lay them out in parallel.
+        images = {}
+        if cache is not None:
+            for format in formats:
+                data = cache.get(cache.key(page.source, engine, format))
+                if data is not None:
+                    images[format] = data
+        missing = [format for format in formats if format not in images]
+        if missing:
+            rendered = pipe_many(renderer, page.source, engine, missing, encoding, diagram.layout_timeout)
+            if cache is not None:
+                for format, data in rendered.items():
+                    cache.put(cache.key(page.source, engine, format), data)
+            images.update(rendered)
+        paths = []
+        for format in formats:
+            paths.append(os.path.join(directory, "%s.%s" % (page.name, format)))
+            with open(paths[-1], "wb") as f:
+                f.write(images[format])
+        return paths[0]
+
+    with diagram._span("pages", pages=len(pages), format=",".join(formats)):
+        with ThreadPoolExecutor(workers or os.cpu_count() or 1) as executor:
+            return list(executor.map(render, pages))
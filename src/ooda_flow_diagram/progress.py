@@ -0,0 +1,250 @@
+"""
+Progress rollup of the ActTable nodes.
+
+The progress, bywhen, who and completed_date of an ActTable end up in its HTML
+label. ProgressIndex keeps them as records instead, when the node is created,
+and adds them up for the cluster of the node, its parent clusters and the whole
+diagram. The percent done per OODA loop, the overdue acts and the load per
+person are read from the index without parsing the labels or rendering.
+
+The records are kept once, and the clusters only keep counters. The open acts
+are also indexed by their due dates, so the overdue ones are found by bisection.
+
+The clusters are given as Cluster objects, or as their paths, e.g.
+"First OODA Loop/Acts". A diagram loaded by Diagram.load() has no Cluster
+objects, so its index is rebuilt from the dumped records and takes the paths.
+"""
+import bisect
+import datetime
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# Share of the work done for each progress value of ActTable.
+PROGRESS_RATES = {"": 0.0, "start": 0.0, "25": 0.25, "50": 0.5, "75": 0.75, "done": 1.0}
+
+_ISO_DATE = re.compile(r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})$")
+_MONTH_DAY = re.compile(r"(\d{1,2})/(\d{1,2})$")
+
+
+def parse_date(text: str, year: int = None) -> Optional[datetime.date]:
+    """Return the date of a bywhen text, "2026-06-23", "2026/6/23" or "6/23", or None.
+
+    :param year: Year of the dates without a year. Default is the current year.
+    """
+    text = text.strip()
+    match = _ISO_DATE.match(text)
+    try:
+        if match:
+            return datetime.date(*map(int, match.groups()))
+        match = _MONTH_DAY.match(text)
+        if match:
+            month, day = map(int, match.groups())
+            return datetime.date(year or datetime.date.today().year, month, day)
+    except ValueError:
+        pass
+    return None
+
+
+class ActItem(NamedTuple):
+    """ActItem is the progress record of one ActTable."""
+
+    node_id: str
+    todo: str
+    cluster: str
+    progress: str
+    bywhen: str
+    who: str
+    completed_date: str
+
+    @property
+    def done(self) -> bool:
+        return self.progress == "done"
+
+    def due(self, year: int = None) -> Optional[datetime.date]:
+        """Return the date of bywhen, or None if it is not a date."""
+        return parse_date(self.bywhen, year) if self.bywhen else None
+
+
+class Rollup:
+    """Rollup holds the totals of the acts of a cluster and its subclusters."""
+
+    __slots__ = ("cluster", "total", "done", "progress_sum", "load")
+
+    def __init__(self, cluster: str):
+        self.cluster = cluster
+        self.total = 0
+        self.done = 0
+        self.progress_sum = 0.0
+        # Number of open acts per person.
+        self.load: Dict[str, int] = {}
+
+    def add(self, item: ActItem) -> None:
+        self.total += 1
+        self.progress_sum += PROGRESS_RATES.get(item.progress, 0.0)
+        if item.done:
+            self.done += 1
+        elif item.who:
+            self.load[item.who] = self.load.get(item.who, 0) + 1
+
+    @property
+    def percent_done(self) -> float:
+        """Return the mean progress of the acts in percent, or 0 without acts."""
+        return 100.0 * self.progress_sum / self.total if self.total else 0.0
+
+    def badge(self) -> str:
+        """Return the rollup line drawn under the cluster label."""
+        return "%d%% done · %d/%d acts" % (round(self.percent_done), self.done, self.total)
+
+    def __repr__(self) -> str:
+        return f"<Rollup {self.cluster!r} total={self.total} done={self.done} percent_done={self.percent_done:.1f}>"
+
+
+def _cluster_path(cluster) -> str:
+    labels = []
+    while cluster is not None:
+        labels.append(cluster.label)
+        cluster = cluster._parent
+    return "/".join(reversed(labels))
+
+
+class ProgressIndex:
+    """ProgressIndex holds the ActTable records of a diagram and their rollups per cluster."""
+
+    def __init__(self):
+        self.total = Rollup("")
+        # Rollups of the clusters by Cluster, and their order of creation.
+        self._rollups: Dict[object, Rollup] = {}
+        # The records in declaration order, and the Cluster of each record.
+        self._items: List[ActItem] = []
+        self._clusters: List[object] = []
+        # Due dates of the open acts with the record index: the dates with a
+        # year, and the (month, day) of the others. They are sorted when queried.
+        self._due: List[Tuple[datetime.date, int]] = []
+        self._month_day: List[Tuple[Tuple[int, int], int]] = []
+        self._sorted = True
+
+    @classmethod
+    def from_records(cls, records: Iterable[Sequence[str]]) -> "ProgressIndex":
+        """Return the index of the records made by records(), with the clusters given by their paths."""
+        index = cls()
+        for fields in records:
+            item = ActItem(*fields)
+            index._index(item, None)
+            index.total.add(item)
+            path = ""
+            for label in item.cluster.split("/") if item.cluster else ():
+                path = path + "/" + label if path else label
+                rollup = index._rollups.get(path)
+                if rollup is None:
+                    rollup = index._rollups[path] = Rollup(path)
+                rollup.add(item)
+        return index
+
+    def records(self) -> List[List[str]]:
+        """Return the records as lists of strings, in the order of the ActItem fields."""
+        return [list(item) for item in self._items]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[ActItem]:
+        return iter(self._items)
+
+    def add(self, node, todo, progress: str = "", bywhen: str = "", who: str = "", completed_date: str = "") -> ActItem:
+        """Add the record of an ActTable node and count it in its cluster, the parent clusters and the total.
+
+        :param node: ActTable node.
+        :param todo: ToDo text, or list of texts, of the node.
+        """
+        if isinstance(todo, list):
+            todo = "; ".join(todo)
+        cluster = node._cluster
+        item = ActItem(node.nodeid, todo, _cluster_path(cluster), progress, bywhen, who, completed_date)
+        self._index(item, cluster)
+        self.total.add(item)
+        while cluster is not None:
+            self.rollup(cluster).add(item)
+            cluster = cluster._parent
+        return item
+
+    def _index(self, item: ActItem, cluster) -> None:
+        index = len(self._items)
+        self._items.append(item)
+        self._clusters.append(cluster)
+        if item.done or not item.bywhen:
+            return
+        text = item.bywhen.strip()
+        match = _ISO_DATE.match(text)
+        if match:
+            try:
+                self._due.append((datetime.date(*map(int, match.groups())), index))
+            except ValueError:
+                return
+        else:
+            match = _MONTH_DAY.match(text)
+            if match is None:
+                return
+            self._month_day.append((tuple(map(int, match.groups())), index))
+        self._sorted = False
+
+    def rollup(self, cluster=None) -> Rollup:
+        """Return the rollup of the Cluster, or cluster path, with its subclusters, or of the whole diagram."""
+        if cluster is None:
+            return self.total
+        rollup = self._rollups.get(cluster)
+        if rollup is None:
+            if isinstance(cluster, str):
+                for rollup in self._rollups.values():
+                    if rollup.cluster == cluster:
+                        return rollup
+                return Rollup(cluster)
+            rollup = self._rollups[cluster] = Rollup(_cluster_path(cluster))
+        return rollup
+
+    def by_cluster(self) -> Dict[str, Rollup]:
+        """Return the rollups of the clusters with acts by cluster path, e.g. "First OODA Loop/Acts"."""
+        return {rollup.cluster: rollup for rollup in self._rollups.values() if rollup.total}
+
+    def percent_done(self, cluster=None) -> float:
+        """Return the mean progress in percent of the acts in the Cluster, or in the diagram."""
+        return self.rollup(cluster).percent_done
+
+    def load(self, cluster=None) -> Dict[str, int]:
+        """Return the number of open acts per person in the Cluster, or in the diagram."""
+        return dict(self.rollup(cluster).load)
+
+    def _in_cluster(self, index: int, cluster) -> bool:
+        if isinstance(cluster, str):
+            path = self._items[index].cluster
+            return path == cluster or path.startswith(cluster + "/")
+        parent = self._clusters[index]
+        while parent is not None:
+            if parent is cluster:
+                return True
+            parent = parent._parent
+        return False
+
+    def items(self, cluster=None) -> List[ActItem]:
+        """Return the records of the acts in the Cluster with its subclusters, or in the diagram."""
+        if cluster is None:
+            return list(self._items)
+        return [item for index, item in enumerate(self._items) if self._in_cluster(index, cluster)]
+
+    def overdue(self, today: datetime.date = None, cluster=None) -> List[ActItem]:
+        """Return the open acts whose bywhen is before today, in the Cluster or in the diagram.
+
+        :param today: Date to compare with. Default is the current date. Its
+            year is the year of the bywhen dates without a year, e.g. "6/23".
+        """
+        today = today or datetime.date.today()
+        if not self._sorted:
+            self._due.sort()
+            self._month_day.sort()
+            self._sorted = True
+        indexes = [index for _, index in self._due[:bisect.bisect_left(self._due, (today,))]]
+        end = bisect.bisect_left(self._month_day, ((today.month, today.day),))
+        # A date such as 2/29 is not a date in every year.
+        indexes.extend(index for _, index in self._month_day[:end] if self._items[index].due(today.year) is not None)
+        if cluster is not None:
+            indexes = [index for index in indexes if self._in_cluster(index, cluster)]
+        return [self._items[index] for index in sorted(indexes)]
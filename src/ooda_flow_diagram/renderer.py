@@ -0,0 +1,375 @@
+import os
+import time
+from typing import Dict, Sequence
+
+# graphviz, multiprocessing and subprocess are imported when a diagram is
+# rendered, so that importing ooda_flow_diagram stays fast.
+
+
+def _run(cmd, input: bytes = None, timeout: float = None) -> bytes:
+    """Run the layout command and return its output. It is killed after timeout seconds."""
+    import subprocess
+
+    import graphviz
+
+    try:
+        proc = subprocess.run(cmd, input=input, capture_output=True, check=True, timeout=timeout)
+    except FileNotFoundError:
+        raise graphviz.ExecutableNotFound(cmd)
+    return proc.stdout
+
+
+def _run_many(cmd, formats: Sequence[str], input: bytes = None, timeout: float = None) -> Dict[str, bytes]:
+    """Run one layout command that writes every format, and return the output of each format.
+
+    Every -T format of the command is followed by its own -o file, so the
+    graph is laid out once and rendered in each format.
+    """
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {format: os.path.join(directory, "out." + format) for format in formats}
+        args = [cmd[0]]
+        for format, path in paths.items():
+            args.extend((f"-T{format}", "-o", path))
+        _run(args + cmd[1:], input, timeout)
+        result = {}
+        for format, path in paths.items():
+            with open(path, "rb") as f:
+                result[format] = f.read()
+        return result
+
+
+class SubprocessRenderer:
+    """SubprocessRenderer starts a new Graphviz process for every render."""
+
+    def pipe(self, source: str, engine: str = "dot", format: str = "png", encoding: str = "utf-8",
+             timeout: float = None) -> bytes:
+        """Lay out the DOT source and return the rendered bytes.
+
+        :param timeout: Seconds before the layout process is killed and
+            subprocess.TimeoutExpired is raised. Default is no timeout.
+        """
+        if timeout is not None:
+            return _run([engine, f"-T{format}"], source.encode(encoding), timeout)
+        import graphviz
+
+        return graphviz.pipe(engine, format, source.encode(encoding), quiet=True)
+
+    def pipe_file(self, path: str, engine: str = "dot", format: str = "png", timeout: float = None) -> bytes:
+        """Lay out the DOT file at path and return the rendered bytes."""
+        if timeout is not None:
+            return _run([engine, f"-T{format}", path], timeout=timeout)
+        from graphviz import backend
+
+        out, _ = backend.run([engine, f"-T{format}", path], capture_output=True, check=True, quiet=True)
+        return out
+
+    def pipe_many(self, source: str, engine: str = "dot", formats: Sequence[str] = ("png",),
+                  encoding: str = "utf-8", timeout: float = None) -> Dict[str, bytes]:
+        """Lay out the DOT source once and return the rendered bytes of each format."""
+        return _run_many([engine], formats, source.encode(encoding), timeout)
+
+    def pipe_file_many(self, path: str, engine: str = "dot", formats: Sequence[str] = ("png",),
+                       timeout: float = None) -> Dict[str, bytes]:
+        """Lay out the DOT file at path once and return the rendered bytes of each format."""
+        return _run_many([engine, path], formats, timeout=timeout)
+
+    def close(self) -> None:
+        pass
+
+
+class PygraphvizRenderer:
+    """PygraphvizRenderer lays out in-process through the cgraph bindings of pygraphviz.
+
+    It needs the optional pygraphviz package.
+    """
+
+    def __init__(self):
+        import pygraphviz
+
+        self._pygraphviz = pygraphviz
+
+    def pipe(self, source: str, engine: str = "dot", format: str = "png", encoding: str = "utf-8",
+             timeout: float = None) -> bytes:
+        """Lay out the DOT source and return the rendered bytes.
+
+        The layout in this process cannot be interrupted, so the layouts with a
+        timeout run in a Graphviz process.
+        """
+        if timeout is not None:
+            return SubprocessRenderer().pipe(source, engine, format, encoding, timeout)
+        graph = self._pygraphviz.AGraph(string=source)
+        try:
+            return graph.draw(format=format, prog=engine)
+        finally:
+            graph.close()
+
+    def pipe_file(self, path: str, engine: str = "dot", format: str = "png", timeout: float = None) -> bytes:
+        """Lay out the DOT file at path and return the rendered bytes."""
+        if timeout is not None:
+            return SubprocessRenderer().pipe_file(path, engine, format, timeout)
+        graph = self._pygraphviz.AGraph(filename=path)
+        try:
+            return graph.draw(format=format, prog=engine)
+        finally:
+            graph.close()
+
+    def _draw_many(self, graph, engine: str, formats: Sequence[str]) -> Dict[str, bytes]:
+        # The positions of the layout are kept in the graph, and drawn in each format.
+        try:
+            graph.layout(prog=engine)
+            return {format: graph.draw(format=format) for format in formats}
+        finally:
+            graph.close()
+
+    def pipe_many(self, source: str, engine: str = "dot", formats: Sequence[str] = ("png",),
+                  encoding: str = "utf-8", timeout: float = None) -> Dict[str, bytes]:
+        """Lay out the DOT source once and return the rendered bytes of each format."""
+        if timeout is not None:
+            return SubprocessRenderer().pipe_many(source, engine, formats, encoding, timeout)
+        return self._draw_many(self._pygraphviz.AGraph(string=source), engine, formats)
+
+    def pipe_file_many(self, path: str, engine: str = "dot", formats: Sequence[str] = ("png",),
+                       timeout: float = None) -> Dict[str, bytes]:
+        """Lay out the DOT file at path once and return the rendered bytes of each format."""
+        if timeout is not None:
+            return SubprocessRenderer().pipe_file_many(path, engine, formats, timeout)
+        return self._draw_many(self._pygraphviz.AGraph(filename=path), engine, formats)
+
+    def close(self) -> None:
+        pass
+
+
+def _has_pygraphviz() -> bool:
+    import importlib.util
+
+    return importlib.util.find_spec("pygraphviz") is not None
+
+
+def local_renderer():
+    """Return the fastest renderer available in this process."""
+    try:
+        return PygraphvizRenderer()
+    except ImportError:
+        return SubprocessRenderer()
+
+
+# Renderer of a worker process of PooledRenderer.
+_worker_renderer = None
+
+
+def _init_worker() -> None:
+    global _worker_renderer
+    _worker_renderer = local_renderer()
+
+
+def _worker_pipe(source: str, engine: str, format: str, encoding: str, timeout: float = None) -> bytes:
+    return _worker_renderer.pipe(source, engine, format, encoding, timeout)
+
+
+def _worker_pipe_file(path: str, engine: str, format: str, timeout: float = None) -> bytes:
+    return _worker_renderer.pipe_file(path, engine, format, timeout)
+
+
+def _worker_pipe_many(source: str, engine: str, formats: Sequence[str], encoding: str,
+                      timeout: float = None) -> Dict[str, bytes]:
+    return _worker_renderer.pipe_many(source, engine, formats, encoding, timeout)
+
+
+def _worker_pipe_file_many(path: str, engine: str, formats: Sequence[str], timeout: float = None) -> Dict[str, bytes]:
+    return _worker_renderer.pipe_file_many(path, engine, formats, timeout)
+
+
+def timeout_kwargs(timeout: float = None) -> dict:
+    """Return the keyword arguments of a layout timeout for renderer.pipe().
+
+    The renderers written before the timeout was added do not take it, so it is
+    passed only when it is set.
+    """
+    return {} if timeout is None else {"timeout": timeout}
+
+
+def pipe_many(renderer, source: str, engine: str, formats: Sequence[str], encoding: str = "utf-8",
+              timeout: float = None) -> Dict[str, bytes]:
+    """Return the bytes of the DOT source rendered in each format.
+
+    The renderers with pipe_many() lay the source out once for all the
+    formats. Other renderers lay it out once per format.
+    """
+    if hasattr(renderer, "pipe_many"):
+        return renderer.pipe_many(source, engine, formats, encoding, **timeout_kwargs(timeout))
+    return {format: renderer.pipe(source, engine, format, encoding, **timeout_kwargs(timeout)) for format in formats}
+
+
+def pipe_file_many(renderer, path: str, engine: str, formats: Sequence[str], timeout: float = None) -> Dict[str, bytes]:
+    """Return the bytes of the DOT file at path rendered in each format, as pipe_many() does."""
+    if hasattr(renderer, "pipe_file_many"):
+        return renderer.pipe_file_many(path, engine, formats, **timeout_kwargs(timeout))
+    return {format: renderer.pipe_file(path, engine, format, **timeout_kwargs(timeout)) for format in formats}
+
+
+# Seconds waited for a worker beyond the layout timeout, for the worker to
+# kill the Graphviz process and send the error back.
+TIMEOUT_MARGIN = 5.0
+
+
+def _worker_ping() -> str:
+    return type(_worker_renderer).__name__
+
+
+class PooledRenderer:
+    """PooledRenderer renders in a pool of long-lived worker processes.
+
+    The workers use the cgraph bindings of pygraphviz, so the Graphviz plugins
+    and fonts are loaded once per worker instead of once per render. Without
+    pygraphviz, a worker would start a Graphviz process per render as
+    SubprocessRenderer does, so by default no pool is started and the fallback
+    renderer is used directly.
+    """
+
+    def __init__(self, workers: int = None, max_jobs_per_worker: int = 200, timeout: float = 60.0,
+                 health_interval: float = 30.0, fallback=None, use_pool: bool = None):
+        """PooledRenderer represents a pool of layout workers.
+
+        :param workers: Number of worker processes. Default is the CPU count.
+        :param max_jobs_per_worker: Number of renders before a worker is recycled.
+        :param timeout: Seconds to wait for a render or a health check. A
+            render with a layout timeout is waited for at least that timeout
+            and TIMEOUT_MARGIN.
+        :param health_interval: Seconds between health checks of the pool.
+        :param fallback: Renderer used when the pool is broken. Default is
+            SubprocessRenderer.
+        :param use_pool: Render in the worker pool. Default is True if
+            pygraphviz is installed, else the fallback renderer is used.
+        """
+        self.workers = workers
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self.fallback = fallback or SubprocessRenderer()
+        self.use_pool = _has_pygraphviz() if use_pool is None else use_pool
+        self._pool = None
+        self._checked_at = 0.0
+
+    def __getstate__(self):
+        # The pool itself cannot be sent to another process.
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        state["_checked_at"] = 0.0
+        return state
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Forked workers would inherit the pipes of the Graphviz processes
+            # started by this process at the same time and keep them from
+            # finishing, so the workers are spawned.
+            import multiprocessing
+
+            context = multiprocessing.get_context("spawn")
+            self._pool = context.Pool(
+                self.workers, initializer=_init_worker, maxtasksperchild=self.max_jobs_per_worker)
+            self._checked_at = time.monotonic()
+        elif time.monotonic() - self._checked_at > self.health_interval:
+            if not self.healthy():
+                self._recycle()
+                return self._get_pool()
+        return self._pool
+
+    def healthy(self) -> bool:
+        """Return True if the pool answers a ping within the timeout."""
+        if self._pool is None:
+            return False
+        try:
+            self._pool.apply_async(_worker_ping).get(self.timeout)
+        except Exception:
+            return False
+        self._checked_at = time.monotonic()
+        return True
+
+    def _recycle(self) -> None:
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def _apply(self, func, args, fallback, timeout: float = None):
+        import multiprocessing
+
+        if not self.use_pool:
+            return fallback()
+        try:
+            result = self._get_pool().apply_async(func, args)
+        except (OSError, ValueError):
+            # The pool is broken or not running.
+            self._recycle()
+            return fallback()
+        wait = self.timeout if timeout is None else max(self.timeout, timeout + TIMEOUT_MARGIN)
+        try:
+            return result.get(wait)
+        except multiprocessing.TimeoutError:
+            # The job hangs or its worker died. The pool is recycled only if it
+            # does not answer either, as recycling kills the jobs of the other
+            # threads. The errors raised in the worker are raised as they are.
+            if not self.healthy():
+                self._recycle()
+        return fallback()
+
+    def pipe(self, source: str, engine: str = "dot", format: str = "png", encoding: str = "utf-8",
+             timeout: float = None) -> bytes:
+        """Lay out the DOT source in a worker and return the rendered bytes.
+
+        Layout errors and timeouts of the Graphviz process, and other errors
+        raised in the worker, are raised as they are. If the worker does not
+        answer in time, the fallback renderer is used, and the pool is
+        recycled if it does not answer a health check either.
+
+        :param timeout: Seconds before the Graphviz process is killed and
+            subprocess.TimeoutExpired is raised. Default is no timeout.
+        """
+        return self._apply(_worker_pipe, (source, engine, format, encoding, timeout),
+                           lambda: self.fallback.pipe(source, engine, format, encoding, **timeout_kwargs(timeout)),
+                           timeout)
+
+    def pipe_file(self, path: str, engine: str = "dot", format: str = "png", timeout: float = None) -> bytes:
+        """Lay out the DOT file at path in a worker and return the rendered bytes."""
+        return self._apply(_worker_pipe_file, (path, engine, format, timeout),
+                           lambda: self.fallback.pipe_file(path, engine, format, **timeout_kwargs(timeout)), timeout)
+
+    def pipe_many(self, source: str, engine: str = "dot", formats: Sequence[str] = ("png",),
+                  encoding: str = "utf-8", timeout: float = None) -> Dict[str, bytes]:
+        """Lay out the DOT source once in a worker and return the rendered bytes of each format."""
+        return self._apply(_worker_pipe_many, (source, engine, tuple(formats), encoding, timeout),
+                           lambda: pipe_many(self.fallback, source, engine, formats, encoding, timeout), timeout)
+
+    def pipe_file_many(self, path: str, engine: str = "dot", formats: Sequence[str] = ("png",),
+                       timeout: float = None) -> Dict[str, bytes]:
+        """Lay out the DOT file at path once in a worker and return the rendered bytes of each format."""
+        return self._apply(_worker_pipe_file_many, (path, engine, tuple(formats), timeout),
+                           lambda: pipe_file_many(self.fallback, path, engine, formats, timeout), timeout)
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_default_renderer = SubprocessRenderer()
+
+
+def get_default_renderer():
+    """Return the renderer used by the diagrams that do not set one."""
+    return _default_renderer
+
+
+def set_default_renderer(renderer) -> None:
+    """Set the renderer used by the diagrams that do not set one."""
+    global _default_renderer
+    _default_renderer = renderer if renderer is not None else SubprocessRenderer()
@@ -0,0 +1,329 @@
+"""
+Compact binary serialization of the graph model.
+
+A dumped model is a JSON header followed by sections of little-endian integer
+arrays and one string table, so it is loaded without running the script that
+built the diagram and without parsing DOT::
+
+    magic | header length | header (JSON) | strings | attrs | nodes | edges | clusters | bodies | ranks | raw
+
+Every distinct string, i.e. the node names, labels and attribute keys and
+values, is stored once. A node is a fixed record of five int32 (name, label,
+shared attributes, own attributes, cluster), so NodeTable reads single nodes
+of a memory-mapped file without loading the rest of the model.
+"""
+import json
+import mmap
+import struct
+import sys
+from array import array
+from typing import IO, Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from ooda_flow_diagram.model import ClusterRecord, EdgeRecord, GraphModel, NodeRecord
+
+MAGIC = b"OODAGM\x00\x02"
+
+_LENGTH = struct.Struct("<Q")
+_NODE = struct.Struct("<5i")
+_NODE_FIELDS = 5
+_EDGE_FIELDS = 3
+_CLUSTER_FIELDS = 5
+# Sections are aligned, so that the arrays of a memory-mapped file can be read in place.
+_ALIGN = 8
+
+
+def _to_bytes(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode: str, data) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class _Strings:
+    """_Strings interns the strings of the model as ids into the string table."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def __call__(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        sid = self.ids.get(value)
+        if sid is None:
+            sid = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return sid
+
+
+def dumps(model: GraphModel, options: Dict[str, Any] = None) -> bytes:
+    """Return the binary form of the model.
+
+    :param options: JSON-serializable settings stored with the model, e.g. the
+        Diagram arguments.
+    """
+    strings = _Strings()
+    # Attribute sets of the model, then the attributes of the graphs.
+    attr_sets = list(model.attrs._sets)
+    attrs = array("i")
+
+    def graph_attrs(mapping: Dict[str, str]) -> int:
+        attr_sets.append(mapping)
+        return len(attr_sets) - 1
+
+    nodes = array("i")
+    for node in model.nodes:
+        nodes.extend((strings(node.name), strings(node.label), node.attrs, node.extra, node.cluster))
+    edges = array("i")
+    for edge in model.edges:
+        # Node ids, or -1 - string id for the endpoints that are not declared nodes.
+        tail = edge.tail if isinstance(edge.tail, int) else -1 - strings(edge.tail)
+        head = edge.head if isinstance(edge.head, int) else -1 - strings(edge.head)
+        edges.extend((tail, head, edge.attrs))
+    clusters = array("i")
+    bodies, body_offsets = array("q"), array("q", [0])
+    for cluster in [model.root] + model.clusters:
+        clusters.extend((strings(cluster.name), cluster.parent, graph_attrs(cluster.graph_attr),
+                         graph_attrs(cluster.node_attr), graph_attrs(cluster.edge_attr)))
+        bodies.extend(cluster.body)
+        body_offsets.append(len(bodies))
+    for mapping in attr_sets:
+        attrs.append(len(mapping))
+        for key, value in mapping.items():
+            attrs.extend((strings(key), strings(value)))
+    ranks = array("i")
+    for group in model.rank_groups.groups:
+        if group:
+            ranks.append(len(group))
+            ranks.extend(strings(name) for name in group)
+    raw = array("i", (strings(text) for text in model.raw))
+
+    encoded = [value.encode("utf-8") for value in strings.values]
+    string_offsets = array("q", [0])
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value) + 1)
+    sections = [
+        ("string_offsets", _to_bytes(string_offsets)),
+        # NUL separated, so that the whole table is decoded at once.
+        ("strings", b"\0".join(encoded) + b"\0" if encoded else b""),
+        ("attrs", _to_bytes(attrs)),
+        ("nodes", _to_bytes(nodes)),
+        ("edges", _to_bytes(edges)),
+        ("clusters", _to_bytes(clusters)),
+        ("body_offsets", _to_bytes(body_offsets)),
+        ("bodies", _to_bytes(bodies)),
+        ("ranks", _to_bytes(ranks)),
+        ("raw", _to_bytes(raw)),
+    ]
+    header = {
+        "name": model.name,
+        "counts": {"strings": len(encoded), "attrs": len(model.attrs), "nodes": len(model.nodes),
+                   "edges": len(model.edges), "clusters": len(model.clusters)},
+        "options": options or {},
+        "sections": {},
+    }
+    # The offsets are relative to the end of the header.
+    position = 0
+    for name, data in sections:
+        header["sections"][name] = [position, len(data)]
+        position += len(data) + (-len(data)) % _ALIGN
+    head = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    head += b" " * ((-len(MAGIC) - _LENGTH.size - len(head)) % _ALIGN)
+    parts = [MAGIC, _LENGTH.pack(len(head)), head]
+    for _, data in sections:
+        parts.append(data)
+        parts.append(b"\0" * ((-len(data)) % _ALIGN))
+    return b"".join(parts)
+
+
+def _header(data) -> Tuple[Dict[str, Any], int]:
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError("The data is not a dumped graph model")
+    (length,) = _LENGTH.unpack_from(data, len(MAGIC))
+    start = len(MAGIC) + _LENGTH.size
+    return json.loads(bytes(data[start:start + length]).decode("utf-8")), start + length
+
+
+def _section(data, header: Dict[str, Any], base: int, name: str):
+    offset, length = header["sections"][name]
+    return data[base + offset:base + offset + length]
+
+
+def loads(data: bytes) -> Tuple[GraphModel, Dict[str, Any]]:
+    """Return the model and the options of the binary form made by dumps()."""
+    data = memoryview(data)
+    header, base = _header(data)
+    section = lambda name: _section(data, header, base, name)
+    strings = bytes(section("strings")).decode("utf-8").split("\0")[:-1]
+    if len(strings) != header["counts"]["strings"]:
+        # A string with NUL characters is split at the offsets instead.
+        blob, offsets = bytes(section("strings")), _from_bytes("q", section("string_offsets"))
+        strings = [blob[offsets[i]:offsets[i + 1] - 1].decode("utf-8") for i in range(len(offsets) - 1)]
+    string = lambda sid: strings[sid] if sid >= 0 else None
+
+    model = GraphModel(header["name"])
+    attr_sets = []
+    values = _from_bytes("i", section("attrs"))
+    i = 0
+    while i < len(values):
+        count = values[i]
+        pairs = values[i + 1:i + 1 + 2 * count]
+        attr_sets.append({strings[pairs[j]]: string(pairs[j + 1]) for j in range(0, 2 * count, 2)})
+        i += 1 + 2 * count
+    table = model.attrs
+    for attr_id in range(header["counts"]["attrs"]):
+        attrs = attr_sets[attr_id]
+        table._ids[tuple(attrs.items())] = attr_id
+        table._sets.append(attrs)
+
+    values = _from_bytes("i", section("nodes"))
+    nodes = model.nodes
+    for i in range(0, len(values), _NODE_FIELDS):
+        name, label, attrs, extra, cluster = values[i:i + _NODE_FIELDS]
+        nodes.append(NodeRecord(strings[name], string(label), attrs, extra, cluster))
+    model.index = {node.name: node_id for node_id, node in enumerate(nodes)}
+
+    values = _from_bytes("i", section("edges"))
+    edges = model.edges
+    for i in range(0, len(values), _EDGE_FIELDS):
+        tail, head, attrs = values[i:i + _EDGE_FIELDS]
+        edges.append(EdgeRecord(tail if tail >= 0 else strings[-1 - tail],
+                                head if head >= 0 else strings[-1 - head], attrs))
+
+    values = _from_bytes("i", section("clusters"))
+    bodies = _from_bytes("q", section("bodies"))
+    offsets = _from_bytes("q", section("body_offsets"))
+    for number, i in enumerate(range(0, len(values), _CLUSTER_FIELDS)):
+        name, parent, graph_attr, node_attr, edge_attr = values[i:i + _CLUSTER_FIELDS]
+        cluster = model.root if number == 0 else ClusterRecord(string(name), parent)
+        cluster.graph_attr.update(attr_sets[graph_attr])
+        cluster.node_attr.update(attr_sets[node_attr])
+        cluster.edge_attr.update(attr_sets[edge_attr])
+        cluster.body = bodies[offsets[number]:offsets[number + 1]]
+        if number:
+            model.clusters.append(cluster)
+    # The index of the edges against duplicates is rebuilt when an edge is added.
+    model._edge_ids = None
+
+    values = _from_bytes("i", section("ranks"))
+    i = 0
+    while i < len(values):
+        count = values[i]
+        group = [strings[sid] for sid in values[i + 1:i + 1 + count]]
+        model.rank_groups.add(group[0], group[0])
+        for name in group[1:]:
+            model.rank_groups.add(group[0], name)
+        i += 1 + count
+    model.raw = [strings[sid] for sid in _from_bytes("i", section("raw"))]
+    return model, header["options"]
+
+
+def _model_from_bytes(data: bytes) -> GraphModel:
+    # Unpickles GraphModel.
+    return loads(data)[0]
+
+
+def dump(model: GraphModel, file: Union[str, IO[bytes]], options: Dict[str, Any] = None) -> None:
+    """Write the binary form of the model to the path or the binary file object."""
+    data = dumps(model, options)
+    if isinstance(file, str):
+        with open(file, "wb") as f:
+            f.write(data)
+    else:
+        file.write(data)
+
+
+def load(file: Union[str, IO[bytes]]) -> Tuple[GraphModel, Dict[str, Any]]:
+    """Return the model and the options read from the path or the binary file object."""
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            return loads(f.read())
+    return loads(file.read())
+
+
+class NodeRow(NamedTuple):
+    """NodeRow is a node read from a NodeTable."""
+
+    name: str
+    label: Optional[str]
+    attrs: Dict[str, str]
+    cluster: Optional[str]
+
+
+class NodeTable:
+    """NodeTable reads the nodes of a dumped model through a memory map.
+
+    Only the header, the attribute sets and the clusters are read when it is
+    opened. The node records and their strings are read from the map when
+    they are accessed, so a portfolio of millions of nodes can be scanned
+    without loading it.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self.header, self._base = _header(self._map)
+        self.name = self.header["name"]
+        self.options = self.header["options"]
+        self._nodes = self._position("nodes")
+        self._strings = self._position("strings")
+        self._string_offsets = self._position("string_offsets")
+        self._attr_sets: List[Dict[str, str]] = []
+        values = _from_bytes("i", _section(self._map, self.header, self._base, "attrs"))
+        i = 0
+        while i < len(values):
+            count = values[i]
+            pairs = values[i + 1:i + 1 + 2 * count]
+            self._attr_sets.append({self.string(pairs[j]): self.string(pairs[j + 1])
+                                    for j in range(0, 2 * count, 2)})
+            i += 1 + 2 * count
+        values = _from_bytes("i", _section(self._map, self.header, self._base, "clusters"))
+        # Cluster names by cluster id, the root graph being -1.
+        self._clusters = [self.string(values[i]) for i in range(0, len(values), _CLUSTER_FIELDS)]
+
+    def _position(self, name: str) -> int:
+        return self._base + self.header["sections"][name][0]
+
+    def string(self, sid: int) -> Optional[str]:
+        """Return the string of the string id, or None for -1."""
+        if sid < 0:
+            return None
+        start, end = struct.unpack_from("<2q", self._map, self._string_offsets + 8 * sid)
+        return self._map[self._strings + start:self._strings + end - 1].decode("utf-8")
+
+    def __len__(self) -> int:
+        return self.header["counts"]["nodes"]
+
+    def __getitem__(self, node_id: int) -> NodeRow:
+        if not 0 <= node_id < len(self):
+            raise IndexError(node_id)
+        name, label, attrs, extra, cluster = _NODE.unpack_from(self._map, self._nodes + _NODE.size * node_id)
+        merged = self._attr_sets[attrs] if attrs >= 0 else {}
+        if extra >= 0:
+            merged = {**merged, **self._attr_sets[extra]}
+        return NodeRow(self.string(name), self.string(label), merged, self._clusters[cluster + 1])
+
+    def __iter__(self) -> Iterator[NodeRow]:
+        return (self[node_id] for node_id in range(len(self)))
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,97 @@
+"""
+Opt-in instrumentation of the diagram pipeline.
+
+Diagram(stats=True) records the time spent in each phase, i.e. building the
+diagram, generating the labels, closing the clusters, generating the DOT source
+and the layout, and counts the nodes, edges, clusters, cache hits and DOT
+bytes. Without stats, the pipeline only checks that Diagram.stats is None.
+"""
+import contextlib
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, Mapping
+
+# A hook is called with the phase name, the start and end times from
+# time.perf_counter() and the attributes of the span when a span ends.
+SpanHook = Callable[[str, float, float, Mapping[str, Any]], None]
+
+
+class DiagramStats:
+    """DiagramStats holds the timings and the counters of a diagram."""
+
+    def __init__(self, hooks: Iterable[SpanHook] = ()):
+        """DiagramStats represents the statistics of a diagram.
+
+        :param hooks: Callables called at the end of every span.
+        """
+        self.hooks = list(hooks)
+        self.nodes = 0
+        self.edges = 0
+        self.clusters = 0
+        self.label_cache_hits = 0
+        self.label_cache_misses = 0
+        self.render_cache_hits = 0
+        self.render_cache_misses = 0
+        self.dot_bytes = 0
+        # Layouts killed by the layout timeout of the diagram.
+        self.layout_timeouts = 0
+        # Total seconds and number of spans per phase.
+        self.timings: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+
+    def add(self, name: str, start: float, end: float, attributes: Mapping[str, Any] = None) -> None:
+        """Record a span of the phase name."""
+        self.timings[name] += end - start
+        self.calls[name] += 1
+        for hook in self.hooks:
+            hook(name, start, end, attributes or {})
+
+    def tally(self, name: str, seconds: float) -> None:
+        """Add time to the phase name without calling the hooks."""
+        self.timings[name] += seconds
+        self.calls[name] += 1
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes):
+        """Time the with-block as a span of the phase name."""
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self.add(name, start, time.perf_counter(), attributes)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "nodes": self.nodes,
+            "edges": self.edges,
+            "clusters": self.clusters,
+            "label_cache_hits": self.label_cache_hits,
+            "label_cache_misses": self.label_cache_misses,
+            "render_cache_hits": self.render_cache_hits,
+            "render_cache_misses": self.render_cache_misses,
+            "dot_bytes": self.dot_bytes,
+            "layout_timeouts": self.layout_timeouts,
+            "timings": dict(self.timings),
+        }
+
+    def __repr__(self) -> str:
+        timings = " ".join("%s=%.4fs" % item for item in self.timings.items())
+        return (f"<DiagramStats nodes={self.nodes} edges={self.edges} clusters={self.clusters} "
+                f"dot_bytes={self.dot_bytes} {timings}>")
+
+
+def opentelemetry_hook(tracer) -> SpanHook:
+    """Return a hook that records the spans with an OpenTelemetry tracer.
+
+    :param tracer: Tracer, e.g. opentelemetry.trace.get_tracer(__name__).
+    """
+    # perf_counter has no epoch, so the spans are placed relative to the
+    # wall clock time when the hook was created.
+    offset = time.time_ns() - int(time.perf_counter() * 1e9)
+
+    def hook(name: str, start: float, end: float, attributes: Mapping[str, Any]) -> None:
+        span = tracer.start_span("ooda_flow_diagram." + name, start_time=offset + int(start * 1e9),
+                                 attributes=dict(attributes))
+        span.end(end_time=offset + int(end * 1e9))
+
+    return hook
@@ -0,0 +1,265 @@
+import contextlib
+import hashlib
+import os
+import tempfile
+from typing import IO, Iterable, Tuple, Union
+
+from ooda_flow_diagram import lang
+from ooda_flow_diagram.model import HashSlots, RankGroups
+
+# Root statements, e.g. edges, that are declared while a cluster is open are
+# spooled to memory up to this size and to a temporary file beyond it.
+SPOOL_SIZE = 1024 * 1024
+
+
+class StreamingSubgraph:
+    """StreamingSubgraph is the cluster counterpart of StreamingDigraph.
+
+    Its header is written with the first statement inside the cluster, so the
+    graph attributes can be set until then. It is closed when it is added to
+    its parent with subgraph(). The clusters are written one inside another,
+    so a statement can only be written to the innermost open cluster, and a
+    cluster can only be opened inside it.
+    """
+
+    def __init__(self, root: "StreamingDigraph", name: str, parent=None):
+        self.root = root
+        self.name = name
+        self.parent = parent
+        self.graph_attr = {}
+        self.node_attr = {}
+        self.edge_attr = {}
+        self.depth = parent.depth + 1 if parent is not None else 1
+        self._opened = False
+        self._closed = False
+        self._rank_groups = None
+
+    def _open(self) -> None:
+        if self._opened:
+            self._check_innermost()
+            return
+        if self.parent is not None:
+            self.parent._open()
+        open_clusters = self.root._open_clusters
+        if open_clusters and open_clusters[-1] is not self.parent:
+            raise ValueError(f'"{self.name}" can not be written while "{open_clusters[-1].name}" is open')
+        self._opened = True
+        open_clusters.append(self)
+        indent = "\t" * self.depth
+        self.root._write(indent + lang.SUBGRAPH % (lang.quote(self.name) + " "))
+        for kw in ("graph", "node", "edge"):
+            attrs = getattr(self, "%s_attr" % kw)
+            if attrs:
+                self.root._write(indent + lang.ATTR % (kw, lang.attr_list(None, attrs)))
+
+    def _check_innermost(self) -> None:
+        open_clusters = self.root._open_clusters
+        if open_clusters[-1] is not self:
+            raise ValueError(f'"{self.name}" can not be written while "{open_clusters[-1].name}" is open')
+
+    def node(self, name: str, label: str = None, _attributes=None, **attrs) -> None:
+        self._open()
+        self.root.node_count += 1
+        if _attributes:
+            attrs = {**_attributes, **attrs}
+        line = lang.NODE % (lang.quote(name), lang.attr_list(label, attrs))
+        self.root._write("\t" * self.depth + line)
+
+    def subgraph(self, graph) -> None:
+        if isinstance(graph, StreamingSubgraph):
+            graph._close()
+        else:
+            self._open()
+            for line in graph.__iter__(subgraph=True):
+                self.root._write("\t" * self.depth + "\t" + line)
+
+    def same_rank(self, name: str, other: str) -> None:
+        """Place the two nodes of this cluster on the same rank. The groups are written when it is closed."""
+        if self._rank_groups is None:
+            self._rank_groups = RankGroups()
+        self._rank_groups.add(name, other)
+
+    def _close(self) -> None:
+        if self._closed:
+            return
+        # An empty cluster is written when it is closed.
+        self._open()
+        self._closed = True
+        if self._rank_groups is not None:
+            for line in self._rank_groups.iter_lines("\t" * (self.depth + 1)):
+                self.root._write(line)
+        self.root._write("\t" * self.depth + lang.TAIL)
+        self.root._open_clusters.pop()
+        if not self.root._open_clusters:
+            self.root._flush_spool()
+
+
+class StreamingDigraph:
+    """StreamingDigraph writes DOT statements to a file as they are declared.
+
+    It provides the part of the graphviz.Digraph interface used by Diagram, so
+    that the full source of a very large diagram never has to be held in
+    memory. Nodes are written inside the clusters they belong to, and edges
+    declared while a cluster is open are spooled and written after the
+    outermost cluster is closed.
+    """
+
+    directed = True
+
+    def __init__(self, name: str, target: Union[str, os.PathLike, IO[str]], engine: str = "dot",
+                 encoding: str = "utf-8"):
+        """StreamingDigraph represents a diagram written to target.
+
+        :param name: Graph name.
+        :param target: Path of the DOT file, or a writable text file object.
+        :param engine: Layout engine.
+        :param encoding: Encoding of the DOT file.
+        """
+        self.name = name
+        self.engine = engine
+        self.encoding = encoding
+        self.graph_attr = {}
+        self.node_attr = {}
+        self.edge_attr = {}
+        if isinstance(target, (str, os.PathLike)):
+            self.filepath = os.fspath(target)
+            self._file = None
+        else:
+            self.filepath = None
+            self._file = target
+        self._started = False
+        self._closed = False
+        # Clusters whose header is written and whose closing brace is not, outermost first.
+        self._open_clusters = []
+        self._spool = None
+        # Numbers of the nodes and edges written, for the layout policy.
+        self.node_count = 0
+        self.edge_count = 0
+        # Digests of the edge statements written, so that a repeated edge is
+        # written once without keeping the statements in memory.
+        self._edge_digests = HashSlots()
+        self._rank_groups = RankGroups()
+
+    def _start(self) -> None:
+        if self._file is None:
+            self._file = open(self.filepath, "w", encoding=self.encoding)
+        self._started = True
+        self._file.write(lang.HEAD % (lang.quote(self.name) + " " if self.name else "") + "\n")
+        for kw in ("graph", "node", "edge"):
+            attrs = getattr(self, "%s_attr" % kw)
+            if attrs:
+                self._file.write(lang.ATTR % (kw, lang.attr_list(None, attrs)) + "\n")
+
+    def _write(self, line: str) -> None:
+        if self._closed:
+            raise RuntimeError(f'Streaming diagram "{self.name}" is already closed')
+        if not self._started:
+            self._start()
+        self._file.write(line + "\n")
+
+    def _write_root(self, line: str) -> None:
+        # Statements of the root graph must not be written inside a cluster,
+        # or the layout engine would pull their nodes into it.
+        if self._open_clusters:
+            if self._spool is None:
+                self._spool = tempfile.SpooledTemporaryFile(SPOOL_SIZE, mode="w+", encoding=self.encoding)
+            self._spool.write(line + "\n")
+        else:
+            self._write(line)
+
+    def _flush_spool(self) -> None:
+        if self._spool is None:
+            return
+        self._spool.seek(0)
+        for line in self._spool:
+            self._file.write(line)
+        self._spool.close()
+        self._spool = None
+
+    def new_subgraph(self, name: str, parent: StreamingSubgraph = None) -> StreamingSubgraph:
+        """Return the graph of a cluster inside parent, or inside the root graph."""
+        return StreamingSubgraph(self, name, parent)
+
+    def node(self, name: str, label: str = None, _attributes=None, **attrs) -> None:
+        if _attributes:
+            attrs = {**_attributes, **attrs}
+        self.node_count += 1
+        self._write_root("\t" + lang.NODE % (lang.quote(name), lang.attr_list(label, attrs)))
+
+    def edge(self, tail_name: str, head_name: str, label: str = None, **attrs) -> None:
+        line = lang.EDGE % (lang.quote_edge(tail_name), lang.quote_edge(head_name), lang.attr_list(label, attrs))
+        digest = int.from_bytes(hashlib.blake2b(line.encode(self.encoding), digest_size=8).digest(),
+                                "little", signed=True) or 1
+        if self._edge_digests.find(digest, digest.__eq__):
+            return
+        self._edge_digests.add(digest, digest)
+        self.edge_count += 1
+        self._write_root(line)
+
+    def edges(self, pairs: Iterable[Tuple[str, str]], label: str = None, **attrs) -> None:
+        """Write the edges between the (tail, head) named nodes with the same attributes."""
+        for tail_name, head_name in pairs:
+            self.edge(tail_name, head_name, label, **attrs)
+
+    def same_rank(self, name: str, other: str, graph: StreamingSubgraph = None) -> None:
+        """Place the two nodes on the same rank.
+
+        The group is written in graph, the innermost cluster containing both
+        nodes, when it is closed. The groups of the root graph, or of a cluster
+        that is already written, are written when the file is closed.
+        """
+        if graph is not None and not graph._closed:
+            graph.same_rank(name, other)
+        else:
+            self._rank_groups.add(name, other)
+
+    def subgraph(self, graph=None, **kwargs):
+        """Close the cluster graph, add a graphviz subgraph, or open an anonymous subgraph.
+
+        Anonymous subgraphs are small, e.g. rank groups, so they are buffered
+        and written when their with-block exits.
+        """
+        if graph is None:
+            return self._subgraph_context(**kwargs)
+        if isinstance(graph, StreamingSubgraph):
+            graph._close()
+            return None
+        for line in graph.__iter__(subgraph=True):
+            self._write_root("\t" + line)
+        return None
+
+    @contextlib.contextmanager
+    def _subgraph_context(self, **kwargs):
+        from graphviz import Digraph
+
+        graph = Digraph(**kwargs)
+        yield graph
+        self.subgraph(graph)
+
+    def close(self) -> None:
+        """Write the rest of the statements and the closing brace."""
+        if self._closed:
+            return
+        if not self._started:
+            self._start()
+        self._flush_spool()
+        for line in self._rank_groups.iter_lines():
+            self._file.write(line + "\n")
+        self._file.write(lang.TAIL + "\n")
+        self._closed = True
+        if self.filepath is not None:
+            self._file.close()
+        else:
+            self._file.flush()
+
+    @property
+    def source(self) -> str:
+        """Read the DOT source back from the file."""
+        if self.filepath is None:
+            raise RuntimeError("The DOT source was written to a file object and cannot be read back")
+        self.close()
+        with open(self.filepath, encoding=self.encoding) as f:
+            return f.read()
+
+    def __str__(self) -> str:
+        return self.source
@@ -0,0 +1,744 @@
+"""
+Native SVG export of simple diagrams.
+
+Most boards are chains of nodes built with >>, grouped into clusters. For them,
+starting the dot process takes longer than the layout itself, so render_svg()
+lays out chains and trees in Python and writes the SVG directly. It draws the
+ActTable and ActCells tables and records, the progress icons, the node icons and
+the cluster backgrounds. It returns None for the graphs it does not handle,
+e.g. with a node of two incoming edges, with rank groups or with HTML-like
+cluster labels, and the diagram is then laid out by Graphviz.
+"""
+import base64
+import html
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+from ooda_flow_diagram import lang
+from ooda_flow_diagram.model import GraphModel
+from ooda_flow_diagram.ooda.wrap import text_width
+
+POINTS_PER_INCH = 72.0
+
+# Width of a column of text and height of a line, relative to the font size.
+CHAR_WIDTH = 0.6
+LINE_HEIGHT = 1.25
+
+# Padding of the cluster boxes and of the table cells, in points.
+CLUSTER_PAD = 8.0
+CELL_PAD = 5.0
+# Distance between the peripheries of a node.
+PERIPHERY_GAP = 4.0
+
+SHAPES = frozenset(("box", "rect", "rectangle", "square", "record", "plaintext", "plain", "none", "ellipse",
+                    "oval", "circle", "octagon", "doubleoctagon", "tripleoctagon"))
+
+_ESCAPE = re.compile(r"\\([nlr])|\n")
+_RECORD_FIELD = re.compile(r"(?<!\\)\|")
+_RECORD_UNESCAPE = re.compile(r"\\([{}|<> ])")
+
+# Data URIs of the last used images, by path, modification time and size,
+# so that an icon changed on disk is read again.
+IMAGE_CACHE_SIZE = 64
+_images: "OrderedDict[Tuple[str, int, int], Tuple[str, float, float]]" = OrderedDict()
+_images_lock = threading.Lock()
+
+
+def _image(path: str) -> Optional[Tuple[str, float, float]]:
+    """Return the data URI, width and height of the PNG image at path."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _images_lock:
+        image = _images.get(key)
+        if image is not None:
+            _images.move_to_end(key)
+            return image
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if data[:8] != b"\x89PNG\r\n\x1a\n":
+        return None
+    width, height = struct.unpack(">II", data[16:24])
+    image = ("data:image/png;base64," + base64.b64encode(data).decode("ascii"), float(width), float(height))
+    with _images_lock:
+        _images[key] = image
+        if len(_images) > IMAGE_CACHE_SIZE:
+            _images.popitem(last=False)
+    return image
+
+
+class _Cell:
+    __slots__ = ("lines", "image", "width", "height")
+
+    def __init__(self):
+        # Lines of text with their alignment, "l", "c" or "r".
+        self.lines: List[List[str]] = []
+        self.image: Optional[str] = None
+        self.width = 0.0
+        self.height = 0.0
+
+    def add_line(self, align: str = "c") -> None:
+        self.lines.append(["", align])
+
+    def add_text(self, text: str) -> None:
+        if not self.lines:
+            self.add_line()
+        self.lines[-1][0] += text
+
+    def measure(self, fontsize: float, pad: float) -> None:
+        while self.lines and not self.lines[-1][0].strip():
+            self.lines.pop()
+        width = max((text_width(text) for text, _ in self.lines), default=0) * fontsize * CHAR_WIDTH
+        height = len(self.lines) * fontsize * LINE_HEIGHT
+        if self.image is not None:
+            image = _image(self.image)
+            if image is not None:
+                width = max(width, image[1])
+                height += image[2]
+        self.width = width + 2 * pad
+        self.height = height + 2 * pad
+
+
+class _Content:
+    """Rows of cells of a node label. Bordered cells are drawn with their borders."""
+
+    __slots__ = ("rows", "bordered", "width", "height")
+
+    def __init__(self, rows: List[List[_Cell]], bordered: bool):
+        self.rows = rows
+        self.bordered = bordered
+        self.width = 0.0
+        self.height = 0.0
+
+    def measure(self, fontsize: float) -> None:
+        pad = CELL_PAD if self.bordered else 0.0
+        for row in self.rows:
+            for cell in row:
+                cell.measure(fontsize, pad)
+        self.width = max((sum(cell.width for cell in row) for row in self.rows), default=0.0)
+        self.height = sum(max((cell.height for cell in row), default=0.0) for row in self.rows)
+
+
+class _TableParser(HTMLParser):
+    """Reads the rows and cells of the outer table of an HTML-like label."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows: List[List[_Cell]] = []
+        self.depth = 0
+        self.cell: Optional[_Cell] = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "table":
+            self.depth += 1
+        elif tag == "tr" and self.depth == 1:
+            self.rows.append([])
+        elif tag == "tr" and self.cell is not None and self.cell.lines:
+            # Rows of an inner table are lines of the outer cell.
+            self.cell.add_line()
+        elif tag == "td" and self.depth == 1 and self.rows:
+            self.cell = _Cell()
+            self.rows[-1].append(self.cell)
+        elif tag == "br" and self.cell is not None:
+            self._align_line(attrs.get("align"))
+            self.cell.add_line()
+        elif tag == "img" and self.cell is not None:
+            self.cell.image = attrs.get("src")
+
+    handle_startendtag = handle_starttag
+
+    def handle_endtag(self, tag):
+        if tag == "table":
+            self.depth -= 1
+
+    def handle_data(self, data):
+        if self.cell is not None and data.strip():
+            self.cell.add_text(" ".join(data.split("\n")))
+
+    def _align_line(self, align: Optional[str]) -> None:
+        if align and self.cell.lines:
+            self.cell.lines[-1][1] = align[0].lower()
+
+
+def _text_cell(text: str) -> _Cell:
+    """Return a cell of an escString label, where \\n, \\l and \\r end the lines."""
+    cell = _Cell()
+    cell.add_line()
+    pos = 0
+    for match in _ESCAPE.finditer(text):
+        cell.add_text(text[pos:match.start()])
+        cell.lines[-1][1] = match.group(1) or "n"
+        cell.add_line()
+        pos = match.end()
+    cell.add_text(text[pos:])
+    for line in cell.lines:
+        line[0] = line[0].replace('\\"', '"').replace("\\\\", "\\")
+        line[1] = "c" if line[1] == "n" else line[1]
+    return cell
+
+
+def _title_lines(label: Optional[str]) -> List[List[str]]:
+    """Return the lines of a graph or cluster label with their alignment, e.g. a label with a progress badge."""
+    if not label:
+        return []
+    cell = _text_cell(label)
+    while cell.lines and not cell.lines[-1][0].strip():
+        cell.lines.pop()
+    return cell.lines
+
+
+def _content(label: str, shape: str, horizontal: bool) -> Optional[_Content]:
+    if label.startswith("<") and label.endswith(">"):
+        parser = _TableParser()
+        parser.feed(label[1:-1])
+        if not parser.rows:
+            return None
+        return _Content(parser.rows, True)
+    if shape == "record":
+        # The fields of a record are side by side across the flow, and a
+        # {...} group flips them.
+        text, flipped = label, False
+        if text.startswith("{") and text.endswith("}"):
+            text, flipped = text[1:-1], True
+        if "{" in _RECORD_UNESCAPE.sub("", text):
+            return None
+        fields = [_text_cell(_RECORD_UNESCAPE.sub(r"\1", field)) for field in _RECORD_FIELD.split(text)]
+        if horizontal != flipped:
+            return _Content([[field] for field in fields], True)
+        return _Content([fields], True)
+    return _Content([[_text_cell(label)]], False)
+
+
+def _inches(value, default: float) -> float:
+    try:
+        return float(value) * POINTS_PER_INCH
+    except (TypeError, ValueError):
+        return default
+
+
+def _margins(value, default: Tuple[float, float]) -> Tuple[float, float]:
+    if value is None:
+        return default
+    parts = str(value).split(",")
+    x = _inches(parts[0], default[0])
+    return x, _inches(parts[1], x) if len(parts) > 1 else x
+
+
+class _Node:
+    __slots__ = ("index", "name", "attrs", "shape", "content", "width", "height", "peripheries", "x", "y",
+                 "clusters")
+
+    def __init__(self, index: int, name: str, attrs: Dict[str, str]):
+        self.index = index
+        self.name = name
+        self.attrs = attrs
+        self.shape = attrs.get("shape", "ellipse")
+        self.content: Optional[_Content] = None
+        self.width = self.height = 0.0
+        self.peripheries = 1
+        self.x = self.y = 0.0
+        # Cluster ids from the outermost one.
+        self.clusters: Tuple[int, ...] = ()
+
+    def measure(self, label: str, horizontal: bool) -> bool:
+        attrs = self.attrs
+        fontsize = float(attrs.get("fontsize", 14))
+        content = _content(label, self.shape, horizontal)
+        if content is None:
+            return False
+        if "image" in attrs:
+            content.rows.insert(0, [_Cell()])
+            content.rows[0][0].image = attrs["image"]
+        content.measure(fontsize)
+        self.content = content
+        try:
+            self.peripheries = int(attrs.get("peripheries", 1))
+        except ValueError:
+            return False
+        if self.shape in ("plaintext", "plain", "none"):
+            self.peripheries = 0
+        mx, my = _margins(attrs.get("margin"), (8.0, 4.0))
+        width, height = content.width + 2 * mx, content.height + 2 * my
+        if self.shape in ("ellipse", "oval", "circle"):
+            width, height = width * 1.42, height * 1.42
+        elif self.shape.endswith("octagon"):
+            width, height = width * 1.2 + 8, height * 1.2
+        if self.shape == "circle":
+            width = height = max(width, height)
+        min_width, min_height = _inches(attrs.get("width"), 54.0), _inches(attrs.get("height"), 36.0)
+        if attrs.get("fixedsize") == "true":
+            width, height = min_width, min_height
+        else:
+            width, height = max(width, min_width), max(height, min_height)
+        extra = 2 * PERIPHERY_GAP * max(self.peripheries - 1, 0)
+        self.width, self.height = width + extra, height + extra
+        return True
+
+
+class _Layout:
+    __slots__ = ("model", "nodes", "edges", "clusters", "width", "height", "rankdir", "label_height")
+
+    def __init__(self, model, nodes, edges, clusters, width, height, rankdir, label_height):
+        self.model = model
+        self.nodes: List[_Node] = nodes
+        # Paths of the edges, with their attributes.
+        self.edges: List[Tuple[str, Dict[str, str]]] = edges
+        # Boxes of the clusters, x0, y0, x1, y1, by cluster id.
+        self.clusters: Dict[int, Tuple[float, float, float, float]] = clusters
+        self.width = width
+        self.height = height
+        self.rankdir = rankdir
+        self.label_height = label_height
+
+
+def _forest(model: GraphModel) -> Optional[Tuple[List[int], Dict[int, List[int]]]]:
+    """Return the roots and the children of the nodes if the graph is a forest."""
+    children: Dict[int, List[int]] = {}
+    has_parent = [False] * len(model.nodes)
+    for edge in model.edges:
+        if not isinstance(edge.tail, int) or not isinstance(edge.head, int):
+            return None
+        if has_parent[edge.head] or edge.tail == edge.head:
+            return None
+        has_parent[edge.head] = True
+        children.setdefault(edge.tail, []).append(edge.head)
+    roots = [i for i, parent in enumerate(has_parent) if not parent]
+    # Every node is reached from a root unless there is a cycle.
+    reached, stack = 0, list(roots)
+    while stack:
+        reached += 1
+        stack.extend(children.get(stack.pop(), ()))
+    if reached != len(model.nodes):
+        return None
+    return roots, children
+
+
+def _cluster_chain(model: GraphModel, cluster_id: int) -> Tuple[int, ...]:
+    chain = []
+    while cluster_id >= 0:
+        chain.append(cluster_id)
+        cluster_id = model.clusters[cluster_id].parent
+    return tuple(reversed(chain))
+
+
+def _boundary(a: Tuple[int, ...], b: Tuple[int, ...], label_height: float, label_before: bool,
+              label_after: bool) -> float:
+    """Return the room needed between two nodes for the cluster borders between them."""
+    common = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        common += 1
+    closed, opened = len(a) - common, len(b) - common
+    room = (closed + opened) * CLUSTER_PAD
+    if label_after:
+        room += opened * label_height
+    if label_before:
+        room += closed * label_height
+    return room + 8.0 if closed or opened else 0.0
+
+
+def layout(model: GraphModel) -> Optional[_Layout]:
+    """Lay out a chain or tree shaped model, or return None if it is not one."""
+    root = model.root
+    if model.rank_groups or any(cluster.name is None for cluster in model.clusters):
+        return None
+    forest = _forest(model)
+    if forest is None:
+        return None
+    roots, children = forest
+    rankdir = root.graph_attr.get("rankdir", "TB").upper()
+    horizontal = rankdir in ("LR", "RL")
+
+    label_height = 0.0
+    nodes = []
+    for index, record in enumerate(model.nodes):
+        attrs = dict(root.node_attr)
+        chain = _cluster_chain(model, record.cluster)
+        for cluster_id in chain:
+            attrs.update(model.clusters[cluster_id].node_attr)
+        attrs.update(model.node_attrs(index))
+        node = _Node(index, record.name, attrs)
+        if node.shape not in SHAPES:
+            return None
+        if not node.measure(record.label if record.label is not None else record.name, horizontal):
+            return None
+        node.clusters = chain
+        nodes.append(node)
+    for cluster in model.clusters:
+        title = cluster.graph_attr.get("label")
+        if title and lang.HTML_STRING.match(title):
+            return None
+        lines = max(len(_title_lines(title)), 1)
+        label_height = max(label_height, float(cluster.graph_attr.get("fontsize", 14)) * LINE_HEIGHT * lines)
+
+    # Sizes along the flow (main) and across it (cross).
+    def main_size(node: _Node) -> float:
+        return node.width if horizontal else node.height
+
+    def cross_size(node: _Node) -> float:
+        return node.height if horizontal else node.width
+
+    nodesep = _inches(root.graph_attr.get("nodesep"), 18.0)
+    ranksep = _inches(root.graph_attr.get("ranksep"), 36.0)
+
+    rank: Dict[int, int] = {}
+    order: List[int] = []
+    for tree in roots:
+        # Post order without recursion, so that long chains do not hit the recursion limit.
+        rank[tree] = 0
+        stack = [(tree, False)]
+        while stack:
+            node_id, done = stack.pop()
+            if done:
+                order.append(node_id)
+                continue
+            stack.append((node_id, True))
+            for child in reversed(children.get(node_id, ())):
+                rank[child] = rank[node_id] + 1
+                stack.append((child, False))
+
+    cross: Dict[int, float] = {}
+    last: Dict[int, int] = {}
+    for node_id in order:
+        node, r = nodes[node_id], rank[node_id]
+        half = cross_size(node) / 2
+        previous = last.get(r)
+        if previous is None:
+            low = half
+        else:
+            gap = max(nodesep, _boundary(nodes[previous].clusters, node.clusters, label_height,
+                                         False, horizontal))
+            low = cross[previous] + cross_size(nodes[previous]) / 2 + gap + half
+        kids = children.get(node_id)
+        if kids:
+            desired = (cross[kids[0]] + cross[kids[-1]]) / 2
+            if desired < low:
+                shift, stack = low - desired, list(kids)
+                while stack:
+                    child = stack.pop()
+                    cross[child] += shift
+                    stack.extend(children.get(child, ()))
+                desired = low
+        else:
+            desired = low
+        cross[node_id] = desired
+        last[r] = node_id
+
+    ranks = max(rank.values(), default=-1) + 1
+    rank_size = [0.0] * ranks
+    for node_id, r in rank.items():
+        rank_size[r] = max(rank_size[r], main_size(nodes[node_id]))
+    rank_gap = [ranksep] * ranks
+    for edge in model.edges:
+        r = rank[edge.tail]
+        room = _boundary(nodes[edge.tail].clusters, nodes[edge.head].clusters, label_height,
+                         not horizontal, not horizontal)
+        rank_gap[r] = max(rank_gap[r], room + 10.0)
+    rank_start, position = [], 0.0
+    for r in range(ranks):
+        rank_start.append(position)
+        position += rank_size[r] + rank_gap[r]
+    main_total = position - (rank_gap[-1] if ranks else 0.0)
+    cross_total = max((cross[i] + cross_size(nodes[i]) / 2 for i in cross), default=0.0)
+
+    pad = _inches(root.graph_attr.get("pad"), 4.0)
+    graph_label = root.graph_attr.get("label")
+    title_height = float(root.graph_attr.get("fontsize", 14)) * LINE_HEIGHT * len(_title_lines(graph_label))
+    # Room of the cluster borders around the outermost nodes.
+    depth = max((len(node.clusters) for node in nodes), default=0)
+    border = depth * CLUSTER_PAD
+    top = pad + title_height + border + depth * label_height
+    left = pad + border
+
+    def to_screen(m: float, c: float) -> Tuple[float, float]:
+        if rankdir == "RL" or rankdir == "BT":
+            m = main_total - m
+        return (left + m, top + c) if horizontal else (left + c, top + m)
+
+    for node_id, node in enumerate(nodes):
+        r = rank[node_id]
+        node.x, node.y = to_screen(rank_start[r] + rank_size[r] / 2, cross[node_id])
+
+    ortho = root.graph_attr.get("splines") == "ortho"
+    edges = []
+    for edge in model.edges:
+        tail, head = nodes[edge.tail], nodes[edge.head]
+        r = rank[edge.tail]
+        m0 = rank_start[r] + rank_size[r] / 2 + main_size(tail) / 2
+        m1 = rank_start[r + 1] + rank_size[r + 1] / 2 - main_size(head) / 2
+        mid = rank_start[r] + rank_size[r] + rank_gap[r] / 2
+        c0, c1 = cross[edge.tail], cross[edge.head]
+        p0, p1, p2, p3 = to_screen(m0, c0), to_screen(mid, c0), to_screen(mid, c1), to_screen(m1, c1)
+        if c0 == c1:
+            path = "M%.2f,%.2f L%.2f,%.2f" % (p0 + p3)
+        elif ortho:
+            path = "M%.2f,%.2f L%.2f,%.2f L%.2f,%.2f L%.2f,%.2f" % (p0 + p1 + p2 + p3)
+        else:
+            path = "M%.2f,%.2f C%.2f,%.2f %.2f,%.2f %.2f,%.2f" % (p0 + p1 + p2 + p3)
+        edges.append((path, {**root.edge_attr, **model.attrs.get(edge.attrs)}))
+
+    clusters = _cluster_boxes(model, nodes, label_height)
+    if clusters is None:
+        return None
+    width = left + (main_total if horizontal else cross_total) + border + pad
+    height = top + (cross_total if horizontal else main_total) + border + pad
+    return _Layout(model, nodes, edges, clusters, width, height, rankdir, label_height)
+
+
+def _cluster_boxes(model: GraphModel, nodes: List[_Node], label_height: float):
+    """Return the boxes of the clusters, or None if a box overlaps a node or cluster outside it."""
+    boxes: Dict[int, List[float]] = {}
+    for node in nodes:
+        for cluster_id in node.clusters:
+            box = boxes.setdefault(cluster_id, [float("inf"), float("inf"), float("-inf"), float("-inf")])
+            box[0] = min(box[0], node.x - node.width / 2)
+            box[1] = min(box[1], node.y - node.height / 2)
+            box[2] = max(box[2], node.x + node.width / 2)
+            box[3] = max(box[3], node.y + node.height / 2)
+    # Inner clusters first, so that the outer boxes contain their borders.
+    depth = {cluster_id: len(_cluster_chain(model, cluster_id)) for cluster_id in boxes}
+    for cluster_id in sorted(boxes, key=depth.get, reverse=True):
+        box = boxes[cluster_id]
+        box[0] -= CLUSTER_PAD
+        box[1] -= CLUSTER_PAD + label_height
+        box[2] += CLUSTER_PAD
+        box[3] += CLUSTER_PAD
+        parent = model.clusters[cluster_id].parent
+        if parent >= 0 and parent in boxes:
+            outer = boxes[parent]
+            outer[0], outer[1] = min(outer[0], box[0]), min(outer[1], box[1])
+            outer[2], outer[3] = max(outer[2], box[2]), max(outer[3], box[3])
+
+    def overlaps(a, b) -> bool:
+        return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+    for cluster_id, box in boxes.items():
+        for node in nodes:
+            if cluster_id not in node.clusters and overlaps(box, (
+                    node.x - node.width / 2, node.y - node.height / 2,
+                    node.x + node.width / 2, node.y + node.height / 2)):
+                return None
+        for other, other_box in boxes.items():
+            if other > cluster_id and overlaps(box, other_box):
+                chain = _cluster_chain(model, other)
+                if cluster_id not in chain and other not in _cluster_chain(model, cluster_id):
+                    return None
+    return {cluster_id: tuple(box) for cluster_id, box in boxes.items()}
+
+
+class _Writer:
+    """Writes the SVG elements of a layout."""
+
+    def __init__(self):
+        self.defs: List[str] = []
+        self.body: List[str] = []
+        self._gradients: Dict[Tuple[str, str], str] = {}
+        self._markers: Dict[str, str] = {}
+
+    def fill(self, color: Optional[str]) -> str:
+        if not color:
+            return "none"
+        colors = color.split(":")
+        if len(colors) < 2 or colors[0] == colors[1] or not colors[1]:
+            return _attr(colors[0].split(";")[0])
+        key = (colors[0], colors[1])
+        gradient = self._gradients.get(key)
+        if gradient is None:
+            gradient = self._gradients[key] = "g%d" % len(self._gradients)
+            self.defs.append('<linearGradient id="%s" x1="0" y1="0" x2="1" y2="1"><stop offset="0" stop-color=%s/>'
+                             '<stop offset="1" stop-color=%s/></linearGradient>'
+                             % (gradient, _quote(colors[0]), _quote(colors[1])))
+        return "url(#%s)" % gradient
+
+    def marker(self, color: str) -> str:
+        marker = self._markers.get(color)
+        if marker is None:
+            marker = self._markers[color] = "a%d" % len(self._markers)
+            self.defs.append('<marker id="%s" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="7" '
+                             'markerHeight="7" orient="auto-start-reverse"><path d="M0,0 L10,5 L0,10 z" fill=%s/>'
+                             '</marker>' % (marker, _quote(color)))
+        return marker
+
+    def text(self, x: float, y: float, text: str, anchor: str, font: str, size: float, color: str) -> None:
+        self.body.append('<text x="%.2f" y="%.2f" text-anchor="%s" font-family=%s font-size="%.2f" fill=%s>%s</text>'
+                         % (x, y, anchor, _quote(font), size, _quote(color), html.escape(text, False)))
+
+
+def _quote(value: str) -> str:
+    return '"%s"' % html.escape(str(value))
+
+
+def _attr(value: str) -> str:
+    return html.escape(str(value))
+
+
+_ANCHORS = {"l": "start", "c": "middle", "r": "end"}
+
+
+def _shape(writer: _Writer, node: _Node, x0: float, y0: float, x1: float, y1: float, fill: str,
+           stroke: str, dash: str, penwidth: float) -> None:
+    style = node.attrs.get("style", "")
+    paint = 'fill="%s" stroke=%s stroke-width="%.2f"%s' % (fill, _quote(stroke), penwidth, dash)
+    shape = node.shape
+    if shape in ("ellipse", "oval", "circle"):
+        writer.body.append('<ellipse cx="%.2f" cy="%.2f" rx="%.2f" ry="%.2f" %s/>'
+                           % ((x0 + x1) / 2, (y0 + y1) / 2, (x1 - x0) / 2, (y1 - y0) / 2, paint))
+    elif shape.endswith("octagon"):
+        cut_x, cut_y = (x1 - x0) * 0.15, (y1 - y0) * 0.3
+        points = ((x0 + cut_x, y0), (x1 - cut_x, y0), (x1, y0 + cut_y), (x1, y1 - cut_y), (x1 - cut_x, y1),
+                  (x0 + cut_x, y1), (x0, y1 - cut_y), (x0, y0 + cut_y))
+        writer.body.append('<polygon points="%s" %s/>' % (" ".join("%.2f,%.2f" % p for p in points), paint))
+    else:
+        radius = ' rx="6"' if "rounded" in style else ""
+        writer.body.append('<rect x="%.2f" y="%.2f" width="%.2f" height="%.2f"%s %s/>'
+                           % (x0, y0, x1 - x0, y1 - y0, radius, paint))
+
+
+def _draw_node(writer: _Writer, node: _Node) -> None:
+    attrs = node.attrs
+    style = attrs.get("style", "")
+    color = attrs.get("color", "black")
+    fontcolor = attrs.get("fontcolor", "black")
+    fontname = attrs.get("fontname", "Times-Roman")
+    fontsize = float(attrs.get("fontsize", 14))
+    penwidth = float(attrs.get("penwidth", 1.0))
+    dash = ' stroke-dasharray="5,2"' if "dashed" in style else ""
+    url = attrs.get("URL") or attrs.get("href")
+    if url:
+        writer.body.append('<a href=%s>' % _quote(url))
+    x0, y0 = node.x - node.width / 2, node.y - node.height / 2
+    x1, y1 = node.x + node.width / 2, node.y + node.height / 2
+    # The outermost periphery first, the main shape is the innermost one.
+    for k in range(node.peripheries - 1, -1, -1):
+        inset = PERIPHERY_GAP * (node.peripheries - 1 - k)
+        fill = writer.fill(attrs.get("fillcolor") or color) if k == 0 and "filled" in style else "none"
+        _shape(writer, node, x0 + inset, y0 + inset, x1 - inset, y1 - inset, fill, color, dash, penwidth)
+
+    content = node.content
+    labelloc = attrs.get("labelloc", "c")
+    if labelloc == "t":
+        top = y0 + (node.height - content.height) / 2 if node.peripheries == 0 else y0 + PERIPHERY_GAP * (
+            node.peripheries) + 4
+    elif labelloc == "b":
+        top = y1 - content.height - 4 * (node.peripheries > 0)
+    else:
+        top = node.y - content.height / 2
+    left = node.x - content.width / 2
+    line_height = fontsize * LINE_HEIGHT
+    y = top
+    for row in content.rows:
+        row_height = max((cell.height for cell in row), default=0.0)
+        x = left
+        for i, cell in enumerate(row):
+            cell_width = cell.width
+            if i == len(row) - 1:
+                # The last cell takes the rest of the row.
+                cell_width = left + content.width - x
+            if content.bordered:
+                writer.body.append('<rect x="%.2f" y="%.2f" width="%.2f" height="%.2f" fill="none" stroke=%s/>'
+                                   % (x, y, cell_width, row_height, _quote(color)))
+            pad = CELL_PAD if content.bordered else 0.0
+            ty = y + (row_height - cell.height) / 2 + pad
+            if cell.image is not None:
+                image = _image(cell.image)
+                if image is not None:
+                    uri, width, height = image
+                    if node.attrs.get("fixedsize") == "true" and len(content.rows) > 1 and not content.bordered:
+                        # Icons fill the node above the label.
+                        scale = min(1.0, (node.width - 8) / width, max(node.height - content.height, 8) / height)
+                        width, height = width * scale, height * scale
+                    writer.body.append('<image x="%.2f" y="%.2f" width="%.2f" height="%.2f" href="%s"/>'
+                                       % (x + (cell_width - width) / 2, ty, width, height, uri))
+                    ty += height
+            for text, align in cell.lines:
+                if align == "l":
+                    tx = x + pad
+                elif align == "r":
+                    tx = x + cell_width - pad
+                else:
+                    tx = x + cell_width / 2
+                ty += line_height
+                writer.text(tx, ty - fontsize * 0.3, text.strip() if align == "c" else text, _ANCHORS[align],
+                            fontname, fontsize, fontcolor)
+            x += cell_width
+        y += row_height
+    if url:
+        writer.body.append("</a>")
+
+
+def write(svg_layout: _Layout) -> str:
+    """Return the SVG document of the layout."""
+    model = svg_layout.model
+    root = model.root
+    writer = _Writer()
+    writer.body.append('<rect width="100%%" height="100%%" fill=%s/>' % _quote(root.graph_attr.get("bgcolor", "white")))
+    size = float(root.graph_attr.get("fontsize", 14))
+    pad = _inches(root.graph_attr.get("pad"), 4.0)
+    for i, (text, _) in enumerate(_title_lines(root.graph_attr.get("label"))):
+        writer.text(svg_layout.width / 2, pad + size + i * size * LINE_HEIGHT, text, "middle",
+                    root.graph_attr.get("fontname", "Times-Roman"), size, root.graph_attr.get("fontcolor", "black"))
+
+    depth = {cluster_id: len(_cluster_chain(model, cluster_id)) for cluster_id in svg_layout.clusters}
+    for cluster_id in sorted(svg_layout.clusters, key=depth.get):
+        x0, y0, x1, y1 = svg_layout.clusters[cluster_id]
+        attrs = model.clusters[cluster_id].graph_attr
+        radius = ' rx="6"' if "rounded" in attrs.get("style", "") else ""
+        writer.body.append('<rect x="%.2f" y="%.2f" width="%.2f" height="%.2f"%s fill="%s" stroke=%s/>'
+                           % (x0, y0, x1 - x0, y1 - y0, radius, writer.fill(attrs.get("bgcolor")),
+                              _quote(attrs.get("pencolor", attrs.get("color", "black")))))
+        size = float(attrs.get("fontsize", 14))
+        for i, (text, align) in enumerate(_title_lines(attrs.get("label"))):
+            # A line ended by \l or \r is justified by it, the others by labeljust.
+            just = align if align in ("l", "r") else attrs.get("labeljust", "c")
+            x, anchor = {"l": (x0 + CLUSTER_PAD, "start"), "r": (x1 - CLUSTER_PAD, "end")}.get(
+                just, ((x0 + x1) / 2, "middle"))
+            # The clusters inherit the font of the root graph.
+            writer.text(x, y0 + CLUSTER_PAD / 2 + size + i * size * LINE_HEIGHT, text, anchor,
+                        attrs.get("fontname", root.graph_attr.get("fontname", "Times-Roman")), size,
+                        attrs.get("fontcolor", root.graph_attr.get("fontcolor", "black")))
+
+    for path, attrs in svg_layout.edges:
+        color = attrs.get("color", "black").split(":")[0]
+        style = attrs.get("style", "")
+        dash = ' stroke-dasharray="5,2"' if "dashed" in style else ' stroke-dasharray="1,3"' if "dotted" in style else ""
+        direction = attrs.get("dir", "forward")
+        markers = ""
+        if direction in ("forward", "both"):
+            markers += ' marker-end="url(#%s)"' % writer.marker(color)
+        if direction in ("back", "both"):
+            markers += ' marker-start="url(#%s)"' % writer.marker(color)
+        writer.body.append('<path d="%s" fill="none" stroke=%s stroke-width="%.2f"%s%s/>'
+                           % (path, _quote(color), float(attrs.get("penwidth", 1.0)), dash, markers))
+
+    for node in svg_layout.nodes:
+        _draw_node(writer, node)
+
+    head = ('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+            '<svg xmlns="http://www.w3.org/2000/svg" width="%.0fpt" height="%.0fpt" viewBox="0 0 %.2f %.2f">'
+            % (svg_layout.width, svg_layout.height, svg_layout.width, svg_layout.height))
+    parts = [head]
+    if writer.defs:
+        parts.append("<defs>" + "".join(writer.defs) + "</defs>")
+    parts.extend(writer.body)
+    parts.append("</svg>\n")
+    return "\n".join(parts)
+
+
+def render_svg(model: GraphModel) -> Optional[bytes]:
+    """Return the SVG of a chain or tree shaped model, or None to lay it out with Graphviz."""
+    svg_layout = layout(model)
+    if svg_layout is None:
+        return None
+    return write(svg_layout).encode("utf-8")
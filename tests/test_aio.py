@@ -0,0 +1,42 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+from graphviz import ExecutableNotFound
+
+from ooda_flow_diagram import Diagram, aio
+from ooda_flow_diagram.cache import RenderCache
+from ooda_flow_diagram.ooda.basic import Target
+
+
+def test_apipe_serves_cache_hit(tmp_path):
+    cache = RenderCache(tmp_path / "cache")
+    with Diagram("async board", render=False, cache=cache) as diagram:
+        Target(label="first target")
+    cache.put(cache.key(diagram.to_dot(), diagram.dot.engine, "png"), b"PNG")
+    assert asyncio.run(diagram.apipe("png")) == b"PNG"
+
+
+def test_pipe_missing_engine():
+    with pytest.raises(ExecutableNotFound):
+        asyncio.run(aio.pipe("digraph {}", engine="no-such-layout-engine"))
+
+
+def test_set_max_concurrency_rejects_zero():
+    with pytest.raises(ValueError):
+        aio.set_max_concurrency(0)
+
+
+def test_cancelled_render_kills_the_process():
+    async def main():
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-c", "import time; time.sleep(30)", stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        task = asyncio.ensure_future(aio._communicate(proc, ["sleep"]))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return proc.returncode
+
+    assert asyncio.run(main()) is not None
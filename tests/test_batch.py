@@ -0,0 +1,44 @@
+from ooda_flow_diagram import Diagram
+from ooda_flow_diagram.batch import render_many
+from ooda_flow_diagram.cache import RenderCache
+
+
+def _cached_board(directory):
+    cache = RenderCache(directory / "cache")
+    diagram = Diagram("board", filename=str(directory / "board"), show=False, cache=cache)
+    cache.put(cache.key(diagram.dot.source, diagram.dot.engine, "png"), b"PNG")
+    return diagram
+
+
+def _cached_factory():
+    import pathlib
+    import tempfile
+
+    directory = pathlib.Path(tempfile.mkdtemp())
+    cache = RenderCache(directory / "cache")
+    with Diagram("factory", filename=str(directory / "factory"), render=False, outformat=["png", "svg"],
+                 cache=cache) as diagram:
+        pass
+    for format in ("png", "svg"):
+        cache.put(diagram._cache_key(format), format.upper().encode())
+    return diagram
+
+
+def _broken_factory():
+    raise RuntimeError("broken board")
+
+
+def test_render_many_collects_results_and_errors(tmp_path):
+    results = render_many([_cached_board(tmp_path), _broken_factory], workers=2)
+    assert [r.ok for r in results] == [True, False]
+    assert results[0].outfile == str(tmp_path / "board.png")
+    assert (tmp_path / "board.png").read_bytes() == b"PNG"
+    assert "broken board" in results[1].error
+    assert all(r.elapsed >= 0 for r in results)
+
+
+def test_factory_diagrams_are_rendered():
+    [result] = render_many([_cached_factory], workers=1)
+    assert result.ok and result.outfile.endswith("factory.png")
+    with open(result.outfile, "rb") as f:
+        assert f.read() == b"PNG"
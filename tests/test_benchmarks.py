@@ -0,0 +1,16 @@
+from benchmarks import bench, boards
+
+
+def test_board_size():
+    diagram = boards.build(120)
+    assert len(diagram.dot.model.nodes) == 120
+    assert len(diagram.dot.model.clusters) == 6
+
+
+def test_run_and_compare(tmp_path):
+    records = bench.run([10], repeat=1, layout_max=0)
+    assert set(records[0]) >= {"nodes", "build", "labels", "dot", "dot_bytes", "peak_memory"}
+    assert bench.save(records, str(tmp_path)).startswith(str(tmp_path))
+
+    baseline = {"version": "0.0.0", "results": [dict(records[0], build=records[0]["build"] / 2)]}
+    assert bench.compare(records, baseline) == ["10 nodes build: 2.00x of 0.0.0"]
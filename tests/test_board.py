@@ -0,0 +1,105 @@
+import json
+import os
+
+import pytest
+
+from ooda_flow_diagram import board, cli
+from ooda_flow_diagram.renderer import get_default_renderer, set_default_renderer
+
+BOARD = """\
+diagram:
+  name: Hotel Cancellation Prediction
+  direction: TB
+  outformat: svg
+clusters:
+  Goal: {direction: TB}
+nodes:
+  - {id: major, type: MajorTarget, label: Binary classification, cluster: Goal}
+  - id: t1
+    type: Target
+    label: Select the first and simple features
+    cluster: First OODA Loop
+    line_length: 20
+  - {id: a1, type: ActTable, todo: check histgrams, progress: done, cluster: First OODA Loop/Acts}
+edges:
+  - {from: major, to: t1}
+  - {from: t1, to: a1, label: first}
+"""
+
+
+@pytest.fixture
+def yaml_board(tmp_path):
+    path = tmp_path / "board.yaml"
+    path.write_text(BOARD)
+    return str(path)
+
+
+def test_formats_build_the_same_diagram(yaml_board, tmp_path, monkeypatch):
+    pytest.importorskip("yaml")
+    import yaml
+
+    expected = board.load_board(yaml_board).to_dot()
+    monkeypatch.setattr(board, "YAML_STREAM_SIZE", 0)
+    assert board.load_board(yaml_board).to_dot() == expected
+
+    data = yaml.safe_load(BOARD)
+    (tmp_path / "board.json").write_text(json.dumps(data))
+    assert board.load_board(str(tmp_path / "board.json")).to_dot() == expected
+
+    lines = [{"diagram": data["diagram"]}, {"clusters": data["clusters"]}]
+    lines += [{"node": row} for row in data["nodes"]] + [{"edge": row} for row in data["edges"]]
+    (tmp_path / "board.jsonl").write_text("\n".join(json.dumps(line) for line in lines))
+    assert board.load_board(str(tmp_path / "board.jsonl")).to_dot() == expected
+
+
+def test_output_is_placed_next_to_the_board(yaml_board, tmp_path):
+    pytest.importorskip("yaml")
+    assert board.output_path(yaml_board) == str(tmp_path / "board.svg")
+    assert board.load_board(yaml_board).filename == str(tmp_path / "board")
+
+
+def test_invalid_board(tmp_path):
+    path = tmp_path / "board.json"
+    path.write_text(json.dumps({"diagram": {"name": "x", "shape": "box"}}))
+    with pytest.raises(ValueError):
+        board.load_board(str(path))
+
+
+class RecordingRenderer:
+    def __init__(self):
+        self.calls = 0
+
+    def pipe(self, source, engine="dot", format="png", encoding="utf-8"):
+        self.calls += 1
+        return b"<svg/>"
+
+
+def test_cli_skips_up_to_date_boards(yaml_board, tmp_path, capsys):
+    pytest.importorskip("yaml")
+    default = get_default_renderer()
+    renderer = RecordingRenderer()
+    set_default_renderer(renderer)
+    try:
+        assert cli.main(["render", str(tmp_path / "*.yaml")]) == 0
+        assert (tmp_path / "board.svg").read_bytes() == b"<svg/>"
+        assert cli.main(["render", yaml_board]) == 0
+        assert renderer.calls == 1
+        os.utime(yaml_board, (os.path.getmtime(tmp_path / "board.svg") + 10,) * 2)
+        assert cli.main(["render", yaml_board]) == 0
+        assert renderer.calls == 2
+    finally:
+        set_default_renderer(default)
+
+
+def test_cli_renders_boards_with_a_missing_format(yaml_board, tmp_path):
+    pytest.importorskip("yaml")
+    default = get_default_renderer()
+    renderer = RecordingRenderer()
+    set_default_renderer(renderer)
+    try:
+        assert cli.main(["render", yaml_board]) == 0
+        assert cli.main(["render", yaml_board, "-T", "svg", "-T", "png"]) == 0
+        assert renderer.calls == 3
+        assert (tmp_path / "board.png").exists()
+    finally:
+        set_default_renderer(default)
@@ -0,0 +1,65 @@
+import pytest
+
+from ooda_flow_diagram import Cluster, Diagram, Edge
+from ooda_flow_diagram.bulk import load, load_csv
+from ooda_flow_diagram.ooda.basic import ActTable, MajorTarget, Target
+
+NODES = [
+    {"id": "major", "type": "MajorTarget", "label": "major target"},
+    {"id": "t1", "type": "Target", "label": "first target", "cluster": "First OODA Loop"},
+    {"id": "a1", "type": "ActTable", "todo": "check", "progress": "done", "cluster": "First OODA Loop/Acts"},
+]
+EDGES = [{"from": "major", "to": "t1"}, {"from": "t1", "to": "a1", "label": "do"}]
+
+
+def test_same_source_as_the_operator_dsl():
+    with Diagram("bulk", render=False) as dsl:
+        major = MajorTarget(label="major target")
+        with Cluster("First OODA Loop"):
+            target = Target(label="first target")
+            with Cluster("Acts"):
+                act = ActTable(todo="check", progress="done")
+        major >> target
+        target >> Edge(label="do") >> act
+    with Diagram("bulk", render=False) as bulk:
+        nodes = load(NODES, EDGES)
+    assert bulk.to_dot() == dsl.to_dot()
+    assert isinstance(nodes["a1"], ActTable)
+
+
+def test_columns_and_csv(tmp_path):
+    columns = {"id": ["a", "b"], "type": ["Target", "Target"], "label": ["A", "B"], "line_length": ["", "20"]}
+    with Diagram("columns", render=False) as from_columns:
+        load(columns, {"from": ["a"], "to": ["b"]})
+
+    (tmp_path / "nodes.csv").write_text("id,type,label,line_length,todo\na,Target,A,,\nb,Target,B,20,\n")
+    (tmp_path / "edges.csv").write_text("from,to,dir\na,b,\n")
+    with Diagram("columns", render=False) as from_csv:
+        load_csv(str(tmp_path / "nodes.csv"), str(tmp_path / "edges.csv"))
+    assert from_csv.to_dot() == from_columns.to_dot()
+    assert "dir=forward" in from_csv.to_dot()
+
+
+def test_invalid_rows():
+    with Diagram("invalid", render=False):
+        with pytest.raises(ValueError):
+            load([{"id": "a", "type": "Task", "label": "a"}])
+        with pytest.raises(ValueError):
+            load([{"id": "b", "type": "Target", "label": "b"}], [{"from": "b", "to": "c"}])
+
+
+def test_edge_rows_with_lists():
+    edges = [{"from": "major", "to": "t1", "style": ["dashed", "bold"], "penwidth": 2}]
+    with Diagram("bulk", render=False) as bulk:
+        load(NODES, edges)
+    assert 'penwidth=2 style="dashed,bold"' in bulk.to_dot()
+
+
+def test_rows_without_ids():
+    with Diagram("bulk", render=False):
+        nodes = load([{"type": "Target", "id": "1", "label": "a"}, {"type": "Target", "label": "b"},
+                      {"type": "Target", "id": 0, "label": "c"}])
+    assert sorted(nodes) == ["0", "1", "__row_1"]
+    with Diagram("bulk", render=False):
+        with pytest.raises(ValueError):
+            load([{"type": "Target", "id": "1", "label": "a"}, {"type": "Target", "id": 1, "label": "b"}])
@@ -0,0 +1,43 @@
+import os
+
+from graphviz import Digraph
+
+from ooda_flow_diagram import Diagram
+from ooda_flow_diagram.cache import RenderCache
+
+
+def test_key_depends_on_engine_and_format():
+    key = RenderCache.key("digraph {}", "dot", "png")
+    assert key == RenderCache.key("digraph {}", "dot", "png")
+    assert key != RenderCache.key("digraph {}", "neato", "png")
+    assert key != RenderCache.key("digraph {}", "dot", "svg")
+
+
+def test_put_get_and_evict(tmp_path):
+    cache = RenderCache(tmp_path, max_size=10)
+    cache.put("aa01", b"12345")
+    cache.put("bb02", b"67890")
+    os.utime(cache._blob("aa01"), (2, 2))
+    os.utime(cache._blob("bb02"), (1, 1))
+    cache.put("cc03", b"abcde")
+    # bb02 is the least recently used blob.
+    assert cache.get("bb02") is None
+    assert cache.get("aa01") == b"12345"
+    assert cache.get("cc03") == b"abcde"
+
+
+def test_diagram_render_hit_skips_graphviz(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("graphviz must not run on a cache hit")
+
+    cache = RenderCache(tmp_path / "cache")
+    diagram = Diagram("cached board", show=False, cache=cache)
+    cache.put(cache.key(diagram.dot.source, diagram.dot.engine, "png"), b"PNG")
+    monkeypatch.setattr(Digraph, "render", fail)
+    monkeypatch.setattr(Digraph, "pipe", fail)
+    with diagram:
+        pass
+    assert (tmp_path / "cached_board.png").read_bytes() == b"PNG"
+    assert diagram._repr_png_() == b"PNG"
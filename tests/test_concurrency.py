@@ -0,0 +1,126 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ooda_flow_diagram import Cluster, Diagram, getcluster, getdiagram
+from ooda_flow_diagram.ooda.basic import Result, Target
+
+
+def build(number):
+    with Diagram(f"board {number}", render=False, node_ids="stable") as diagram:
+        with Cluster("Goal"):
+            target = Target(label=f"target {number}")
+        target >> Result(label=f"result {number}")
+    return number, diagram
+
+
+def test_boards_built_in_threads_do_not_mix():
+    with ThreadPoolExecutor(16) as executor:
+        results = list(executor.map(build, range(2000)))
+    for number, diagram in results:
+        model = diagram.dot.model
+        assert len(model.nodes) == 2 and len(model.edges) == 1
+        assert all(str(number) in node.label for node in model.nodes)
+    assert getdiagram() is None
+
+
+def test_boards_built_in_tasks_do_not_mix():
+    async def build_async(number):
+        with Diagram(f"board {number}", render=False) as diagram:
+            with Cluster("Goal"):
+                await asyncio.sleep(0)
+                Target(label=f"target {number}")
+        return diagram
+
+    async def main():
+        return await asyncio.gather(*(build_async(number) for number in range(200)))
+
+    for number, diagram in enumerate(asyncio.run(main())):
+        model = diagram.dot.model
+        assert len(model.nodes) == 1 and f"target {number}" in model.nodes[0].label
+
+
+def test_nested_diagram_restores_the_outer_one():
+    with Diagram("outer", render=False) as outer:
+        with Cluster("Goal") as goal:
+            with Diagram("inner", render=False) as inner:
+                assert getcluster() is None
+                Target(label="inner target")
+            assert getdiagram() is outer and getcluster() is goal
+            Target(label="outer target")
+    assert getdiagram() is None and getcluster() is None
+    assert len(inner.dot.model.nodes) == 1 and len(outer.dot.model.nodes) == 1
+
+
+def test_explicit_api_needs_no_context():
+    diagram = Diagram("explicit", render=False)
+    with ThreadPoolExecutor(1) as executor:
+        goal = executor.submit(diagram.cluster, "Goal", "TB").result()
+        target = executor.submit(goal.add, Target, label="first target").result()
+    result = diagram.add(Result, label="first result")
+    goal.close()
+    target >> result
+    source = diagram.to_dot()
+    assert "subgraph cluster_Goal" in source
+    assert target._cluster is goal and result._cluster is None
+    assert getdiagram() is None
+
+
+def test_unclosed_cluster_is_kept():
+    diagram = Diagram("explicit", render=False)
+    goal = diagram.cluster("Goal")
+    loop = goal.cluster("Loop")
+    target = loop.add(Target, label="nested target")
+    source = diagram.to_dot()
+    assert "subgraph cluster_Loop" in source and target.nodeid in source
+    assert goal._closed and loop._closed
+
+
+def test_parent_closed_before_child(tmp_path):
+    path = tmp_path / "explicit.gv"
+    with Diagram("explicit", render=False, stream=str(path)) as diagram:
+        goal = diagram.cluster("Goal")
+        loop = goal.cluster("Loop")
+        loop.add(Target, label="nested target")
+        goal.close()
+        loop.close()
+        with pytest.raises(ValueError):
+            goal.cluster("Late")
+    assert clusters_of_nodes(path.read_text()) == {"nested target": ["cluster_Goal", "cluster_Loop"]}
+
+
+def clusters_of_nodes(source):
+    """Return the labels of the nodes with the names of the clusters they are written in."""
+    stack, result = [], {}
+    for line in source.splitlines()[1:]:
+        line = line.strip()
+        if line.startswith("subgraph "):
+            stack.append(line.split()[1])
+        elif line == "}":
+            if stack:
+                stack.pop()
+        elif 'label="' in line and not line.startswith("graph"):
+            # The last line of the label, after the subject such as [Target].
+            result[line.split('label="')[1].split('"')[0].split("\\n")[-1]] = list(stack)
+    return result
+
+
+def test_streamed_sibling_clusters(tmp_path):
+    path = tmp_path / "explicit.gv"
+    with Diagram("explicit", render=False, stream=str(path)) as diagram:
+        first, second = diagram.cluster("A"), diagram.cluster("B")
+        first.add(Target, label="a target")
+        with pytest.raises(ValueError):
+            second.add(Target, label="b target")
+        first.add(Result, label="a result")
+        first.close()
+        second.add(Target, label="b target")
+    assert clusters_of_nodes(path.read_text()) == {
+        "a target": ["cluster_A"], "a result": ["cluster_A"], "b target": ["cluster_B"]}
+
+
+def test_explicit_cluster_of_another_diagram():
+    first, second = Diagram("first", render=False), Diagram("second", render=False)
+    with pytest.raises(ValueError):
+        second.add(Target, label="first target", cluster=first.cluster("Goal"))
@@ -0,0 +1,26 @@
+import pytest
+
+from ooda_flow_diagram import Diagram
+from ooda_flow_diagram.cache import RenderCache
+from ooda_flow_diagram.ooda.basic import Target, Result
+
+
+def test_deferred_render_only_freezes(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    with Diagram("lazy board", render=False) as diagram:
+        target = Target(label="first target")
+        target >> Result(label="first result")
+    assert list(tmp_path.iterdir()) == []
+    assert capsys.readouterr().out == ""
+    assert "first target" in diagram.to_dot()
+    with pytest.raises(RuntimeError):
+        diagram.connect(target, target, None)
+
+
+def test_save_uses_format_of_path(tmp_path):
+    cache = RenderCache(tmp_path / "cache")
+    with Diagram("lazy board", render=False, cache=cache) as diagram:
+        Target(label="first target")
+    cache.put(cache.key(diagram.to_dot(), diagram.dot.engine, "svg"), b"<svg/>")
+    path = diagram.save(str(tmp_path / "board.svg"))
+    assert open(path, "rb").read() == b"<svg/>"
@@ -0,0 +1,89 @@
+import json
+
+from ooda_flow_diagram import Cluster, Diagram, cli
+from ooda_flow_diagram.diff import REMOVED_PREFIX, act_fields, diff, label_text
+from ooda_flow_diagram.ooda.basic import ActTable, Result, Target
+
+
+def build(progress="50", extra=False, node_ids="stable"):
+    with Diagram("board", render=False, node_ids=node_ids) as diagram:
+        with Cluster("First OODA Loop"):
+            if extra:
+                new_target = Target(label="new target")
+            target = Target(label="first target")
+            act = ActTable(todo=["check histgrams"], output="histgrams", progress=progress)
+            target >> act
+            if extra:
+                new_target >> act
+        result = Result(label="first result")
+        act >> result
+        if not extra:
+            Result(label="dropped result")
+    return diagram
+
+
+def test_same_board_has_no_changes():
+    board_diff = diff(build(), build())
+    assert not board_diff.changed
+    assert board_diff.as_dict()["nodes"]["unchanged"] == 4
+
+
+def test_changes_are_found():
+    old, new = build(), build(progress="done", extra=True)
+    result = diff(old, new).as_dict()
+    assert [node["text"] for node in result["nodes"]["added"]] == ["[Target]\nnew target"]
+    assert [node["text"] for node in result["nodes"]["removed"]] == ["dropped result"]
+    [modified] = result["nodes"]["modified"]
+    assert modified["changes"] == ["label", "progress"]
+    assert modified["old_act"]["progress"] == "50" and modified["act"]["progress"] == "done"
+    assert modified["text"].startswith("[ToDo]\n・check histgrams")
+    assert len(result["edges"]["added"]) == 1
+    assert result["edges"]["removed"] == []
+    # The stable ids of the unchanged nodes are kept.
+    assert result["nodes"]["unchanged"] == 2
+    json.dumps(result)
+
+
+def test_sequential_ids_are_matched_by_content():
+    board_diff = diff(build(node_ids="sequential"), build(extra=True, node_ids="sequential"))
+    assert board_diff.modified == []
+    assert len(board_diff.added) == 1 and len(board_diff.removed) == 1
+
+
+def test_highlight_overlay():
+    old, new = build(), build(progress="done", extra=True)
+    source = diff(old, new).highlight()
+    assert source.count("#00B894") == 2  # the added node and edge
+    assert source.count("#E17055") == 1
+    assert REMOVED_PREFIX in source and "dashed" in source
+    assert source.endswith("}")
+
+
+def test_act_fields():
+    with Diagram("board", render=False) as diagram:
+        ActTable(todo="check histgrams", bywhen="2026-06-23", who="Sato", progress="25")
+        ActTable(todo="check logs", completed_date="6/20", progress="done")
+        Target(label="first target")
+    fields = [act_fields(node.label) for node in diagram.dot.model.nodes]
+    assert fields == [
+        {"progress": "25", "bywhen": "2026-06-23", "who": "Sato", "completed_date": ""},
+        {"progress": "done", "bywhen": "", "who": "", "completed_date": "6/20"},
+        None,
+    ]
+
+
+def test_label_text():
+    assert label_text("[Target]\\nfirst\\ntarget") == "[Target]\nfirst\ntarget"
+    assert label_text('<<table><tr><td>[ToDo]</td><td><img src="x"/></td></tr></table>>') == "[ToDo]"
+
+
+def test_cli_diff(tmp_path, capsys):
+    old, new = tmp_path / "old.json", tmp_path / "new.json"
+    board = {"diagram": {"name": "board"}, "nodes": [{"id": "t", "type": "Target", "label": "first target"}]}
+    old.write_text(json.dumps(board))
+    board["nodes"].append({"id": "r", "type": "Result", "label": "first result"})
+    board["edges"] = [{"from": "t", "to": "r"}]
+    new.write_text(json.dumps(board))
+    assert cli.main(["diff", str(old), str(new), "--json", "--exit-code"]) == 1
+    result = json.loads(capsys.readouterr().out)
+    assert len(result["nodes"]["added"]) == 1 and len(result["edges"]["added"]) == 1
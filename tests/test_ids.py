@@ -0,0 +1,56 @@
+import pytest
+
+from ooda_flow_diagram import Cluster, Diagram
+from ooda_flow_diagram.ooda.basic import ActTable, Result, Target
+
+
+def build(node_ids, extra=False):
+    with Diagram("ids", render=False, node_ids=node_ids) as diagram:
+        if extra:
+            Target(label="inserted")
+        with Cluster("Loop"):
+            target = Target(label="target")
+            result = Result(label="result")
+            Result(label="result")
+        target >> result
+    return diagram, target, result
+
+
+@pytest.mark.parametrize("node_ids", ["sequential", "stable"])
+def test_identical_boards_have_identical_source(node_ids):
+    assert build(node_ids)[0].to_dot() == build(node_ids)[0].to_dot()
+
+
+def test_sequential_ids():
+    _, target, result = build("sequential")
+    assert (target.nodeid, result.nodeid) == ("n1", "n2")
+
+
+def test_stable_ids_do_not_depend_on_other_nodes():
+    _, target, result = build("stable")
+    _, target2, result2 = build("stable", extra=True)
+    assert (target.nodeid, result.nodeid) == (target2.nodeid, result2.nodeid)
+
+
+def test_stable_ids_of_duplicates_are_numbered():
+    diagram, _, result = build("stable")
+    assert result.nodeid + "_2" in diagram.to_dot()
+
+
+def test_custom_strategy():
+    _, target, _ = build(lambda node: "id_" + type(node).__name__ + str(id(node)))
+    assert target.nodeid.startswith("id_Target")
+
+
+def test_invalid_strategy():
+    with pytest.raises(ValueError):
+        Diagram("ids", node_ids="uuid")
+
+
+def test_stable_ids_do_not_depend_on_the_generated_label():
+    def act(progress, output):
+        with Diagram("ids", render=False, node_ids="stable"):
+            with Cluster("Loop"):
+                return ActTable(todo="write the plan", output=output, bywhen="6/23", progress=progress).nodeid
+
+    assert act("50", "draft") == act("done", "plan")
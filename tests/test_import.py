@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+import ooda_flow_diagram
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(ooda_flow_diagram.__file__)))
+
+
+def run(code):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    return subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def test_import_is_lazy():
+    result = run("import sys, ooda_flow_diagram; print(' '.join(sorted(sys.modules)))")
+    modules = set(result.stdout.split())
+    for name in ("graphviz", "multiprocessing", "uuid", "asyncio", "ooda_flow_diagram.ooda",
+                 "ooda_flow_diagram.stream", "ooda_flow_diagram.cache"):
+        assert name not in modules
+
+
+def test_import_time():
+    result = run("import ooda_flow_diagram")
+    # The last line of -X importtime is the package itself: "import time: self | cumulative | name".
+    line = [line for line in result.stderr.splitlines() if line.endswith("| ooda_flow_diagram")][-1]
+    cumulative = int(line.split("|")[1])
+    assert cumulative < 500000  # microseconds
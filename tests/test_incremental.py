@@ -0,0 +1,114 @@
+import json
+import re
+
+import pytest
+
+from ooda_flow_diagram import Cluster, Diagram, Edge
+from ooda_flow_diagram.incremental import IncrementalLayout
+from ooda_flow_diagram.ooda.basic import ActTable, MajorTarget, Target
+
+NODE = re.compile(r"^\t+(n[0-9a-f_]+|\"cluster_[^\"]+\") \[", re.M)
+CLUSTER = re.compile(r"subgraph (\"cluster_[^\"]+\")")
+
+
+class FakeLayoutRenderer:
+    """Places the nodes on a line, and the clusters around them."""
+
+    def __init__(self):
+        self.calls = []
+
+    def pipe(self, source, engine="dot", format="png", encoding="utf-8"):
+        self.calls.append((engine, format, source))
+        if format != "json":
+            return b"image"
+        objects = [{"name": json.loads(name), "bb": "10,10,90,40", "nodes": []} for name in CLUSTER.findall(source)]
+        for i, name in enumerate(NODE.findall(source)):
+            objects.append({"name": name.strip('"'), "pos": "%d,20" % (20 + 10 * i)})
+        return json.dumps({"bb": "0,0,100,50", "objects": objects}).encode()
+
+
+def build(layout, renderer, progress, extra=False):
+    with Diagram("board", render=False, renderer=renderer, incremental=layout) as diagram:
+        major = MajorTarget(label="major target")
+        with Cluster("First OODA Loop"):
+            first = Target(label="first target")
+            first >> ActTable(todo="first todo", progress=progress)
+            if extra:
+                Target(label="inserted target")
+        with Cluster("Second OODA Loop"):
+            second = Target(label="second target")
+            second >> ActTable(todo="second todo", progress="done")
+        major >> first >> second
+    return diagram
+
+
+def test_only_changed_clusters_are_laid_out_again():
+    layout = IncrementalLayout()
+    renderer = FakeLayoutRenderer()
+    assert build(layout, renderer, progress="").pipe() == b"image"
+    assert (layout.laid_out, layout.reused) == (2, 0)
+    assert renderer.calls[-1][0] == "neato"
+
+    build(layout, renderer, progress="done").pipe()
+    assert (layout.laid_out, layout.reused) == (1, 1)
+    # The ids of the nodes in the second cluster do not move.
+    build(layout, renderer, progress="done", extra=True).pipe()
+    assert (layout.laid_out, layout.reused) == (1, 1)
+
+
+def test_nodes_are_pinned():
+    renderer = FakeLayoutRenderer()
+    build(IncrementalLayout(), renderer, progress="").pipe()
+    source = renderer.calls[-1][2]
+    assert source.count("!\"") == 5
+    assert "layout=nop2" in source
+    # The cluster nodes are moved by the position of the cluster box, in points.
+    assert re.search(r"first target.*pos=\"0.0000,15.0000!\"", source)
+    assert source.count("bb=\"-10.0000,5.0000,70.0000,35.0000\"") == 1
+
+
+def test_cluster_layouts_are_cached(tmp_path):
+    from ooda_flow_diagram.cache import RenderCache
+
+    renderer = FakeLayoutRenderer()
+    build(True, renderer, progress="").pipe()
+    cache = RenderCache(tmp_path)
+    build(IncrementalLayout(cache), renderer, progress="").pipe()
+    layout = IncrementalLayout(cache)
+    build(layout, renderer, progress="").pipe()
+    assert (layout.laid_out, layout.reused) == (0, 2)
+
+
+def test_streamed_diagram_can_not_be_incremental(tmp_path):
+    with pytest.raises(ValueError):
+        Diagram("board", stream=str(tmp_path / "board.gv"), incremental=True)
+
+
+def test_compound_edges_are_dropped_with_a_warning():
+    renderer = FakeLayoutRenderer()
+    with Diagram("board", render=False, renderer=renderer, incremental=True) as diagram:
+        with Cluster("First OODA Loop"):
+            first = Target(label="first target")
+        with Cluster("Second OODA Loop"):
+            second = Target(label="second target")
+        first >> Edge(lhead="Second OODA Loop") >> second
+    with pytest.warns(UserWarning):
+        diagram.pipe()
+    assert "lhead" not in renderer.calls[-1][2]
+
+
+def test_anonymous_subgraph_is_laid_out_with_the_top_level_graph():
+    renderer = FakeLayoutRenderer()
+    with Diagram("board", render=False, renderer=renderer, incremental=True) as diagram:
+        with Cluster("First OODA Loop"):
+            first = Target(label="first target")
+        with diagram.dot.subgraph() as group:
+            group.node("nf", "free node")
+        first >> Target(label="second target")
+    assert diagram.pipe() == b"image"
+    assert "nf [label=\"free node\" pos=" in renderer.calls[-1][2]
+
+
+def test_sequential_ids_can_not_be_incremental():
+    with pytest.raises(ValueError):
+        Diagram("board", render=False, incremental=True, node_ids="sequential")
@@ -0,0 +1,75 @@
+import os
+import subprocess
+
+import pytest
+
+from ooda_flow_diagram import Diagram
+from ooda_flow_diagram.layout import LayoutPolicy
+from ooda_flow_diagram.ooda.basic import Result, Target
+from ooda_flow_diagram.renderer import SubprocessRenderer
+
+
+class SlowRenderer:
+    """Times out the layouts of the given engines and splines."""
+
+    def __init__(self, slow):
+        self.slow = slow
+        self.calls = []
+
+    def pipe(self, source, engine="dot", format="png", encoding="utf-8", timeout=None):
+        splines = source.split("splines=")[1].split()[0].rstrip("]")
+        self.calls.append((engine, splines, timeout))
+        if (engine, splines) in self.slow:
+            raise subprocess.TimeoutExpired([engine], timeout)
+        return b"rendered"
+
+
+def build(n, **kwargs):
+    with Diagram("layout", render=False, **kwargs) as diagram:
+        previous = Target(label="target")
+        for i in range(n):
+            result = Result(label="result %d" % i)
+            previous >> result
+            previous = result
+    return diagram
+
+
+def test_plan_by_size():
+    policy = LayoutPolicy(ortho_max_edges=10, dot_max_nodes=100)
+    assert policy.plan("dot", "ortho", 5, 5) == [("dot", "ortho"), ("dot", "polyline"), ("dot", "line"),
+                                                 ("sfdp", "line")]
+    assert policy.plan("dot", "ortho", 50, 50)[0] == ("dot", "polyline")
+    assert policy.plan("dot", "ortho", 500, 500) == [("sfdp", "line")]
+    assert policy.plan("sfdp", "curved", 500, 500) == [("sfdp", "curved"), ("sfdp", "line")]
+
+
+def test_auto_engine_degrades_on_timeout():
+    renderer = SlowRenderer({("dot", "ortho"), ("dot", "polyline")})
+    diagram = build(3, engine="auto", layout_timeout=5, renderer=renderer, stats=True)
+    assert diagram.pipe() == b"rendered"
+    assert renderer.calls == [("dot", "ortho", 5), ("dot", "polyline", 5), ("dot", "line", 5)]
+    assert diagram.stats.layout_timeouts == 2
+    assert 'splines=ortho' in diagram.to_dot()
+
+
+def test_auto_engine_uses_cheaper_splines_for_many_edges():
+    renderer = SlowRenderer(set())
+    build(5, engine="auto", layout_policy=LayoutPolicy(ortho_max_edges=3), renderer=renderer).pipe()
+    assert renderer.calls == [("dot", "polyline", None)]
+
+
+def test_timeout_without_policy_raises():
+    renderer = SlowRenderer({("neato", "ortho")})
+    with pytest.raises(subprocess.TimeoutExpired):
+        build(1, engine="neato", layout_timeout=1, renderer=renderer).pipe()
+    with pytest.raises(ValueError):
+        Diagram("layout", engine="graphviz")
+
+
+@pytest.mark.skipif(os.name != "posix", reason="needs a shell script")
+def test_subprocess_renderer_kills_slow_layout(tmp_path):
+    engine = tmp_path / "slow"
+    engine.write_text("#!/bin/sh\nsleep 10\n")
+    engine.chmod(0o755)
+    with pytest.raises(subprocess.TimeoutExpired):
+        SubprocessRenderer().pipe("digraph {}", str(engine), timeout=0.2)
@@ -0,0 +1,143 @@
+import pickle
+
+import pytest
+from graphviz import Digraph
+
+from ooda_flow_diagram import Cluster, Diagram
+from ooda_flow_diagram.model import ModelDigraph
+from ooda_flow_diagram.ooda.basic import ActTable, Result, Target
+
+
+def test_source_is_the_same_as_graphviz():
+    expected = Digraph("board")
+    expected.graph_attr["rankdir"] = "LR"
+    expected.node("a", "A", shape="box", color="red")
+    inner = Digraph("cluster_a")
+    inner.graph_attr["label"] = "Cluster"
+    inner.node("b", "B", shape="box")
+    expected.subgraph(inner)
+    with expected.subgraph() as s:
+        s.graph_attr["rank"] = "same"
+    expected.edge("a", "b", color="blue")
+
+    model = ModelDigraph("board")
+    model.graph_attr["rankdir"] = "LR"
+    model.node("a", "A", _attributes={"shape": "box"}, color="red")
+    cluster = model.new_subgraph("cluster_a")
+    cluster.graph_attr["label"] = "Cluster"
+    cluster.node("b", "B", _attributes={"shape": "box"})
+    model.subgraph(cluster)
+    with model.subgraph() as s:
+        s.graph_attr["rank"] = "same"
+    model.edge("a", "b", color="blue")
+
+    assert model.source == expected.source
+
+
+def test_attribute_sets_are_interned():
+    with Diagram("model", render=False) as diagram:
+        with Cluster("Loop"):
+            targets = [Target(label="target %d" % i) for i in range(10)]
+        for a, b in zip(targets, targets[1:]):
+            a >> b
+    model = diagram.dot.model
+    assert len(model.nodes) == 10
+    assert len({node.attrs for node in model.nodes}) == 1
+    assert len({edge.attrs for edge in model.edges}) == 1
+
+
+def test_nodes_do_not_share_overrides():
+    shared = dict(ActTable._ds_attr.attrs)
+    with Diagram("model", render=False) as diagram:
+        linked = ActTable(todo="linked", output_url="https://example.com")
+        plain = ActTable(todo="plain")
+        short = Result(label="a b c d", line_length=3)
+        long = Result(label="a b c d")
+    model = diagram.dot.model
+    assert model.node_attrs(model.index[linked.nodeid])["URL"] == "https://example.com"
+    assert "URL" not in model.node_attrs(model.index[plain.nodeid])
+    assert "##Link Attached##" not in plain.label
+    assert ActTable._ds_attr.attrs == shared
+    assert ActTable._ds_attr.url is None
+    assert Result._ds_attr.line_length == 40
+    assert short.label == "a b\\nc d"
+    assert long.label == "a b c d"
+
+
+def test_repeated_edges_are_kept_once():
+    with Diagram("model", render=False) as diagram:
+        target = Target(label="target")
+        acts = [ActTable(todo="check %d" % i) for i in range(3)]
+        result = Result(label="result")
+        for _ in range(2):
+            target >> acts >> result
+        target >> acts[0]
+        target << acts[0]
+    model = diagram.dot.model
+    assert len(model.edges) == 7
+    assert diagram.to_dot().count("n1 -> n2 [dir=forward") == 1
+
+
+def test_rank_groups_are_merged():
+    with Diagram("model", render=False) as diagram:
+        a, b, c, d = [Target(label=name) for name in "abcd"]
+        a + b
+        c + d
+        b + c
+        a + b
+    source = diagram.to_dot()
+    assert source.count("rank=same") == 1
+    assert "\t{\n\t\tgraph [rank=same]\n\t\tn1\n\t\tn2\n\t\tn3\n\t\tn4\n\t}\n}" in source
+
+
+def test_rank_groups_are_written_in_their_common_cluster():
+    with Diagram("model", render=False) as diagram:
+        top = Target(label="top")
+        with Cluster("Loop"):
+            with Cluster("Acts"):
+                a, b = Target(label="a"), Target(label="b")
+            c = Target(label="c")
+            a + b
+            b + c
+    lines = diagram.to_dot().splitlines()
+    # The group is the last statement of the Loop cluster, not of the root graph.
+    group = lines.index("\t\t{")
+    assert lines[group:group + 6] == ["\t\t{", "\t\t\tgraph [rank=same]", "\t\t\tn2", "\t\t\tn3", "\t\t\tn4", "\t\t}"]
+    assert lines[group + 6] == "\t}"
+    assert diagram.to_dot().count("rank=same") == 1
+
+
+def test_duplicate_edges_after_load():
+    with Diagram("model", render=False) as diagram:
+        a, b = Target(label="a"), Target(label="b")
+        a >> b
+    model = pickle.loads(pickle.dumps(diagram.dot.model))
+    edge_id = model.add_edge("n1", "n2", model.attrs.get(model.edges[0].attrs))
+    assert edge_id == 0 and len(model.edges) == 1
+    model.add_edge("n2", "n1")
+    assert len(model.edges) == 2
+
+
+def test_graphviz_digraph_is_added_as_subgraph():
+    foreign = Digraph(name="cluster_x")
+    foreign.attr(label="X")
+    foreign.edge("a", "b")
+    expected = Digraph("board")
+    expected.subgraph(foreign)
+
+    model = ModelDigraph("board")
+    model.subgraph(foreign)
+    assert model.source == expected.source
+    assert pickle.loads(pickle.dumps(model.model)).source == expected.source
+
+    with Diagram("board", render=False) as diagram:
+        diagram.subgraph(foreign)
+    assert "\tsubgraph cluster_x {\n\t\tlabel=X\n\t\ta -> b\n\t}" in diagram.to_dot()
+
+
+def test_undirected_graph_is_rejected():
+    from graphviz import Graph
+
+    with Diagram("board", render=False) as diagram:
+        with pytest.raises(TypeError):
+            diagram.subgraph(Graph(name="cluster_x"))
@@ -0,0 +1,25 @@
+from ooda_flow_diagram.ooda import LabelCache, label_cache
+from ooda_flow_diagram.ooda.basic import ActTable, Target
+from ooda_flow_diagram import Diagram
+
+
+def test_label_cache_lru():
+    cache = LabelCache(maxsize=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.info() == (1, 1, 2, 2)
+
+
+def test_repeated_labels_hit_the_cache():
+    label_cache.clear()
+    with Diagram("labels", render=False) as diagram:
+        for _ in range(3):
+            ActTable(todo="check histgrams", output="selected features", bywhen="6/23", progress="done")
+        Target(label="check histgrams")
+        ActTable(todo="check histgrams", output="selected features", bywhen="6/23", progress="50")
+    hits, misses, _, currsize = label_cache.info()
+    assert (hits, misses, currsize) == (2, 3, 3)
+    assert diagram.to_dot().count("done.png") == 3
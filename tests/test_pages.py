@@ -0,0 +1,67 @@
+from ooda_flow_diagram import Cluster, Diagram, Edge
+from ooda_flow_diagram.ooda.basic import MajorTarget, Result, Target
+from ooda_flow_diagram.pages import split_pages
+
+
+class RecordingRenderer:
+    def __init__(self):
+        self.sources = []
+
+    def pipe(self, source, engine="dot", format="png", encoding="utf-8"):
+        self.sources.append(source)
+        return b"rendered"
+
+
+def build(tmp_path, **kwargs):
+    with Diagram("Mega board", filename=str(tmp_path / "board"), render=False, show=False, **kwargs) as diagram:
+        goal = MajorTarget(label="goal")
+        with Cluster("First OODA Loop"):
+            first = Target(label="first target")
+            first_result = Result(label="first result")
+            first >> first_result
+        with Cluster("Second OODA Loop"):
+            second = Target(label="second target")
+        goal >> first
+        first_result >> Edge(lhead="Second OODA Loop") >> second
+    return diagram
+
+
+def test_split_pages(tmp_path):
+    diagram = build(tmp_path)
+    overview, first, second = split_pages(diagram.dot.model, diagram.filename, "svg")
+    assert [page.name for page in (overview, first, second)] == ["board", "board_1", "board_2"]
+    assert (first.title, second.title) == ("First OODA Loop", "Second OODA Loop")
+    # The overview shows the clusters as nodes linked to their pages.
+    assert 'URL="board_1.svg"' in overview.source and "subgraph" not in overview.source
+    assert '-> "cluster_First OODA Loop"' in overview.source
+    assert '"cluster_First OODA Loop" -> "cluster_Second OODA Loop"' in overview.source
+    # The cross-cluster edges end at stubs linked to the other pages.
+    assert 'URL="board_2.svg"' in first.source and "lhead" not in first.source
+    assert 'URL="board.svg"' in first.source and "__overview ->" in first.source
+    assert '-> "cluster_Second OODA Loop"' in first.source
+    assert 'URL="board_1.svg"' in second.source
+    assert "first target" not in second.source
+
+
+def test_render_pages(tmp_path):
+    renderer = RecordingRenderer()
+    diagram = build(tmp_path, renderer=renderer, pages=True, outformat="svg")
+    assert diagram.render() == str(tmp_path / "board.svg")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["board.svg", "board_1.svg", "board_2.svg"]
+    assert len(renderer.sources) == 3
+
+
+class MultiFormatRenderer(RecordingRenderer):
+    def pipe_many(self, source, engine="dot", formats=("png",), encoding="utf-8"):
+        self.sources.append(source)
+        return {format: format.encode() for format in formats}
+
+
+def test_render_pages_lays_out_each_page_once(tmp_path):
+    renderer = MultiFormatRenderer()
+    diagram = build(tmp_path, renderer=renderer, pages=True, outformat=["png", "svg"])
+    assert diagram.render() == str(tmp_path / "board.png")
+    assert len(renderer.sources) == 3
+    assert (tmp_path / "board_1.svg").read_bytes() == b"svg"
+    assert sum('URL="board_2.svg"' in source for source in renderer.sources) == 2
+    assert not any('.png"' in source for source in renderer.sources)
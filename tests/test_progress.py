@@ -0,0 +1,68 @@
+import datetime
+
+from ooda_flow_diagram import Cluster, Diagram
+from ooda_flow_diagram.ooda.basic import ActTable, Target
+from ooda_flow_diagram.progress import parse_date
+
+
+def build(**kwargs):
+    with Diagram("board", render=False, **kwargs) as diagram:
+        with Cluster("First OODA Loop") as first:
+            Target(label="first target")
+            with Cluster("Acts") as acts:
+                ActTable(todo="check histgrams", bywhen="6/23", who="James", progress="done")
+                ActTable(todo=["train", "evaluate"], bywhen="6/24", who="James", progress="50")
+            ActTable(todo="report", bywhen="2026-07-01", who="Bell")
+        with Cluster("Second OODA Loop") as second:
+            ActTable(todo="merge reservations", bywhen="someday", who="Bell", progress="75")
+    return diagram, first, acts, second
+
+
+def test_rollups_per_cluster():
+    diagram, first, acts, second = build()
+    progress = diagram.progress
+    assert len(progress) == 4
+    assert progress.percent_done(acts) == 75.0
+    assert progress.percent_done(first) == 50.0
+    assert progress.percent_done("First OODA Loop") == 50.0
+    assert progress.percent_done() == 56.25
+    assert progress.load(first) == {"James": 1, "Bell": 1}
+    assert progress.load() == {"James": 1, "Bell": 2}
+    assert sorted(progress.by_cluster()) == ["First OODA Loop", "First OODA Loop/Acts", "Second OODA Loop"]
+    assert [item.todo for item in progress.items(acts)] == ["check histgrams", "train; evaluate"]
+
+
+def test_overdue():
+    diagram, first, _, _ = build()
+    overdue = diagram.progress.overdue(datetime.date(2026, 6, 30))
+    assert [item.todo for item in overdue] == ["train; evaluate"]
+    assert len(diagram.progress.overdue(datetime.date(2026, 7, 2), first)) == 2
+
+
+def test_overdue_index():
+    with Diagram("board", render=False) as diagram:
+        with Cluster("Loop") as loop:
+            ActTable(todo="leap", bywhen="2/29")
+            ActTable(todo="late", bywhen="2025-12-31")
+        ActTable(todo="early", bywhen="1/2")
+        ActTable(todo="closed", bywhen="1/1", progress="done")
+    progress = diagram.progress
+    assert [item.todo for item in progress.overdue(datetime.date(2026, 3, 1))] == ["late", "early"]
+    assert [item.todo for item in progress.overdue(datetime.date(2028, 3, 1))] == ["leap", "late", "early"]
+    assert [item.todo for item in progress.overdue(datetime.date(2028, 3, 1), loop)] == ["leap", "late"]
+    assert not hasattr(progress.rollup(loop), "items")
+
+
+def test_parse_date():
+    assert parse_date("6/23", 2026) == datetime.date(2026, 6, 23)
+    assert parse_date("2026/6/23") == datetime.date(2026, 6, 23)
+    assert parse_date("2/30", 2026) is None
+    assert parse_date("next week") is None
+
+
+def test_badges_on_cluster_labels():
+    diagram, *_ = build(progress_badges=True)
+    source = diagram.to_dot()
+    assert '"Acts\\n75% done · 1/2 acts"' in source
+    assert '"First OODA Loop\\n50% done · 1/3 acts"' in source
+    assert "% done" not in build()[0].to_dot()
@@ -0,0 +1,125 @@
+import shutil
+import stat
+import sys
+
+import pytest
+
+from ooda_flow_diagram import Diagram
+from ooda_flow_diagram import renderer as renderer_module
+from ooda_flow_diagram.ooda.basic import Target
+from ooda_flow_diagram.renderer import PooledRenderer, SubprocessRenderer
+
+
+class RecordingRenderer:
+    def __init__(self):
+        self.calls = []
+
+    def pipe(self, source, engine="dot", format="png", encoding="utf-8"):
+        self.calls.append((engine, format))
+        return b"rendered"
+
+
+def test_diagram_renders_through_its_renderer(tmp_path):
+    renderer = RecordingRenderer()
+    with Diagram("board", filename=str(tmp_path / "board"), show=False, renderer=renderer):
+        Target(label="first target")
+    assert (tmp_path / "board.png").read_bytes() == b"rendered"
+    assert renderer.calls == [("dot", "png")]
+
+
+class MultiFormatRenderer(RecordingRenderer):
+    def pipe_many(self, source, engine="dot", formats=("png",), encoding="utf-8"):
+        self.calls.append((engine, tuple(formats)))
+        return {format: format.encode() for format in formats}
+
+
+def test_diagram_renders_all_outformats_from_one_layout(tmp_path):
+    renderer = MultiFormatRenderer()
+    with Diagram("board", filename=str(tmp_path / "board"), show=False, renderer=renderer,
+                 outformat=["png", "svg", "pdf"]) as diagram:
+        Target(label="first target")
+    assert renderer.calls == [("dot", ("png", "svg", "pdf"))]
+    for format in ("png", "svg", "pdf"):
+        assert (tmp_path / f"board.{format}").read_bytes() == format.encode()
+    assert diagram.outformat == "png"
+    assert diagram.pipe_many(["svg", "png"]) == {"svg": b"svg", "png": b"png"}
+
+
+def test_renderer_without_pipe_many_lays_out_each_format(tmp_path):
+    renderer = RecordingRenderer()
+    with Diagram("board", filename=str(tmp_path / "board"), show=False, renderer=renderer, outformat=["png", "svg"]):
+        Target(label="first target")
+    assert renderer.calls == [("dot", "png"), ("dot", "svg")]
+    assert (tmp_path / "board.svg").read_bytes() == b"rendered"
+
+
+def test_invalid_outformat_in_list():
+    with pytest.raises(ValueError):
+        Diagram("board", render=False, outformat=["png", "gif"])
+
+
+def test_subprocess_renderer_writes_each_format_from_one_command(tmp_path):
+    # A fake layout command that writes its arguments to every -o file.
+    engine = tmp_path / "fake-dot"
+    engine.write_text("#!%s\nimport sys\nargs = sys.argv[1:]\n"
+                      "for i, arg in enumerate(args):\n"
+                      "    if arg == '-o':\n"
+                      "        open(args[i + 1], 'w').write(args[i - 1] + ' ' + sys.stdin.read())\n" % sys.executable)
+    engine.chmod(engine.stat().st_mode | stat.S_IEXEC)
+    images = SubprocessRenderer().pipe_many("digraph {}", str(engine), ["png", "svg"], timeout=10)
+    assert images == {"png": b"-Tpng digraph {}", "svg": b"-Tsvg "}
+
+
+def test_pooled_renderer_health_check():
+    with PooledRenderer(workers=1, use_pool=True) as renderer:
+        assert not renderer.healthy()
+        renderer._get_pool()
+        assert renderer.healthy()
+    assert renderer._pool is None
+
+
+def test_pooled_renderer_falls_back_when_pool_is_broken():
+    fallback = RecordingRenderer()
+    renderer = PooledRenderer(workers=1, fallback=fallback, use_pool=True)
+    renderer._get_pool().terminate()
+    assert renderer.pipe("digraph {}") == b"rendered"
+    assert renderer._pool is None
+
+
+def test_pooled_renderer_raises_worker_errors():
+    fallback = RecordingRenderer()
+    with PooledRenderer(workers=1, fallback=fallback, use_pool=True) as renderer:
+        with pytest.raises(AttributeError):
+            renderer.pipe(None)
+    assert fallback.calls == []
+
+
+def test_pooled_renderer_without_pygraphviz_uses_fallback(monkeypatch):
+    monkeypatch.setattr(renderer_module, "_has_pygraphviz", lambda: False)
+    fallback = RecordingRenderer()
+    renderer = PooledRenderer(workers=1, fallback=fallback)
+    assert renderer.pipe("digraph {}") == b"rendered"
+    assert renderer._pool is None and fallback.calls == [("dot", "png")]
+
+
+@pytest.mark.skipif(shutil.which("dot") is None, reason="Graphviz is not installed")
+def test_pooled_renderer_matches_subprocess():
+    source = "digraph { a -> b }"
+    with PooledRenderer(workers=2, max_jobs_per_worker=1, use_pool=True) as renderer:
+        for _ in range(3):
+            assert renderer.pipe(source, format="dot") == SubprocessRenderer().pipe(source, format="dot")
+
+
+def test_pooled_renderer_waits_for_the_layout_timeout():
+    import time
+
+    fallback = RecordingRenderer()
+    with PooledRenderer(workers=2, fallback=fallback, use_pool=True) as renderer:
+        assert renderer._get_pool() is not None and renderer.healthy()
+        renderer.timeout = 0.5
+        pool = renderer._pool
+        # A job within the layout timeout is waited for.
+        assert renderer._apply(time.sleep, (1.0,), lambda: "fallback", timeout=1.0) is None
+        # A job beyond the wait falls back, and the healthy pool is kept.
+        assert renderer._apply(time.sleep, (3.0,), lambda: "fallback") == "fallback"
+        assert renderer._pool is pool
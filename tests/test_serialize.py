@@ -0,0 +1,91 @@
+import io
+import pickle
+
+import pytest
+
+from ooda_flow_diagram import Cluster, Diagram, Edge
+from ooda_flow_diagram.model import GraphModel
+from ooda_flow_diagram.ooda.basic import ActTable, Result, Target
+from ooda_flow_diagram.serialize import NodeTable, dumps, loads
+
+
+def build(**kwargs):
+    with Diagram("board", render=False, outformat=["png", "svg"], **kwargs) as diagram:
+        with Cluster("First OODA Loop"):
+            target = Target(label="first target")
+            with Cluster("Acts"):
+                acts = [ActTable(todo="check histgrams", progress="done"), ActTable(todo="訓練する", who="Bell")]
+        result = Result(label="first result")
+        target >> acts >> result
+        target - Edge(label="shortcut", ltail="First OODA Loop") - result
+        target + result
+    return diagram
+
+
+def test_model_round_trip():
+    model = build().dot.model
+    loaded, options = loads(dumps(model, {"key": "value"}))
+    assert loaded.source == model.source
+    assert options == {"key": "value"}
+    # The edges against duplicates are indexed again when an edge is added.
+    loaded.add_edge(model.nodes[0].name, model.nodes[1].name, model.attrs.get(model.edges[0].attrs))
+    assert len(loaded.edges) == len(model.edges)
+    loaded.add_edge(model.nodes[0].name, "outside")
+    assert len(loaded.edges) == len(model.edges) + 1
+
+
+def test_empty_model():
+    assert loads(dumps(GraphModel()))[0].source == GraphModel().source
+    with pytest.raises(ValueError):
+        loads(b"digraph {}")
+
+
+def test_diagram_dump_and_load(tmp_path):
+    diagram = build(node_ids="stable")
+    path = str(tmp_path / "board.oodagm")
+    diagram.dump(path)
+    loaded = Diagram.load(path)
+    assert loaded.to_dot() == diagram.to_dot()
+    assert loaded.outformats == ["png", "svg"] and loaded.node_ids == "stable"
+    with pytest.raises(RuntimeError):
+        loaded.node("n", "label")
+    buffer = io.BytesIO()
+    diagram.dump(buffer)
+    buffer.seek(0)
+    assert Diagram.load(buffer, outformat="pdf").outformat == "pdf"
+
+
+def test_progress_is_loaded(tmp_path):
+    diagram = build(progress_badges=True)
+    path = str(tmp_path / "board.oodagm")
+    diagram.dump(path)
+    loaded = Diagram.load(path)
+    assert loaded.progress_badges
+    assert list(loaded.progress) == list(diagram.progress)
+    assert loaded.progress.percent_done("First OODA Loop") == 50.0
+    assert loaded.progress.load("First OODA Loop/Acts") == {"Bell": 1}
+    assert sorted(loaded.progress.by_cluster()) == ["First OODA Loop", "First OODA Loop/Acts"]
+    assert [item.todo for item in loaded.progress.items("First OODA Loop")] == ["check histgrams", "訓練する"]
+    assert loaded.progress.percent_done("Second OODA Loop") == 0.0
+
+
+def test_built_diagram_is_picklable():
+    diagram = build()
+    assert pickle.loads(pickle.dumps(diagram)).to_dot() == diagram.to_dot()
+
+
+def test_node_table(tmp_path):
+    diagram = build()
+    path = str(tmp_path / "board.oodagm")
+    diagram.dump(path)
+    model = diagram.dot.model
+    with NodeTable(path) as table:
+        assert len(table) == len(model.nodes)
+        assert table.options["name"] == "board"
+        rows = list(table)
+        assert [row.name for row in rows] == [node.name for node in model.nodes]
+        assert rows[2].label == model.nodes[2].label
+        assert rows[2].attrs == model.node_attrs(2)
+        assert rows[2].cluster == "cluster_Acts" and rows[-1].cluster is None
+        with pytest.raises(IndexError):
+            table[len(table)]
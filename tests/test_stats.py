@@ -0,0 +1,100 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from ooda_flow_diagram import Cluster, Diagram
+from ooda_flow_diagram.cache import RenderCache
+from ooda_flow_diagram.ooda.basic import ActTable, Result, Target
+from ooda_flow_diagram.stats import DiagramStats, opentelemetry_hook
+
+
+class RecordingRenderer:
+    def pipe(self, source, engine="dot", format="png", encoding="utf-8"):
+        return b"rendered"
+
+
+def build(stats, **kwargs):
+    with Diagram("stats", render=False, renderer=RecordingRenderer(), stats=stats, **kwargs) as diagram:
+        with Cluster("First OODA Loop"):
+            target = Target(label="first target")
+            with Cluster("Acts"):
+                acts = [ActTable(todo="check"), ActTable(todo="check")]
+            target >> acts >> Result(label="result")
+            # Repeated edges are added, and counted, once.
+            target >> acts
+    return diagram
+
+
+def test_counters_and_timings(tmp_path):
+    spans = []
+    stats = DiagramStats(hooks=[lambda name, start, end, attributes: spans.append((name, attributes))])
+    diagram = build(stats, cache=RenderCache(tmp_path))
+    diagram.pipe()
+    diagram.pipe()
+    assert diagram.stats is stats
+    assert (stats.nodes, stats.edges, stats.clusters) == (4, 4, 2)
+    assert stats.label_cache_hits >= 1
+    assert (stats.render_cache_hits, stats.render_cache_misses) == (1, 1)
+    assert stats.dot_bytes == len(diagram.to_dot().encode())
+    assert set(stats.timings) == {"build", "labels", "subgraph", "dot", "layout"}
+    assert stats.calls["labels"] == 4
+    names = [name for name, _ in spans]
+    assert names.count("subgraph") == 2 and "labels" not in names
+    assert ("layout", {"engine": "dot", "format": "png"}) in spans
+
+
+def test_disabled_by_default():
+    assert build(False).stats is None
+
+
+class FakeSpan:
+    def __init__(self, tracer, name, start_time, attributes):
+        self.tracer = tracer
+        self.record = [name, start_time, None, attributes]
+
+    def end(self, end_time):
+        self.record[2] = end_time
+        self.tracer.spans.append(self.record)
+
+
+class FakeTracer:
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, start_time, attributes):
+        return FakeSpan(self, name, start_time, attributes)
+
+
+def test_opentelemetry_hook():
+    tracer = FakeTracer()
+    build(DiagramStats(hooks=[opentelemetry_hook(tracer)])).pipe()
+    name, start, end, attributes = tracer.spans[-1]
+    assert name == "ooda_flow_diagram.layout"
+    assert 0 <= end - start < 10 ** 10
+    assert attributes == {"engine": "dot", "format": "png"}
+
+
+def _build_counted(number):
+    token = uuid.uuid4().hex
+    with Diagram(f"board {number}", render=False, stats=True) as diagram:
+        for _ in range(3):
+            Target(label=f"target {token}")
+        Result(label=f"result {token}")
+    return diagram.stats
+
+
+def test_label_cache_counts_per_diagram_in_threads():
+    with ThreadPoolExecutor(16) as executor:
+        results = list(executor.map(_build_counted, range(200)))
+    assert all((stats.label_cache_hits, stats.label_cache_misses) == (2, 2) for stats in results)
+
+
+def test_build_without_context():
+    diagram = Diagram("explicit", render=False, stats=True)
+    goal = diagram.cluster("Goal")
+    goal.add(Target, label=f"target {uuid.uuid4().hex}")
+    diagram.add(Target, label=f"target {uuid.uuid4().hex}")
+    diagram.to_dot()
+    diagram.to_dot()
+    stats = diagram.stats
+    assert stats.calls["build"] == 1
+    assert (stats.label_cache_hits, stats.label_cache_misses) == (0, 2)
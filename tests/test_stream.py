@@ -0,0 +1,64 @@
+import io
+
+from ooda_flow_diagram import Cluster, Diagram
+from ooda_flow_diagram.ooda.basic import ActTable, MajorTarget, Result, Target
+
+
+def build(**kwargs):
+    with Diagram("stream", render=False, **kwargs) as diagram:
+        major = MajorTarget(label="major target")
+        with Cluster("First OODA Loop"):
+            target = Target(label="first target")
+            with Cluster("Acts"):
+                act = ActTable(todo="check histgrams", output="features", progress="done")
+            result = Result(label="first result")
+            major >> target >> act >> result
+        with Cluster("Empty"):
+            pass
+        with Cluster("Second OODA Loop"):
+            result >> Target(label="second target")
+    return diagram
+
+
+def statements(source):
+    return sorted(line.strip() for line in source.splitlines())
+
+
+def test_streamed_source_has_the_same_statements(tmp_path):
+    in_memory = build().to_dot()
+    streamed = build(stream=str(tmp_path / "stream.gv"))
+    assert statements(streamed.to_dot()) == statements(in_memory)
+    assert (tmp_path / "stream.gv").read_text() == streamed.to_dot()
+
+
+def test_edges_are_written_outside_clusters():
+    out = io.StringIO()
+    build(stream=out)
+    source = out.getvalue()
+    depth = 0
+    for line in source.splitlines():
+        if "->" in line:
+            assert depth == 1
+        depth += line.count("{") - line.count("}")
+    assert depth == 0
+
+
+def test_repeated_edges_and_rank_groups(tmp_path):
+    with Diagram("stream", render=False, stream=str(tmp_path / "stream.gv")) as diagram:
+        a, b, c = [Target(label=name) for name in "abc"]
+        for _ in range(2):
+            a >> [b, c]
+        a + b
+        b + c
+    source = diagram.to_dot()
+    assert source.count("n1 -> n2 [dir=forward") == 1
+    assert source.count("rank=same") == 1 and diagram.dot.edge_count == 4
+
+
+def test_rank_groups_are_written_in_open_clusters(tmp_path):
+    with Diagram("stream", render=False, stream=str(tmp_path / "stream.gv")) as diagram:
+        with Cluster("Loop"):
+            a, b = Target(label="a"), Target(label="b")
+            a + b
+    source = diagram.to_dot()
+    assert "\t\t{\n\t\t\tgraph [rank=same]\n\t\t\tn1\n\t\t\tn2\n\t\t}\n\t}" in source
@@ -0,0 +1,98 @@
+import xml.etree.ElementTree as ET
+
+from ooda_flow_diagram import Cluster, Diagram
+from ooda_flow_diagram.ooda.basic import ActCells, ActTable, MajorTarget, Result, Target
+from ooda_flow_diagram.svg import _image, layout, render_svg
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+
+class RecordingRenderer:
+    def __init__(self):
+        self.calls = []
+
+    def pipe(self, source, engine="dot", format="png", encoding="utf-8"):
+        self.calls.append((engine, format))
+        return b"graphviz"
+
+
+def build(renderer, fan_in=False):
+    with Diagram("native", render=False, renderer=renderer, native_svg=True, outformat="svg") as diagram:
+        goal = MajorTarget(label="goal")
+        with Cluster("First OODA Loop"):
+            target = Target(label="target")
+            act = ActTable(todo="check the histgrams", output="features", bywhen="6/23", who="James",
+                           progress="done", completed_date="6/22", output_url="https://example.com/?a=1&b=2")
+            cells = ActCells(todo="select", output="selected", bywhen="6/24", who="James")
+        with Cluster("Second OODA Loop"):
+            result = Result(label="result")
+        goal >> target >> act >> cells >> result
+        if fan_in:
+            target >> result
+    return diagram
+
+
+def test_chain_is_rendered_without_graphviz():
+    renderer = RecordingRenderer()
+    diagram = build(renderer)
+    data = diagram.pipe()
+    assert renderer.calls == []
+    svg = ET.fromstring(data)
+    texts = [element.text for element in svg.iter(SVG + "text")]
+    assert "First OODA Loop" in texts and "Second OODA Loop" in texts
+    assert "check the histgrams" in texts and "[DoneDate]: 6/22" in texts
+    assert "[ToDo]" in texts and "select" in texts
+    # The progress icon is embedded, and the URL of the ActTable is a link.
+    assert any(image.get("href").startswith("data:image/png;base64,") for image in svg.iter(SVG + "image"))
+    assert [a.get("href") for a in svg.iter(SVG + "a")] == ["https://example.com/?a=1&b=2"]
+    assert len([path for path in svg.iter(SVG + "path") if path.get("marker-end")]) == 4
+
+
+def test_clusters_do_not_overlap():
+    diagram = build(RecordingRenderer())
+    first, second = sorted(layout(diagram.dot.model).clusters.values())
+    assert first[2] < second[0]
+
+
+def test_other_graphs_fall_back_to_graphviz():
+    renderer = RecordingRenderer()
+    diagram = build(renderer, fan_in=True)
+    assert render_svg(diagram.dot.model) is None
+    assert diagram.pipe() == b"graphviz"
+    assert diagram.pipe("png") == b"graphviz"
+    assert renderer.calls == [("dot", "svg"), ("dot", "png")]
+
+
+def test_changed_image_is_read_again(tmp_path):
+    import os
+    import struct
+
+    path = tmp_path / "icon.png"
+    header = b"\x89PNG\r\n\x1a\n" + b"\0" * 8
+    path.write_bytes(header + struct.pack(">II", 10, 20))
+    assert _image(str(path))[1:] == (10.0, 20.0)
+    path.write_bytes(header + struct.pack(">II", 30, 40) + b"\0")
+    os.utime(path, ns=(0, 10 ** 18))
+    assert _image(str(path))[1:] == (30.0, 40.0)
+
+
+def test_badge_lines_of_cluster_titles():
+    renderer = RecordingRenderer()
+    with Diagram("native", render=False, renderer=renderer, native_svg=True, outformat="svg",
+                 progress_badges=True) as diagram:
+        with Cluster("Loop"):
+            Target(label="target") >> ActTable(todo="select", progress="50")
+    svg = ET.fromstring(diagram.pipe())
+    texts = [element.text for element in svg.iter(SVG + "text")]
+    assert "Loop" in texts and "50% done · 0/1 acts" in texts
+    assert not any("\\n" in text for text in texts)
+    assert renderer.calls == []
+
+
+def test_html_cluster_labels_fall_back_to_graphviz():
+    with Diagram("native", render=False, native_svg=True, progress_badges=True) as diagram:
+        with Cluster("Loop", graph_attr={"label": "<<b>Loop</b>>"}):
+            ActTable(todo="select", progress="done")
+    label = diagram.dot.model.clusters[0].graph_attr["label"]
+    assert label.startswith("<<table") and "<b>Loop</b>" in label and "100% done · 1/1 acts" in label
+    assert render_svg(diagram.dot.model) is None
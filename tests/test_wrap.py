@@ -0,0 +1,34 @@
+import textwrap
+
+from ooda_flow_diagram import Diagram
+from ooda_flow_diagram.ooda.basic import Target
+from ooda_flow_diagram.ooda.wrap import text_width, wrap
+
+
+def test_ascii_matches_textwrap():
+    text = "classify with boosting tree model and get first accuracies"
+    for width in (5, 10, 20, 40):
+        assert wrap(text, width) == [line.strip() for line in textwrap.wrap(text, width)]
+
+
+def test_wide_characters_take_two_columns():
+    text = "ホテルの予約とキャンセルの履歴データ"
+    lines = wrap(text, 10)
+    assert lines == ["ホテルの予", "約とキャン", "セルの履歴", "データ"]
+    assert all(text_width(line) <= 10 for line in lines)
+
+
+def test_punctuation_does_not_start_a_line():
+    assert wrap("締切は来週です。", 8) == ["締切は来", "週です。"]
+    assert wrap("締切は来週。", 10) == ["締切は来週。"]
+
+
+def test_mixed_text_breaks_between_words_and_wide_characters():
+    assert wrap("boosting treeでclassify", 14) == ["boosting tree", "でclassify"]
+
+
+def test_diagram_label_wrap_option():
+    label = "ホテルの予約とキャンセルの履歴データを入力とする"
+    with Diagram("wrap", render=False, label_wrap="width") as diagram:
+        Target(label=label, line_length=10)
+    assert "ホテルの予\\n約とキャン" in diagram.to_dot()